@@ -0,0 +1,100 @@
+"""Compare two benchmark baselines saved by `make benchmark`.
+
+Usage:
+    python benchmarks/compare.py OLD.json NEW.json [--threshold 0.1]
+
+Prints the median of every benchmark of both runs and their ratio. Exits with
+status 1 if a benchmark got slower than the threshold, eg: 0.1 for 10%.
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+
+def compare(
+    old: Dict[str, Any], new: Dict[str, Any], threshold: float
+) -> List[List[str]]:
+    """Compare the medians of two baselines.
+
+    Args:
+        old(Dict[str, Any]): the reference baseline.
+        new(Dict[str, Any]): the baseline to check.
+        threshold(float): relative slowdown reported as a regression.
+
+    Returns:
+        List[List[str]]: rows of name, old median, new median, ratio and status.
+
+    Examples:
+        >>> old = {"benchmarks": {"a": {"median": 0.010}, "b": {"median": 0.1}}}
+        >>> new = {"benchmarks": {"a": {"median": 0.015}, "c": {"median": 0.1}}}
+        >>> for row in compare(old, new, threshold=0.1):
+        ...     print(row)
+        ['a', '10.00ms', '15.00ms', '1.50x', 'slower']
+        ['b', '100.00ms', '-', '-', 'removed']
+        ['c', '-', '100.00ms', '-', 'added']
+    """
+    rows: List[List[str]] = []
+    old_results: Dict[str, Any] = old["benchmarks"]
+    new_results: Dict[str, Any] = new["benchmarks"]
+    for name in sorted(set(old_results) | set(new_results)):
+        old_median: Optional[float] = old_results.get(name, {}).get("median")
+        new_median: Optional[float] = new_results.get(name, {}).get("median")
+        if old_median is None:
+            rows.append([name, "-", f"{new_median * 1000:.2f}ms", "-", "added"])
+            continue
+        if new_median is None:
+            rows.append([name, f"{old_median * 1000:.2f}ms", "-", "-", "removed"])
+            continue
+
+        ratio: float = new_median / old_median if old_median else 1.0
+        status: str = ""
+        if ratio > 1 + threshold:
+            status = "slower"
+        elif ratio < 1 / (1 + threshold):
+            status = "faster"
+        rows.append(
+            [
+                name,
+                f"{old_median * 1000:.2f}ms",
+                f"{new_median * 1000:.2f}ms",
+                f"{ratio:.2f}x",
+                status,
+            ]
+        )
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("old", help="reference baseline")
+    parser.add_argument("new", help="baseline to check")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown reported as a regression, default 0.1",
+    )
+    args = parser.parse_args(argv)
+
+    baselines: List[Dict[str, Any]] = []
+    for path in (args.old, args.new):
+        with open(path, "r", encoding="utf-8") as f:
+            baselines.append(json.load(f))
+    old, new = baselines
+
+    print(f"old: {old.get('version')} ({(old.get('commit') or '')[:12]})")
+    print(f"new: {new.get('version')} ({(new.get('commit') or '')[:12]})")
+    rows: List[List[str]] = compare(old, new, args.threshold)
+    widths: List[int] = [max(len(row[i]) for row in rows) for i in range(4)]
+    for row in rows:
+        print(
+            f"{row[0]:<{widths[0]}}  {row[1]:>{widths[1]}}  {row[2]:>{widths[2]}}"
+            f"  {row[3]:>{widths[3]}}  {row[4]}".rstrip()
+        )
+    return 1 if any(row[4] == "slower" for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
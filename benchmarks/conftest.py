@@ -0,0 +1,314 @@
+"""Benchmarks of gcop's local hot paths, run with `make benchmark`.
+
+The benchmarks run against synthetic git repositories of increasing size, built
+once per session with `git fast-import`. Every benchmark is timed over a number
+of rounds, and the results of the session are saved as a JSON baseline, see
+`compare.py` to diff two of them.
+
+Options:
+    --benchmark-sizes: comma separated repository sizes, or `all`.
+    --benchmark-json: where to save the results. Defaults to
+        `.benchmarks/<version>-<timestamp>.json`.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+import pytest
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class RepoSize:
+    """Shape of a synthetic repository.
+
+    Args:
+        name(str): name of the size, used in benchmark ids.
+        commits(int): number of commits in the history.
+        files(int): number of tracked files.
+        authors(int): number of distinct authors.
+        staged_files(int): number of files changed in the staged diff.
+        staged_lines(int): lines added to each of them.
+    """
+
+    name: str
+    commits: int
+    files: int
+    authors: int
+    staged_files: int
+    staged_lines: int
+
+
+SIZES: Dict[str, RepoSize] = {
+    size.name: size
+    for size in (
+        RepoSize(
+            "small", commits=200, files=100, authors=3, staged_files=5, staged_lines=20
+        ),
+        RepoSize(
+            "medium",
+            commits=2000,
+            files=1000,
+            authors=20,
+            staged_files=50,
+            staged_lines=50,
+        ),
+        RepoSize(
+            "large",
+            commits=10000,
+            files=5000,
+            authors=100,
+            staged_files=300,
+            staged_lines=100,
+        ),
+    )
+}
+_DEFAULT_SIZES: str = "small,medium"
+_EXTENSIONS: List[str] = [".py", ".js", ".ts", ".md", ".go", ".rs", ".txt"]
+_FILES_PER_COMMIT: int = 3
+
+_results_key = pytest.StashKey[Dict[str, Dict[str, Any]]]()
+_saved_to_key = pytest.StashKey[str]()
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("gcop benchmarks")
+    group.addoption(
+        "--benchmark-sizes",
+        default=_DEFAULT_SIZES,
+        help=f"comma separated repository sizes of {list(SIZES)}, or all",
+    )
+    group.addoption("--benchmark-json", default=None, help="where to save results")
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    config.stash[_results_key] = {}
+
+
+def _selected_sizes(config: pytest.Config) -> List[RepoSize]:
+    value: str = config.getoption("--benchmark-sizes")
+    names: List[str] = list(SIZES) if value == "all" else value.split(",")
+    return [SIZES[name.strip()] for name in names]
+
+
+def pytest_generate_tests(metafunc: pytest.Metafunc) -> None:
+    if "repo_size" in metafunc.fixturenames:
+        sizes = _selected_sizes(metafunc.config)
+        metafunc.parametrize(
+            "repo_size", sizes, ids=[size.name for size in sizes], scope="session"
+        )
+
+
+def _file_path(index: int) -> str:
+    ext: str = _EXTENSIONS[index % len(_EXTENSIONS)]
+    return f"pkg{index % 20}/mod{index // 20}/file{index}{ext}"
+
+
+def _file_content(index: int, revision: int, lines: int = 10) -> str:
+    return "".join(
+        f"line {line} of file {index}, revision {revision}\n" for line in range(lines)
+    )
+
+
+def _fast_import_stream(size: RepoSize) -> bytes:
+    """History where every commit changes a few files, every file is added by
+    the first commits."""
+    out: List[bytes] = []
+
+    def data(text: str) -> None:
+        raw: bytes = text.encode("utf-8")
+        out.append(b"data %d\n%s\n" % (len(raw), raw))
+
+    files_added: int = 0
+    for mark in range(1, size.commits + 1):
+        author: int = mark % size.authors
+        stamp: int = 1_600_000_000 + mark * 3600
+        out.append(b"commit refs/heads/main\nmark :%d\n" % mark)
+        out.append(
+            b"author Author %d <author%d@example.com> %d +0000\n"
+            % (author, author, stamp)
+        )
+        out.append(b"committer Committer <committer@example.com> %d +0000\n" % stamp)
+        data(f"change {mark}\n\nSynthetic commit number {mark}.")
+        if mark > 1:
+            out.append(b"from :%d\n" % (mark - 1))
+
+        # Add all files over the first commits, then modify random-ish ones.
+        remaining: int = size.commits - mark + 1
+        count: int = max(_FILES_PER_COMMIT, -(-(size.files - files_added) // remaining))
+        for i in range(count):
+            if files_added < size.files:
+                index: int = files_added
+                files_added += 1
+            else:
+                index = (mark * 7919 + i * 104729) % size.files
+            out.append(b"M 100644 inline %s\n" % _file_path(index).encode("utf-8"))
+            data(_file_content(index, mark))
+
+        if mark % 100 == 0:
+            out.append(b"reset refs/tags/v0.%d\nfrom :%d\n" % (mark // 100, mark))
+    return b"".join(out)
+
+
+def _git(path: str, *args: str, input: Optional[bytes] = None) -> None:
+    subprocess.run(
+        ["git", *args], cwd=path, input=input, check=True, capture_output=True
+    )
+
+
+@pytest.fixture(scope="session")
+def synthetic_repo(
+    repo_size: RepoSize, tmp_path_factory: pytest.TempPathFactory
+) -> str:
+    """A repository of `repo_size` with a staged diff and a few untracked
+    files."""
+    path: str = str(tmp_path_factory.mktemp(f"repo-{repo_size.name}"))
+    _git(path, "init", "-q", "-b", "main")
+    _git(path, "fast-import", "--quiet", input=_fast_import_stream(repo_size))
+    _git(path, "checkout", "-q", "-f", "main")
+    _git(path, "config", "user.name", "Benchmark")
+    _git(path, "config", "user.email", "benchmark@example.com")
+    _git(path, "remote", "add", "origin", "https://example.com/synthetic.git")
+
+    staged: List[str] = []
+    for index in range(repo_size.staged_files):
+        file_index: int = index * (repo_size.files // repo_size.staged_files)
+        name: str = _file_path(file_index)
+        with open(os.path.join(path, name), "a", encoding="utf-8") as f:
+            f.write(_file_content(file_index, -1, repo_size.staged_lines))
+        staged.append(name)
+    _git(path, "add", *staged)
+
+    for index in range(5):
+        with open(os.path.join(path, f"untracked{index}.txt"), "w") as f:
+            f.write("untracked\n")
+    return path
+
+
+@pytest.fixture
+def in_repo(synthetic_repo: str, monkeypatch: pytest.MonkeyPatch) -> str:
+    """Run the benchmark with the synthetic repository as working directory."""
+    monkeypatch.chdir(synthetic_repo)
+    return synthetic_repo
+
+
+@pytest.fixture
+def bench(request: pytest.FixtureRequest) -> Callable[..., Any]:
+    """Time a function and record the result under the id of the benchmark.
+
+    Call it as `bench(func, rounds=10, warmup=1, setup=None)`. `setup` is called
+    before every round and is not timed. Returns what the last round returned.
+    """
+    results: Dict[str, Dict[str, Any]] = request.config.stash[_results_key]
+
+    def run(
+        func: Callable[[], T],
+        rounds: int = 10,
+        warmup: int = 1,
+        setup: Optional[Callable[[], None]] = None,
+    ) -> T:
+        result: Any = None
+        timings: List[float] = []
+        for round in range(warmup + rounds):
+            if setup:
+                setup()
+            start: float = time.perf_counter()
+            result = func()
+            elapsed: float = time.perf_counter() - start
+            if round >= warmup:
+                timings.append(elapsed)
+
+        results[request.node.nodeid] = {
+            "rounds": rounds,
+            "min": min(timings),
+            "max": max(timings),
+            "mean": statistics.mean(timings),
+            "median": statistics.median(timings),
+            "stddev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        }
+        return result
+
+    return run
+
+
+def _get_version() -> str:
+    from gcop import version
+
+    return version
+
+
+def _get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def pytest_sessionfinish(session: pytest.Session) -> None:
+    results: Dict[str, Dict[str, Any]] = session.config.stash[_results_key]
+    if not results:
+        return
+
+    path: Optional[str] = session.config.getoption("--benchmark-json")
+    if not path:
+        stamp: str = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(
+            str(session.config.rootpath),
+            ".benchmarks",
+            f"{_get_version()}-{stamp}.json",
+        )
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": _get_version(),
+                "commit": _get_commit(),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "machine": {
+                    "python": sys.version.split()[0],
+                    "platform": platform.platform(),
+                    "processor": platform.processor(),
+                    "cpu_count": os.cpu_count(),
+                },
+                "sizes": {
+                    size.name: asdict(size) for size in _selected_sizes(session.config)
+                },
+                "benchmarks": dict(sorted(results.items())),
+            },
+            f,
+            indent=2,
+        )
+    session.config.stash[_saved_to_key] = path
+
+
+def pytest_terminal_summary(terminalreporter, config: pytest.Config) -> None:
+    results: Dict[str, Dict[str, Any]] = config.stash[_results_key]
+    if not results:
+        return
+
+    terminalreporter.section("gcop benchmarks")
+    width: int = max(len(name) for name in results)
+    terminalreporter.write_line(
+        f"{'name':<{width}}  {'median':>10}  {'min':>10}  {'stddev':>10}"
+    )
+    for name, stats in sorted(results.items()):
+        terminalreporter.write_line(
+            f"{name:<{width}}  {stats['median'] * 1000:>8.2f}ms"
+            f"  {stats['min'] * 1000:>8.2f}ms  {stats['stddev'] * 1000:>8.2f}ms"
+        )
+    if _saved_to_key in config.stash:
+        terminalreporter.write_line(f"Saved to {config.stash[_saved_to_key]}")
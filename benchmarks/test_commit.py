@@ -0,0 +1,55 @@
+"""Everything `gcop commit` does locally before the model is called."""
+
+from gcop import prompt
+from gcop.diff import filter_diff, render_diff
+from gcop.git import get_git_backend
+
+
+def _staged_diff_text() -> str:
+    with get_git_backend() as git:
+        return render_diff(git.staged_diff())
+
+
+def test_staged_diff(bench, in_repo, repo_size):
+    def staged_diff():
+        with get_git_backend() as git:
+            return git.staged_diff()
+
+    files = bench(staged_diff)
+    assert len(files) == repo_size.staged_files
+
+
+def test_filter_diff(bench, in_repo):
+    diff = _staged_diff_text()
+    bench(lambda: filter_diff(diff), rounds=20)
+
+
+def test_prompt_assembly(bench, in_repo):
+    diff = _staged_diff_text()
+    bench(
+        lambda: prompt.get_commit_instrcution(
+            diff, instruction="mention the ticket", previous_commit_message="fix"
+        ),
+        rounds=100,
+    )
+
+
+def test_history_examples(bench, in_repo, tmp_path):
+    from gcop.config import GcopConfig, ModelConfig
+    from gcop.examples import CommitIndexCache, get_history_examples
+
+    diff = _staged_diff_text()
+    gcop_config = GcopConfig(model=ModelConfig(model_name="test/model", api_key="k"))
+    cache = CommitIndexCache(str(tmp_path))
+    # The warmup round builds the index, the rounds measure a later commit.
+    bench(lambda: get_history_examples(diff, gcop_config, cache=cache), rounds=10)
+
+
+def test_build_history_index(bench, in_repo, tmp_path):
+    from gcop.examples import CommitIndexCache, load_commit_index
+
+    def build():
+        with get_git_backend(prefer=("subprocess", "pygit2")) as git:
+            return load_commit_index(git, 1000, CommitIndexCache(str(tmp_path)))
+
+    bench(build, rounds=3, setup=lambda: [p.unlink() for p in tmp_path.iterdir()])
@@ -0,0 +1,48 @@
+"""The git operations of `gcop.git`, with each backend.
+
+A backend is created per round, so the subprocess backend pays for starting its
+`git cat-file` co-process once per round, as a command would.
+"""
+
+import importlib.util
+
+import pytest
+
+from gcop.git import get_git_backend
+
+BACKENDS = [
+    "subprocess",
+    pytest.param(
+        "pygit2",
+        marks=pytest.mark.skipif(
+            importlib.util.find_spec("pygit2") is None, reason="pygit2 not installed"
+        ),
+    ),
+]
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_staged_diff(bench, in_repo, name):
+    def staged_diff():
+        with get_git_backend(name) as git:
+            return git.staged_diff()
+
+    assert bench(staged_diff, rounds=5)
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_read_commits(bench, in_repo, name):
+    def read_commits():
+        with get_git_backend(name) as git:
+            return [git.read_commit(f"HEAD~{n}") for n in range(50)]
+
+    assert all(bench(read_commits, rounds=5))
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_iter_log(bench, in_repo, name):
+    def iter_log():
+        with get_git_backend(name) as git:
+            return list(git.iter_log(max_count=500, with_paths=True))
+
+    assert bench(iter_log, rounds=3)
@@ -0,0 +1,33 @@
+"""Every section of `gcop info`, and the whole command.
+
+The history stats are cached per repository, see `gcop.history`. The warmup
+round fills the cache, so the sections measure a repeated `gcop info`, while
+`test_scan_history` measures the walk over the history of the first one.
+"""
+
+import threading
+
+import pytest
+
+from gcop.git import get_git_backend
+from gcop.history import scan_history
+from gcop.info import PROBES, ProbeContext, iter_repo_info
+
+
+@pytest.mark.parametrize("probe", PROBES, ids=[probe.label for probe in PROBES])
+def test_info_section(bench, in_repo, probe):
+    def section():
+        with get_git_backend(timeout=probe.timeout) as git:
+            return probe.func(ProbeContext(probe.timeout, {}, threading.Lock(), git))
+
+    bench(section, rounds=5)
+
+
+def test_info_command(bench, in_repo):
+    sections = bench(lambda: list(iter_repo_info()), rounds=5)
+    assert len(sections) == len(PROBES)
+
+
+def test_scan_history(bench, in_repo, repo_size):
+    stats = bench(scan_history, rounds=3)
+    assert stats.commits == repo_size.commits
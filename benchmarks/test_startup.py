@@ -0,0 +1,74 @@
+"""Startup of the CLI and loading of the config, independent of the repository."""
+
+import subprocess
+import sys
+
+import pytest
+
+from gcop.config import GcopConfig
+
+_CONFIG_YAML: str = """\
+model:
+  model_name: openai/gpt-4o
+  api_key: sk-xxx
+  api_base: https://api.openai.com/v1
+commit_template: |
+  feat: implement user registration
+diff_filter:
+  max_tokens: 8000
+large_diff:
+  chunk_tokens: 4000
+rate_limit:
+  requests_per_minute: 60
+"""
+
+
+@pytest.mark.parametrize(
+    "args",
+    [["-c", "import gcop.__main__"], ["-m", "gcop", "--help"]],
+    ids=["import", "help"],
+)
+def test_cli_cold_start(bench, args):
+    bench(
+        lambda: subprocess.run(
+            [sys.executable, *args], check=True, capture_output=True
+        ),
+        rounds=5,
+    )
+
+
+def test_config_loading(bench, tmp_path):
+    from zeeland import Singleton
+
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(_CONFIG_YAML, encoding="utf-8")
+
+    config = bench(
+        lambda: GcopConfig.from_yaml(str(config_path)),
+        rounds=50,
+        setup=lambda: Singleton._instances.pop(GcopConfig, None),
+    )
+    Singleton._instances.pop(GcopConfig, None)
+    assert config.rate_limit.requests_per_minute == 60
+
+
+def test_config_snapshot_loading(bench, tmp_path, monkeypatch):
+    """`load_config` in a new process whose config files did not change."""
+    from gcop import config as config_module
+
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(_CONFIG_YAML, encoding="utf-8")
+    monkeypatch.setattr(
+        config_module,
+        "get_default_storage_path",
+        lambda name="": str(tmp_path / "storage" / name),
+    )
+    config_module.load_config(str(tmp_path), str(config_path))
+
+    config = bench(
+        lambda: config_module.load_config(str(tmp_path), str(config_path)),
+        rounds=50,
+        setup=lambda: config_module._loaded.clear(),
+    )
+    config_module._loaded.clear()
+    assert config.rate_limit.requests_per_minute == 60
@@ -2,6 +2,10 @@
 """gcop is your local git command copilot"""
 
 import sys
+import time
+
+# When gcop started, the startup phase of `gcop.telemetry` is measured from it.
+_started_at: float = time.perf_counter()
 
 if sys.version_info >= (3, 8):
     from importlib import metadata as importlib_metadata
@@ -16,4 +20,10 @@ def get_version() -> str:
         return "unknown"
 
 
-version: str = get_version()
+def __getattr__(name: str):
+    # `version` is resolved on first access only, so that commands which never
+    # display it do not pay for the package metadata lookup at startup.
+    if name == "version":
+        globals()["version"] = get_version()
+        return globals()["version"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
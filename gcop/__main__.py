@@ -1,25 +1,26 @@
 import os
 import subprocess
-from enum import Enum
 from functools import wraps
 from pathlib import Path
-from typing import Callable, Dict, List, Literal, Optional
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
 
 import click
-import pne
-import questionary
-import requests
 import typer
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field
 
-from gcop import prompt, version
-from gcop.config import GcopConfig, ModelConfig, get_config
+from gcop import telemetry
+from gcop.config import GcopConfig
 from gcop.utils import check_version_update, migrate_config_if_needed
 from gcop.utils.logger import Color, logger
 
+if TYPE_CHECKING:
+    from gcop.commit import CommitMessage, CommitMessageStream
+
 load_dotenv()
 
+# Diffs longer than this many characters are shown as a summary of the files.
+_MAX_DISPLAYED_DIFF: int = 20000
+
 app = typer.Typer(
     name="gcop",
     help="gcop is your local git command copilot",
@@ -27,80 +28,29 @@ app = typer.Typer(
 )
 
 
-class CommitMessage(BaseModel):
-    thought: str = Field(
-        ..., description="the reasoning of why output these commit messages"
-    )  # noqa
-    content: str = Field(
-        ...,
-        description="git commit messages based on guidelines",  # noqa
-    )
-
-
-def get_git_diff(diff_type: Literal["--staged", "--cached"]) -> str:
-    """Get git diff
-
-    Args:
-        diff_type(str): diff type, --staged or --cached
-
-    Returns:
-        str: git diff
-    """
-    try:
-        result = subprocess.check_output(
-            ["git", "diff", diff_type], text=True, encoding="utf-8"
-        )
-        return result
-    except subprocess.CalledProcessError as e:
-        raise ValueError(f"Error getting git diff: {e}")
-
-
-def generate_commit_message(
-    diff: str,
-    instruction: Optional[str] = None,
-    previous_commit_message: Optional[str] = None,
-) -> CommitMessage:
-    """Generate a git commit message based on the given diff.
-
-    Args:
-        diff(str): git diff
-        instruction(Optional[str]): additional instruction. Defaults to None.
-        previous_commit_message(Optional[str]): previous commit message. At the first
-            time, it's usually empty. It always uses when you are improving the
-            commit message or providing feedback. Defaults to None.
-
-    Returns:
-        str: git commit message with ai generated.
-    """
-    gcop_config = get_config()
-
-    instruction: str = prompt.get_commit_instrcution(
-        diff=diff,
-        commit_template=gcop_config.commit_template,
-        instruction=instruction,
-        previous_commit_message=previous_commit_message,
-    )
-
-    model_config: ModelConfig = gcop_config.model_config
-    return pne.chat(
-        messages=instruction,
-        model=model_config.model_name,
-        model_config={
-            "api_key": model_config.api_key,
-            "api_base": model_config.api_base,
-            "temperature": 0.0,
-        },
-        output_schema=CommitMessage,
-    )
-
-
 def check_version_before_command(f: Callable) -> Callable:
-    """Decorator to check version before executing any command."""
+    """Decorator to check version before executing any command, and to record
+    the phases of the run, see `gcop.telemetry`. With `GCOP_PROFILE=1` the
+    command runs under cProfile."""
 
     @wraps(f)
     def wrapper(*args, **kwargs):
-        check_version_update()
-        return f(*args, **kwargs)
+        telemetry.start_run(f.__name__.replace("_command", ""))
+        status: str = "error"
+        try:
+            with telemetry.span("version_check"):
+                check_version_update()
+            if telemetry.is_profiling():
+                result = telemetry.profile(f, *args, **kwargs)
+            else:
+                result = f(*args, **kwargs)
+            status = "ok"
+            return result
+        except KeyboardInterrupt:
+            status = "interrupted"
+            raise
+        finally:
+            telemetry.finish_run(status)
 
     return wrapper
 
@@ -133,78 +83,32 @@ def init_command():
     """Add command into git config"""
     migrate_config_if_needed()
 
+    from gcop.git import GitError, get_git_backend
+
     try:
-        subprocess.run(
-            ["git", "config", "--global", "alias.p", "push"],
-            check=True,
-            encoding="utf-8",
-        )
-        subprocess.run(
-            ["git", "config", "--global", "alias.pf", "push --force"],
-            check=True,
-            encoding="utf-8",
-        )
-        subprocess.run(
-            ["git", "config", "--global", "alias.undo", "reset --soft HEAD^"],
-            check=True,
-            encoding="utf-8",
-        )
-        subprocess.run(
-            ["git", "config", "--global", "alias.gcommit", "!gcop commit"],
-            check=True,
-            encoding="utf-8",
-        )
-        subprocess.run(
-            ["git", "config", "--global", "alias.c", "!gcop commit"],
-            check=True,
-            encoding="utf-8",
-        )
-        subprocess.run(
-            ["git", "config", "--global", "alias.ac", "!git add . && gcop commit"],
-            check=True,
-            encoding="utf-8",
-        )
-        subprocess.run(
-            [
-                "git",
-                "config",
-                "--global",
-                "alias.acp",
-                "!git add . && gcop commit && git push",
-            ],
-            check=True,
-            encoding="utf-8",
-        )
-        subprocess.run(
-            ["git", "config", "--global", "alias.cp", "!gcop commit && git push"],
-            check=True,
-            encoding="utf-8",
-        )
-        subprocess.run(
-            ["git", "config", "--global", "alias.info", "!gcop info"],
-            check=True,
-            encoding="utf-8",
-        )
-        subprocess.run(
-            ["git", "config", "--global", "alias.gconfig", "!gcop config"],
-            check=True,
-            encoding="utf-8",
-        )
-        subprocess.run(
-            ["git", "config", "--global", "alias.ghelp", "!gcop help"],
-            check=True,
-            encoding="utf-8",
-        )
-        subprocess.run(
-            ["git", "config", "--global", "alias.amend", "commit --amend"],
-            check=True,
-            encoding="utf-8",
+        get_git_backend().set_config(
+            {
+                "alias.p": "push",
+                "alias.pf": "push --force",
+                "alias.undo": "reset --soft HEAD^",
+                "alias.gcommit": "!gcop commit",
+                "alias.c": "!gcop commit",
+                "alias.ac": "!git add . && gcop commit",
+                "alias.acp": "!git add . && gcop commit && git push",
+                "alias.cp": "!gcop commit && git push",
+                "alias.info": "!gcop info",
+                "alias.gconfig": "!gcop config",
+                "alias.ghelp": "!gcop help",
+                "alias.amend": "commit --amend",
+            },
+            scope="global",
         )
         logger.color_info("git aliases added successfully", color=Color.GREEN)
 
-        config_command(from_init=True)
+        # Undecorated, so the run is still recorded as an init.
+        config_command.__wrapped__(from_init=True)
         logger.color_info("gcop initialized successfully", color=Color.GREEN)
-    except subprocess.CalledProcessError as error:
+    except GitError as error:
         print(f"Error adding git aliases: {error}")
 
 
@@ -212,226 +116,66 @@ def init_command():
 @check_version_before_command
 def info_command():
     """Display detailed information about the current git repository."""
-    try:
-        # Get project name (usually the directory name)
-        project_name = os.path.basename(os.getcwd())
-
-        # Get current branch
-        current_branch = subprocess.check_output(
-            ["git", "rev-parse", "--abbrev-ref", "HEAD"], text=True
-        ).strip()
-
-        # Get latest commit info
-        latest_commit = subprocess.check_output(
-            ["git", "log", "-1", "--oneline"], text=True
-        ).strip()
-
-        # Get number of uncommitted changes
-        uncommitted_changes = len(
-            subprocess.check_output(
-                ["git", "status", "--porcelain"], text=True
-            ).splitlines()
-        )
+    from gcop.git import get_git_backend
+    from gcop.info import iter_repo_info
 
-        # Get remote URL
-        remote_url = subprocess.check_output(
-            ["git", "config", "--get", "remote.origin.url"], text=True
-        ).strip()
-
-        # Get total number of commits
-        total_commits = subprocess.check_output(
-            ["git", "rev-list", "--count", "HEAD"], text=True
-        ).strip()
-
-        # Get number of contributors
-        contributors = len(
-            set(
-                subprocess.check_output(
-                    ["git", "log", "--format='%ae'"], text=True
-                ).splitlines()
-            )
+    if get_git_backend().git_dir() is None:
+        logger.color_info(
+            "Error getting repository information: not a git repository",
+            color=Color.RED,
         )
+        return
 
-        # Get repository creation time
-        creation_time = subprocess.check_output(
-            [
-                "git",
-                "log",
-                "--reverse",
-                "--date=iso",
-                "--format=%ad",
-                "|",
-                "head",
-                "-1",
-            ],
-            text=True,
-            shell=True,
-        ).strip()
-
-        # Get last modified time
-        last_modified = subprocess.check_output(
-            ["git", "log", "-1", "--date=iso", "--format=%ad"], text=True
-        ).strip()
-
-        # Get repository size
-        repo_size = (
-            subprocess.check_output(["git", "count-objects", "-vH"], text=True)
-            .split("\n")[2]
-            .split(":")[1]
-            .strip()
+    # Sections are printed as soon as they are computed, slow ones come last.
+    for probe, value, ok in iter_repo_info():
+        logger.color_info(
+            probe.render(value), color=Color.DEFAULT if ok else Color.YELLOW
         )
 
-        # Get most active contributor
-        most_active = (
-            subprocess.check_output(
-                ["git", "shortlog", "-sn", "--no-merges", "|", "head", "-n", "1"],
-                text=True,
-                shell=True,
-            )
-            .strip()
-            .split("\t")[1]
-        )
 
-        # Get most changed file
-        most_changed = (
-            subprocess.check_output(
-                [
-                    "git",
-                    "log",
-                    "--pretty=format:",
-                    "--name-only",
-                    "|",
-                    "sort",
-                    "|",
-                    "uniq",
-                    "-c",
-                    "|",
-                    "sort",
-                    "-rg",
-                    "|",
-                    "head",
-                    "-n",
-                    "1",
-                ],
-                text=True,
-                shell=True,
-            )
-            .strip()
-            .split()[-1]
-        )
+def _render_commit_message_stream(
+    commit_stream: "CommitMessageStream",
+) -> "CommitMessage":
+    """Print a streamed commit message as it arrives.
 
-        # Get line count by language (requires cloc to be installed)
-        try:
-            line_count = subprocess.check_output(
-                ["cloc", ".", "--quiet", "--json"], text=True
-            )
-            # Parse JSON output and format it
-            import json
+    Ctrl+C stops the generation early, the message received so far is returned
+    so the user can still commit or retry it.
 
-            line_count_data = json.loads(line_count)
-            formatted_line_count = "\n".join(
-                [
-                    f"{lang}: {data['code']} lines"
-                    for lang, data in line_count_data.items()
-                    if lang != "header" and lang != "SUM"
-                ]
-            )
-            line_count = formatted_line_count
-        except FileNotFoundError:
-            line_count = (
-                "cloc not found. Please ensure it's installed and in your system PATH."
-            )
-        except json.JSONDecodeError:
-            line_count = (
-                "Error parsing cloc output. Please check if cloc is working correctly."
-            )
-        except subprocess.CalledProcessError:
-            line_count = "Error running cloc. Please check if it's installed correctly."
+    Args:
+        commit_stream(CommitMessageStream): the streamed commit message.
 
-        # Get latest tag
-        try:
-            latest_tag = subprocess.check_output(
-                ["git", "describe", "--tags", "--abbrev=0"], text=True
-            ).strip()
-        except subprocess.CalledProcessError:
-            latest_tag = "No tags found"
-
-        # Get branch count
-        branch_count = len(
-            subprocess.check_output(["git", "branch", "-a"], text=True).splitlines()
-        )
+    Returns:
+        CommitMessage: the complete or partial commit message.
+    """
+    headers: Dict[str, str] = {
+        "thought": "[Thought] ",
+        "content": "[Generated commit message]\n",
+    }
+    styles: Dict[str, str] = {"thought": "default", "content": Color.GREEN.value}
+    current_field: Optional[str] = None
 
-        # Get untracked files count
-        untracked_count = len(
-            subprocess.check_output(
-                ["git", "ls-files", "--others", "--exclude-standard"], text=True
-            ).splitlines()
+    try:
+        for field, text in commit_stream:
+            if field != current_field:
+                if current_field is not None:
+                    logger.console.print()
+                logger.console.print(headers[field], end="", style=styles[field])
+                current_field = field
+            logger.console.print(
+                text, end="", style=styles[field], markup=False, highlight=False
+            )
+        logger.console.print()
+    except KeyboardInterrupt:
+        logger.console.print()
+        logger.color_info(
+            "[Interrupted] Generation stopped, using the partial commit message",
+            color=Color.YELLOW,
         )
 
-        # Get submodule info
-        try:
-            submodules = subprocess.check_output(
-                ["git", "submodule", "status"], text=True
-            ).strip()
-            if not submodules:
-                submodules = "No submodules"
-        except subprocess.CalledProcessError:
-            submodules = "No submodules"
-
-        # Get latest merge commit
-        try:
-            latest_merge = subprocess.check_output(
-                ["git", "log", "--merges", "-n", "1", "--pretty=format:%h - %s"],
-                text=True,
-            ).strip()
-            if not latest_merge:
-                latest_merge = "No merge commits found"
-        except subprocess.CalledProcessError:
-            latest_merge = "No merge commits found"
-
-        # Get file type statistics
-        file_types = subprocess.check_output(
-            [
-                "git",
-                "ls-files",
-                "|",
-                "sed",
-                "s/.*\\.//",
-                "|",
-                "sort",
-                "|",
-                "uniq",
-                "-c",
-                "|",
-                "sort",
-                "-rn",
-            ],
-            text=True,
-            shell=True,
-        ).strip()
-
-        logger.color_info(f"Project Name: {project_name}")
-        logger.color_info(f"Current Branch: {current_branch}")
-        logger.color_info(f"Latest Commit: {latest_commit}")
-        logger.color_info(f"Uncommitted Changes: {uncommitted_changes}")
-        logger.color_info(f"Remote URL: {remote_url}")
-        logger.color_info(f"Total Commits: {total_commits}")
-        logger.color_info(f"Contributors: {contributors}")
-        logger.color_info(f"Repository Created: {creation_time}")
-        logger.color_info(f"Last Modified: {last_modified}")
-        logger.color_info(f"Repository Size: {repo_size}")
-        logger.color_info(f"Most Active Contributor: {most_active}")
-        logger.color_info(f"Most Changed File: {most_changed}")
-        logger.color_info(f"Line Count by Language:\n{line_count}")
-        logger.color_info(f"Latest Tag: {latest_tag}")
-        logger.color_info(f"Branch Count: {branch_count}")
-        logger.color_info(f"Untracked Files: {untracked_count}")
-        logger.color_info(f"Submodules: {submodules}")
-        logger.color_info(f"Latest Merge Commit: {latest_merge}")
-        logger.color_info(f"File Type Statistics:\n{file_types}")
-
-    except subprocess.CalledProcessError as e:
-        logger.color_info(f"Error getting repository information: {e}", color=Color.RED)
+    commit_message = commit_stream.message
+    logger.info(f"[Thought] {commit_message.thought}")
+    logger.info(f"[Generated commit message]\n{commit_message.content}")
+    return commit_message
 
 
 @app.command(name="commit")
@@ -443,6 +187,20 @@ def commit_command(
     previous_commit_message: Optional[str] = typer.Option(
         None, help="Previous commit message to refine"
     ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Ignore cached commit messages for this diff"
+    ),
+    stream: Optional[bool] = typer.Option(
+        None,
+        "--stream/--no-stream",
+        help="Print the commit message while it is generated. Defaults to the "
+        "`enable_stream` config.",
+    ),
+    candidates: Optional[int] = typer.Option(
+        None,
+        help="Number of commit messages generated at the same time, retries show "
+        "the next one without waiting. Defaults to the `candidates` config.",
+    ),
 ):
     """Generate a git commit message based on the staged changes and commit the
     changes.
@@ -452,51 +210,496 @@ def commit_command(
     select "retry". If you want to retry the commit message generation with new
     feedback, please select "retry by feedback". If you want to exit the commit
     process, please select "exit".
+
+    With `--stream`, the commit message is printed while it is generated. Press
+    Ctrl+C to stop the generation early and decide what to do with the partial
+    message.
+
+    With `--candidates N`, N commit messages are generated at the same time and
+    more are generated while you read them. "retry" shows the next one, and
+    "choose candidate" picks one of those ready so far. Candidates are not
+    streamed.
     """
-    diff: str = get_git_diff("--staged")
+    import questionary
+
+    from gcop import daemon
+    from gcop.commit import (
+        CommitCandidates,
+        CommitMessage,
+        CommitSession,
+    )
+    from gcop.config import GcopConfig, get_config
+    from gcop.diff import (
+        FileDiff,
+        FilteredDiff,
+        filter_diff,
+        format_stat,
+        render_diff,
+    )
+    from gcop.git import get_git_backend
+    from gcop.transport import get_transport
+    from gcop.watch import load_pregenerated
+
+    with telemetry.span("git_diff"):
+        files: List[FileDiff] = get_git_backend().staged_diff()
+        diff: str = render_diff(files)
 
     if not diff:
         logger.color_info("No staged changes", color=Color.YELLOW)
         return
 
-    logger.color_info(f"[Code diff] \n{diff}", color=Color.YELLOW)
-    logger.color_info("[On Ready] Generating commit message...")
+    gcop_config: GcopConfig = get_config()
+    telemetry.set_model(gcop_config.model_config.model_name)
+    # Large diffs are summarized part by part instead of being trimmed.
+    with telemetry.span("diff_filter"):
+        filtered: FilteredDiff = filter_diff(
+            diff,
+            gcop_config.diff_filter,
+            trim=not gcop_config.large_diff.enable,
+            files=files,
+        )
+    diff = filtered.text
 
-    commit_messages: CommitMessage = generate_commit_message(
-        diff, instruction, previous_commit_message
+    if len(diff) <= _MAX_DISPLAYED_DIFF:
+        logger.color_info(f"[Code diff] \n{diff}", color=Color.YELLOW)
+    else:
+        # Printing megabytes of diff takes long and helps nobody.
+        logger.color_info(f"[Code diff] \n{format_stat(files)}", color=Color.YELLOW)
+    for note in filtered.elided:
+        logger.color_info(f"[Diff filter] {note}", color=Color.YELLOW)
+
+    if stream is None:
+        stream = gcop_config.enable_stream
+    if candidates is None:
+        candidates = gcop_config.candidates
+
+    # The session keeps the diff, the prompt and the conversation across retries.
+    # A running `gcop daemon` answers without paying for the LLM stack startup,
+    # otherwise the model is called in-process.
+    session = CommitSession(
+        diff,
+        instruction,
+        previous_commit_message,
+        use_cache=not no_cache,
+        client=daemon.connect(
+            gcop_config.model_config,
+            enable_prompt_cache=gcop_config.enable_prompt_cache,
+            rate_limit=gcop_config.rate_limit,
+            transport=get_transport(gcop_config.transport),
+        ),
+        gcop_config=gcop_config,
     )
+    # `gcop watch` may have generated the message while the changes were staged.
+    pregenerated: Optional[CommitMessage] = None
+    if not (no_cache or instruction or previous_commit_message):
+        pregenerated = load_pregenerated(gcop_config)
+
+    pool: Optional[CommitCandidates] = None
+    # A pre-generated message needs no candidates, retries are generated live.
+    if candidates > 1 and not pregenerated:
+        logger.color_info(f"[Candidates] Generating {candidates} commit messages...")
+        pool = CommitCandidates(session, candidates)
+
+    def show(commit_message: CommitMessage) -> None:
+        logger.color_info(f"[Thought] {commit_message.thought}")
+        logger.color_info(
+            f"[Generated commit message]\n{commit_message.content}",
+            color=Color.GREEN,
+        )
 
-    logger.color_info(f"[Thought] {commit_messages.thought}")
-    logger.color_info(
-        f"[Generated commit message]\n{commit_messages.content}", color=Color.GREEN
+    def generate(feedback: Optional[str] = None, retry: bool = False) -> CommitMessage:
+        if pregenerated and not retry:
+            logger.color_info("[On Ready] Using the pre-generated commit message")
+            session.accept(pregenerated)
+            show(pregenerated)
+            return pregenerated
+
+        logger.color_info("[On Ready] Generating commit message...")
+        if pool and retry and not feedback:
+            with telemetry.span("model"):
+                candidate: Optional[CommitMessage] = pool.next()
+            if candidate:
+                show(candidate)
+                return candidate
+
+        if pool and not retry:
+            with telemetry.span("model"):
+                commit_message: CommitMessage = pool.first()
+            show(commit_message)
+        elif stream and not pool:
+            commit_stream = session.stream(feedback)
+            commit_message = _render_commit_message_stream(commit_stream)
+            if commit_stream.completed and not commit_stream.is_valid:
+                # Eg: the connection dropped or the answer was not complete JSON.
+                logger.color_info(
+                    "[Stream] No complete commit message received, generating it "
+                    "without streaming",
+                    color=Color.YELLOW,
+                )
+                commit_message = session.generate(feedback)
+                show(commit_message)
+        else:
+            commit_message = session.generate(feedback)
+            show(commit_message)
+        if session.last_usage:
+            telemetry.add_usage(
+                session.last_usage.prompt_tokens,
+                session.last_usage.completion_tokens,
+            )
+            logger.color_info(f"[Usage] {session.last_usage}")
+        return commit_message
+
+    try:
+        commit_messages: CommitMessage = generate()
+        while True:
+            choices: List[str] = ["yes", "retry", "retry by feedback", "exit"]
+            if pool and len(pool.ready) > 1:
+                choices.insert(2, "choose candidate")
+            with telemetry.span("interactive"):
+                response = questionary.select(
+                    "Do you want to commit the changes with this message?",
+                    choices=choices,
+                ).ask()
+
+            if response == "yes":
+                if not commit_messages.content.strip():
+                    logger.color_info(
+                        "The commit message is empty, retry to generate one",
+                        color=Color.RED,
+                    )
+                    continue
+                subprocess.run(["git", "commit", "-m", commit_messages.content])
+            elif response == "retry":
+                commit_messages = generate(retry=True)
+                continue
+            elif response == "choose candidate":
+                ready: List[CommitMessage] = pool.ready
+                with telemetry.span("interactive"):
+                    chosen: Optional[CommitMessage] = questionary.select(
+                        "Which commit message do you want to use?",
+                        choices=[
+                            questionary.Choice(c.content.partition("\n")[0], value=c)
+                            for c in ready
+                        ],
+                    ).ask()
+                # None when the question was cancelled, eg: with Ctrl+C.
+                if chosen is not None:
+                    commit_messages = chosen
+                    pool.choose(commit_messages)
+                    show(commit_messages)
+                continue
+            elif response == "retry by feedback":
+                with telemetry.span("interactive"):
+                    feedback: str = questionary.text(
+                        "Please enter your feedback:"
+                    ).ask()
+                commit_messages = generate(feedback, retry=True)
+                continue
+            else:
+                logger.color_info("Exiting commit process.", color=Color.YELLOW)
+            break
+    finally:
+        if pool:
+            pool.close()
+
+
+@app.command(name="daemon")
+@check_version_before_command
+def daemon_command(
+    action: str = typer.Argument(
+        "start", help="One of start, stop, status or run (in the foreground)"
+    ),
+):
+    """Manage the background daemon which keeps the model client warm, so that
+    `gcop commit` answers faster. Commands fall back to running in-process when
+    the daemon is not running."""
+    from gcop import daemon
+
+    if not daemon.is_supported():
+        logger.color_info(
+            "gcop daemon is not supported on this platform", color=Color.RED
+        )
+        return
+
+    pong = daemon.ping()
+    if action == "status":
+        if pong:
+            logger.color_info(
+                f"gcop daemon {pong['version']} is running, pid {pong['pid']}",
+                color=Color.GREEN,
+            )
+        else:
+            logger.color_info("gcop daemon is not running", color=Color.YELLOW)
+    elif action == "start":
+        if pong:
+            logger.color_info(
+                f"gcop daemon is already running, pid {pong['pid']}",
+                color=Color.YELLOW,
+            )
+            return
+        logger.color_info("Starting gcop daemon...")
+        pong = daemon.start()
+        if pong:
+            logger.color_info(
+                f"gcop daemon started, pid {pong['pid']}", color=Color.GREEN
+            )
+        else:
+            logger.color_info(
+                "gcop daemon did not start, run `gcop daemon run` to see why",
+                color=Color.RED,
+            )
+    elif action == "stop":
+        if daemon.stop():
+            logger.color_info("gcop daemon stopped", color=Color.GREEN)
+        else:
+            logger.color_info("gcop daemon is not running", color=Color.YELLOW)
+    elif action == "run":
+        daemon.serve()
+    else:
+        logger.color_info(
+            f"Unknown action `{action}`, expected start, stop, status or run",
+            color=Color.RED,
+        )
+
+
+@app.command(name="watch")
+@check_version_before_command
+def watch_command(
+    interval: float = typer.Option(1.0, help="Seconds between two looks at the index"),
+    debounce: float = typer.Option(
+        2.0, help="Seconds the staged changes must stay unchanged"
+    ),
+):
+    """Generate commit messages in the background while you stage changes, so
+    that `gcop commit` shows them without waiting. Runs until Ctrl+C."""
+    from gcop.config import get_config
+    from gcop.watch import watch
+
+    try:
+        watch(get_config(), interval=interval, debounce=debounce)
+    except KeyboardInterrupt:
+        logger.color_info("Stopped watching.", color=Color.YELLOW)
+
+
+@app.command(name="reword")
+@check_version_before_command
+def reword_command(
+    rev_range: str = typer.Argument(..., help="Commits to reword, eg: main..HEAD"),
+    jobs: int = typer.Option(4, help="Maximum number of messages generated at once"),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Show the new messages without applying them"
+    ),
+    as_json: bool = typer.Option(
+        False, "--json", help="Print the new messages as JSON, implies --dry-run"
+    ),
+    yes: bool = typer.Option(False, "--yes", "-y", help="Apply without asking"),
+):
+    """Generate new messages for a range of commits ending at HEAD and rewrite
+    them in one pass.
+
+    Messages are saved as they are generated, running the command again on the
+    same range resumes an interrupted run and reuses the messages of a dry run.
+    Merge commits keep their message.
+    """
+    import json
+
+    import questionary
+
+    from gcop.config import get_config
+    from gcop.git import GitError
+    from gcop.reword import (
+        RewordError,
+        RewordState,
+        RewrittenCommit,
+        apply_messages,
+        generate_messages,
+        list_commits,
+        signed_commits,
     )
 
-    actions: Dict[str, Callable] = {
-        "yes": lambda: subprocess.run(["git", "commit", "-m", commit_messages.content]),
-        "retry": lambda: commit_command(
-            instruction=None, previous_commit_message=commit_messages.content
-        ),
-        "retry by feedback": lambda: commit_command(
-            instruction=questionary.text("Please enter your feedback:").ask(),
-            previous_commit_message=commit_messages.content,
-        ),
-        "exit": lambda: logger.color_info(
-            "Exiting commit process.", color=Color.YELLOW
+    # Keep stdout clean for the JSON preview.
+    report: Callable[..., None] = logger.info if as_json else logger.color_info
+
+    try:
+        commits: List[RewrittenCommit] = list_commits(rev_range)
+    except (RewordError, GitError) as e:
+        logger.color_info(f"Error: {e}", color=Color.RED)
+        raise typer.Exit(1)
+
+    state = RewordState(commits)
+    total: int = sum(not commit.is_merge for commit in commits)
+    done: List[int] = [len(state.messages)]
+    if state.messages:
+        report(f"[Reword] Resuming, {len(state.messages)} of {total} messages done")
+
+    def on_progress(commit: RewrittenCommit, message: Optional[str]) -> None:
+        done[0] += 1
+        subject: str = message.partition("\n")[0] if message else "failed"
+        report(f"[Reword] {done[0]}/{total} {commit.sha[:7]} {subject}")
+
+    messages: Dict[str, str] = generate_messages(
+        commits, get_config(), state, jobs=jobs, on_progress=on_progress
+    )
+
+    if as_json:
+        print(
+            json.dumps(
+                [
+                    {
+                        "commit": commit.sha,
+                        "old_message": commit.message,
+                        "new_message": messages.get(commit.sha, commit.message),
+                    }
+                    for commit in commits
+                ],
+                indent=2,
+                ensure_ascii=False,
+            )
+        )
+        return
+
+    for commit in commits:
+        if commit.sha in messages:
+            logger.color_info(
+                f"[{commit.sha[:7]}] {commit.subject}", color=Color.YELLOW
+            )
+            logger.color_info(messages[commit.sha], color=Color.GREEN)
+    missing: int = total - sum(commit.sha in messages for commit in commits)
+    if missing:
+        logger.color_info(
+            f"{missing} commits keep their message, generating it failed",
+            color=Color.YELLOW,
+        )
+    signed: List[RewrittenCommit] = signed_commits(commits, messages)
+    if signed:
+        logger.color_info(
+            f"{len(signed)} signed commits lose their signature, sign them again "
+            "after rewording",
+            color=Color.YELLOW,
+        )
+    if dry_run:
+        return
+
+    if (
+        not yes
+        and not questionary.confirm(
+            f"Rewrite {len(commits)} commits of {rev_range}?", default=False
+        ).ask()
+    ):
+        logger.color_info("Exiting reword process.", color=Color.YELLOW)
+        return
+
+    try:
+        new_head: Optional[str] = apply_messages(commits, messages)
+    except (RewordError, GitError) as e:
+        logger.color_info(f"Error: {e}", color=Color.RED)
+        raise typer.Exit(1)
+    state.clear()
+    if new_head:
+        logger.color_info(
+            f"Rewrote {rev_range}, the old HEAD was {commits[-1].sha}",
+            color=Color.GREEN,
+        )
+
+
+@app.command(name="stub-server")
+def stub_server_command(
+    host: str = typer.Option("127.0.0.1", help="Interface to listen on"),
+    port: int = typer.Option(8765, help="Port to listen on"),
+    latency: float = typer.Option(0.0, help="Seconds before the first token"),
+    token_rate: float = typer.Option(
+        0.0, help="Tokens produced per second, 0 for the whole answer at once"
+    ),
+    error_rate: float = typer.Option(
+        0.0, help="Share of requests answered with an error, between 0 and 1"
+    ),
+    error_status: int = typer.Option(429, help="HTTP status of injected errors"),
+    retry_after: float = typer.Option(1.0, help="Retry-After of injected 429s"),
+    seed: Optional[int] = typer.Option(None, help="Seed of the error injection"),
+):
+    """Run a local OpenAI compatible server which makes up answers, to test gcop
+    without a provider. Runs until Ctrl+C."""
+    from gcop.stub_server import StubServer, StubServerConfig
+
+    server = StubServer(
+        StubServerConfig(
+            latency=latency,
+            token_rate=token_rate,
+            error_rate=error_rate,
+            error_status=error_status,
+            retry_after=retry_after,
+            seed=seed,
         ),
-    }
+        host=host,
+        port=port,
+    )
+    logger.color_info(
+        f"Serving on {server.api_base}, use it with `model_name: openai/stub` and "
+        f"`api_base: {server.api_base}`, press Ctrl+C to stop",
+        color=Color.GREEN,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.color_info(f"Served {server.get_stats()}", color=Color.YELLOW)
+    finally:
+        server.stop()
 
-    response = questionary.select(
-        "Do you want to commit the changes with this message?",
-        choices=list(actions.keys()),
-    ).ask()
 
-    actions[response]()
+@app.command(name="stats")
+def stats_command(
+    command: Optional[str] = typer.Option(
+        None, help="Only report runs of this command, eg: commit"
+    ),
+    as_json: bool = typer.Option(False, "--json", help="Print the report as JSON"),
+):
+    """Report the latency of every phase of past gcop runs, per model."""
+    import json
+
+    records: List[dict] = telemetry.load_records()
+    summary = telemetry.summarize(records, command=command)
+    if as_json:
+        print(
+            json.dumps(
+                [
+                    {"model": model, "phase": phase, **values}
+                    for (model, phase), values in summary.items()
+                ],
+                indent=2,
+            )
+        )
+        return
+    if not summary:
+        logger.color_info(
+            "No runs recorded yet, see `GCOP_DISABLE_TELEMETRY`", color=Color.YELLOW
+        )
+        return
+
+    runs: int = sum(1 for r in records if not command or r.get("command") == command)
+    logger.color_info(f"{runs} runs", color=Color.GREEN)
+    current_model: Optional[str] = None
+    for (model, phase), values in summary.items():
+        if model != current_model:
+            current_model = model
+            logger.color_info(f"\n[{model}]", color=Color.GREEN)
+            logger.color_info(
+                f"{'phase':<18}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}"
+            )
+        unit: str = "" if phase.endswith("_tokens") else "ms"
+        logger.color_info(
+            f"{phase:<18}{values['count']:>7}"
+            + "".join(
+                f"{values[q]:>{10 - len(unit)}g}{unit}" for q in ("p50", "p95", "p99")
+            )
+        )
 
 
 @app.command(name="help")
 @check_version_before_command
 def help_command():
     """Show help message"""
+    from gcop import version
+
     help_message = f"""
 gcop is your local git command copilot
 Version: {version}
@@ -517,6 +720,11 @@ Commands:
   git cp         The same as `git gcommit && git push` command
   git amend      Amend the last commit, allowing you to modify the commit message or add changes to the previous commit
   git info       Display basic information about the current git repository
+  gcop daemon    Start, stop or check the background daemon which speeds up `git c`
+  gcop watch     Generate commit messages in the background while you stage changes
+  gcop reword    Generate new messages for a range of commits, eg: main..HEAD
+  gcop stub-server  Run a local OpenAI compatible server to test gcop offline
+  gcop stats     Report the latency of every phase of past runs, eg: p50/p95/p99
 """  # noqa
 
     logger.color_info(help_message)
@@ -0,0 +1,139 @@
+"""Content-addressed on-disk cache for generated commit messages.
+
+Each entry is a small JSON file named after the sha256 of everything that
+influences the generated message, so an unchanged staged diff can be committed
+again without another round-trip to the model.
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from gcop.utils import get_default_storage_path, write_json_atomic
+
+__all__ = ["CommitMessageCache", "make_cache_key"]
+
+_DEFAULT_MAX_ENTRIES: int = 256
+_DEFAULT_MAX_AGE: int = 7 * 24 * 60 * 60  # seconds
+
+
+def make_cache_key(*parts: Optional[str]) -> str:
+    """Hash the given parts into a stable cache key.
+
+    Every part is length-prefixed before hashing, so that ("ab", "c") and
+    ("a", "bc") never collide. None is distinguished from an empty string.
+
+    Args:
+        *parts(Optional[str]): values which influence the cached result
+
+    Returns:
+        str: hex sha256 digest
+
+    Examples:
+        >>> make_cache_key("ab", "c") == make_cache_key("a", "bc")
+        False
+        >>> make_cache_key(None) == make_cache_key("")
+        False
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            digest.update(b"\x00")
+            continue
+        data: bytes = part.encode("utf-8")
+        digest.update(b"\x01" + len(data).to_bytes(8, "big") + data)
+    return digest.hexdigest()
+
+
+class CommitMessageCache:
+    """Cache for generated commit messages with size and age based eviction.
+
+    Entries live in `<storage>/cache/commit_messages/<key>.json`. The file mtime
+    is refreshed on every hit, so eviction by mtime is least-recently-used.
+
+    Args:
+        cache_dir(Optional[str]): cache directory. Defaults to gcop storage path.
+        max_entries(int): maximum number of entries kept on disk.
+        max_age(int): maximum age of an entry in seconds.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_entries: int = _DEFAULT_MAX_ENTRIES,
+        max_age: int = _DEFAULT_MAX_AGE,
+    ) -> None:
+        self.cache_dir: str = cache_dir or os.path.join(
+            get_default_storage_path("cache"), "commit_messages"
+        )
+        self.max_entries: int = max_entries
+        self.max_age: int = max_age
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached value, or None if it is missing or expired."""
+        path: str = self._entry_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                value: Dict[str, Any] = json.load(f)
+            os.utime(path)
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def is_empty(self) -> bool:
+        """Whether there is no entry at all, without reading any of them."""
+        try:
+            with os.scandir(self.cache_dir) as it:
+                return not any(entry.name.endswith(".json") for entry in it)
+        except OSError:
+            return True
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a value and evict old entries."""
+        try:
+            write_json_atomic(self._entry_path(key), value)
+            self.evict()
+        except OSError:
+            # The cache is an optimization only, never fail a commit because of it.
+            pass
+
+    def evict(self) -> None:
+        """Remove expired entries, then the least recently used ones until at
+        most `max_entries` remain."""
+        now: float = time.time()
+        entries: List[Tuple[float, str]] = []
+
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    mtime: float = entry.stat().st_mtime
+                except OSError:
+                    continue
+                if now - mtime > self.max_age:
+                    _remove_quietly(entry.path)
+                else:
+                    entries.append((mtime, entry.path))
+
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort()
+        for _, path in entries[: len(entries) - self.max_entries]:
+            _remove_quietly(path)
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
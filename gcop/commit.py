@@ -0,0 +1,847 @@
+"""Commit message generation.
+
+This module is imported lazily by `gcop commit` so that the other commands do
+not pay for pydantic and the LLM stack at startup.
+"""
+
+import json
+import re
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from pydantic import BaseModel, Field
+
+from gcop import prompt, telemetry
+from gcop.cache import CommitMessageCache, make_cache_key
+from gcop.config import (
+    GcopConfig,
+    LargeDiffConfig,
+    ModelConfig,
+    RateLimitConfig,
+    get_config,
+)
+from gcop.diff import count_tokens
+from gcop.summarize import summarize_diff
+from gcop.transport import (
+    Completion,
+    LiveTransport,
+    ModelRequest,
+    Transport,
+    get_transport,
+)
+from gcop.utils.logger import logger
+
+__all__ = [
+    "ChatMessages",
+    "CommitCandidates",
+    "CommitMessage",
+    "CommitMessageStream",
+    "CommitSession",
+    "ModelClient",
+    "TokenUsage",
+    "get_git_diff",
+    "generate_commit_message",
+    "stream_commit_message",
+]
+
+
+# Chat messages in the OpenAI format, eg: [{"role": "user", "content": "..."}]
+ChatMessages = List[Dict[str, str]]
+
+T = TypeVar("T")
+
+# Tokens counted for the answer when a request is rate limited.
+_ANSWER_TOKENS: int = 500
+
+
+class CommitMessage(BaseModel):
+    thought: str = Field(
+        ..., description="the reasoning of why output these commit messages"
+    )  # noqa
+    content: str = Field(
+        ...,
+        description="git commit messages based on guidelines",  # noqa
+    )
+
+
+def get_git_diff(diff_type: Literal["--staged", "--cached"]) -> str:
+    """Get git diff
+
+    Args:
+        diff_type(str): diff type, --staged or --cached
+
+    Returns:
+        str: git diff, bytes which are not UTF-8 are replaced. See
+            `gcop.git.GitBackend.staged_diff` for the parsed diff.
+    """
+    from gcop.diff import render_diff
+    from gcop.git import GitError, get_git_backend
+
+    try:
+        with get_git_backend() as git:
+            return render_diff(git.staged_diff())
+    except GitError as e:
+        raise ValueError(f"Error getting git diff: {e}")
+
+
+class _JSONStringFieldParser:
+    r"""Incrementally decode top-level string fields of a streamed JSON object.
+
+    The model answers with a JSON object such as
+    `{"thought": "...", "content": "..."}`. The parser is fed raw chunks as they
+    arrive and returns the newly decoded characters of each field, so the text
+    can be rendered before the object is complete.
+
+    Examples:
+        >>> parser = _JSONStringFieldParser(["thought", "content"])
+        >>> parser.feed('{"thought": "a')
+        [('thought', 'a')]
+        >>> parser.feed('b\\n", "cont')
+        [('thought', 'b\n')]
+        >>> parser.feed('ent": "feat: x"}')
+        [('content', 'feat: x')]
+        >>> parser.values
+        {'thought': 'ab\n', 'content': 'feat: x'}
+    """
+
+    _ESCAPES: Dict[str, str] = {
+        '"': '"',
+        "\\": "\\",
+        "/": "/",
+        "b": "\b",
+        "f": "\f",
+        "n": "\n",
+        "r": "\r",
+        "t": "\t",
+    }
+
+    def __init__(self, fields: List[str]) -> None:
+        self.values: Dict[str, str] = {field: "" for field in fields}
+        self._key_pattern = re.compile(
+            r'"(%s)"\s*:\s*"' % "|".join(re.escape(field) for field in fields)
+        )
+        self._buffer: str = ""
+        self._pos: int = 0
+        self._field: Optional[str] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """Feed a chunk and return the decoded `(field, text)` pieces."""
+        self._buffer += chunk
+        deltas: List[Tuple[str, str]] = []
+
+        while self._pos < len(self._buffer):
+            if self._field is None:
+                match = self._key_pattern.search(self._buffer, self._pos)
+                if not match:
+                    break
+                self._field = match.group(1)
+                self._pos = match.end()
+                continue
+
+            decoded, closed = self._decode_string()
+            if decoded:
+                self.values[self._field] += decoded
+                deltas.append((self._field, decoded))
+            if not closed:
+                break
+            self._field = None
+
+        return deltas
+
+    def _decode_string(self) -> Tuple[str, bool]:
+        """Decode the current string value up to the end of the buffer. Returns
+        the decoded text and whether the closing quote was reached."""
+        out: List[str] = []
+        buffer, pos = self._buffer, self._pos
+
+        while pos < len(buffer):
+            char = buffer[pos]
+            if char == '"':
+                self._pos = pos + 1
+                return "".join(out), True
+            if char != "\\":
+                out.append(char)
+                pos += 1
+                continue
+
+            # Escape sequences may be split across chunks, wait for the rest.
+            if pos + 1 >= len(buffer):
+                break
+            escaped = buffer[pos + 1]
+            if escaped == "u":
+                if pos + 6 > len(buffer):
+                    break
+                try:
+                    out.append(chr(int(buffer[pos + 2 : pos + 6], 16)))
+                except ValueError:
+                    pass
+                pos += 6
+            else:
+                out.append(self._ESCAPES.get(escaped, escaped))
+                pos += 2
+
+        self._pos = pos
+        return "".join(out), False
+
+
+class CommitMessageStream:
+    """A streamed commit message.
+
+    Iterating yields `(field, text)` pieces, where field is "thought" or
+    "content", as the model produces them. After iteration, or after it was
+    interrupted, `message` holds the parsed result. A stream which ended early,
+    eg: on a dropped connection, is consumed but not `is_valid`.
+
+    Args:
+        chunks(Iterable[str]): raw text chunks of the model response.
+        on_complete(Optional[Callable[[CommitMessage], None]]): called with the
+            final message once the stream has been fully consumed, if it is
+            valid.
+    """
+
+    def __init__(
+        self,
+        chunks: Iterable[str],
+        on_complete: Optional[Callable[[CommitMessage], None]] = None,
+    ) -> None:
+        self._chunks: Iterable[str] = chunks
+        self._on_complete = on_complete
+        self._parser = _JSONStringFieldParser(list(CommitMessage.model_fields))
+        self._text: str = ""
+        self._final: Optional[CommitMessage] = None
+        self.completed: bool = False
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        for chunk in self._chunks:
+            if not chunk:
+                continue
+            self._text += chunk
+            yield from self._parser.feed(chunk)
+
+        self.completed = True
+        try:
+            self._final = CommitMessage.model_validate(_extract_json(self._text))
+        except ValueError:
+            pass
+        if self._on_complete and self.is_valid:
+            self._on_complete(self._final)
+
+    @property
+    def is_valid(self) -> bool:
+        """Whether the whole answer was received and holds a commit message."""
+        return self._final is not None and bool(self._final.content.strip())
+
+    @property
+    def message(self) -> CommitMessage:
+        """The commit message parsed from everything received so far."""
+        if self._final is not None:
+            return self._final
+        return CommitMessage(**self._parser.values)
+
+
+def _extract_json(text: str) -> dict:
+    match = re.search(r"\{.*\}", text.strip(), re.DOTALL)
+    return json.loads(match.group() if match else "", strict=False)
+
+
+def _get_cache_key(
+    gcop_config: GcopConfig,
+    diff: str,
+    instruction: Optional[str],
+    history_examples: Optional[List[str]],
+):
+    return make_cache_key(
+        diff,
+        gcop_config.commit_template or prompt._DEFAULT_COMMIT_TEMPLATE,
+        gcop_config.model_config.model_name,
+        instruction,
+        json.dumps(history_examples or []),
+    )
+
+
+@dataclass
+class TokenUsage:
+    """Token counts of one model call, as reported by the provider.
+
+    Args:
+        prompt_tokens(int): tokens of the prompt, including cached ones.
+        completion_tokens(int): tokens of the answer.
+        cached_tokens(int): prompt tokens read from the provider's prompt cache.
+        cache_write_tokens(int): prompt tokens written to the provider's prompt
+            cache, only reported by providers with explicit cache markers.
+    """
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cache_write_tokens: int = 0
+
+    @classmethod
+    def from_response(cls, usage: Optional[dict]) -> Optional["TokenUsage"]:
+        """Read the `usage` of a litellm response, where OpenAI reports cache hits
+        in `prompt_tokens_details` and Anthropic in `cache_read_input_tokens`."""
+        if not usage:
+            return None
+        details: dict = usage.get("prompt_tokens_details") or {}
+        return cls(
+            prompt_tokens=usage.get("prompt_tokens") or 0,
+            completion_tokens=usage.get("completion_tokens") or 0,
+            cached_tokens=details.get("cached_tokens")
+            or usage.get("cache_read_input_tokens")
+            or 0,
+            cache_write_tokens=usage.get("cache_creation_input_tokens") or 0,
+        )
+
+    def __str__(self) -> str:
+        return (
+            f"prompt tokens: {self.prompt_tokens} ({self.cached_tokens} cached), "
+            f"completion tokens: {self.completion_tokens}"
+        )
+
+
+def _supports_cache_markers(model_name: str) -> bool:
+    """Whether the provider only caches prompt prefixes marked with
+    `cache_control`. OpenAI and most others cache long prefixes automatically."""
+    return model_name.startswith("anthropic/") or "claude" in model_name
+
+
+class ModelClient:
+    """Sends chat messages to the configured model.
+
+    Requests go through a `gcop.transport.Transport`, which sends them to the
+    provider, or records or replays them. litellm keeps its HTTP clients in an
+    in-process cache, so requests made through the same process reuse the
+    pooled connections.
+
+    Commit messages are requested with the output format in the system prompt,
+    see `CommitSession`.
+
+    Every request waits for the budget of the model and is retried on 429, see
+    `gcop.ratelimit`.
+
+    Args:
+        model_config(ModelConfig): model to talk to.
+        enable_prompt_cache(bool): whether to set cache markers for providers
+            which need them. Defaults to True.
+        rate_limit(Optional[RateLimitConfig]): budgets of the model. Defaults to
+            `RateLimitConfig()`, which only retries on 429.
+        transport(Optional[Transport]): how requests reach the model. Defaults
+            to `LiveTransport()`.
+    """
+
+    def __init__(
+        self,
+        model_config: ModelConfig,
+        enable_prompt_cache: bool = True,
+        rate_limit: Optional[RateLimitConfig] = None,
+        transport: Optional[Transport] = None,
+    ) -> None:
+        from gcop.ratelimit import RateLimiter, get_rate_limiter
+
+        self.model_config: ModelConfig = model_config
+        self.enable_prompt_cache: bool = enable_prompt_cache
+        self.transport: Transport = transport or LiveTransport()
+        self.last_usage: Optional[TokenUsage] = None
+        self._limiter: Optional[RateLimiter] = get_rate_limiter(
+            model_config, rate_limit or RateLimitConfig()
+        )
+
+    def _call(self, fn: Callable[[], T], messages: ChatMessages) -> T:
+        if self._limiter is None:
+            return fn()
+        tokens: int = _ANSWER_TOKENS + sum(
+            count_tokens(str(message.get("content", ""))) for message in messages
+        )
+        return self._limiter.call(fn, tokens)
+
+    def _request(
+        self, messages: ChatMessages, temperature: Optional[float] = None
+    ) -> ModelRequest:
+        return ModelRequest(
+            self.model_config,
+            messages,
+            temperature,
+            cache_markers=self.enable_prompt_cache
+            and _supports_cache_markers(self.model_config.model_name),
+        )
+
+    def chat(self, messages: ChatMessages) -> str:
+        """Get the plain text answer of the model."""
+        request = ModelRequest(self.model_config, messages)
+        return self._call(lambda: self.transport.complete(request), messages).text
+
+    def generate(
+        self, messages: ChatMessages, temperature: Optional[float] = None
+    ) -> CommitMessage:
+        """Get a commit message, the output format must be part of the
+        messages. The temperature defaults to 0."""
+        self.last_usage = None
+        request: ModelRequest = self._request(messages, temperature)
+        completion: Completion = self._call(
+            lambda: self.transport.complete(request), messages
+        )
+        self.last_usage = TokenUsage.from_response(completion.usage)
+        return CommitMessage.model_validate(_extract_json(completion.text))
+
+    def stream(self, messages: ChatMessages) -> Iterable[str]:
+        """Like `generate`, but return the raw text chunks of the answer as the
+        model produces them. See `CommitMessageStream` to parse them. Usage is
+        only known for providers with cache markers, once the stream is
+        consumed. Only the request is rate limited, not reading the answer."""
+        self.last_usage = None
+        request: ModelRequest = self._request(messages)
+        chunks: Iterator[Completion] = self._call(
+            lambda: self.transport.stream(request), messages
+        )
+        return self._read_stream(chunks)
+
+    def _read_stream(self, chunks: Iterable[Completion]) -> Iterator[str]:
+        for chunk in chunks:
+            if chunk.usage:
+                self.last_usage = TokenUsage.from_response(chunk.usage)
+            if chunk.text:
+                yield chunk.text
+
+
+def _timed_stream(started_at: float, chunks: Iterable[str]) -> Iterator[str]:
+    """Record the time to the first chunk and until the last one of a stream
+    whose request was sent at `started_at`."""
+    first: bool = True
+    try:
+        for chunk in chunks:
+            if first:
+                telemetry.record("first_token", time.perf_counter() - started_at)
+                first = False
+            yield chunk
+    finally:
+        telemetry.record("model", time.perf_counter() - started_at)
+
+
+def _get_prompt_diff(
+    gcop_config: GcopConfig, diff: str, chat: Callable[[ChatMessages], str]
+) -> str:
+    """Return the diff to put into the prompt, summarized part by part if it is
+    larger than the token budget."""
+    large_diff: LargeDiffConfig = gcop_config.large_diff
+    if not large_diff.enable or (
+        count_tokens(diff) <= gcop_config.diff_filter.max_tokens
+    ):
+        return diff
+
+    with telemetry.span("summarize"):
+        return summarize_diff(
+            diff,
+            chat=lambda text: chat([{"role": "user", "content": text}]),
+            model=gcop_config.model_config.model_name,
+            chunk_tokens=large_diff.chunk_tokens,
+            max_concurrency=large_diff.max_concurrency,
+        )
+
+
+class CommitSession:
+    """The conversation with the model during one interactive `gcop commit`.
+
+    The diff, the rendered prompt and the previous answers are kept across
+    retries, so a retry only costs the model call: the follow-up is appended to
+    the conversation instead of rendering and sending a new prompt.
+
+    Messages generated for a fresh diff are cached on disk, keyed by the diff, the
+    effective commit template, the model name, the instruction and the history
+    examples. Retries always go to the model.
+
+    Args:
+        diff(str): git diff
+        instruction(Optional[str]): additional instruction. Defaults to None.
+        previous_commit_message(Optional[str]): commit message to improve, if the
+            session starts from an existing one. Defaults to None.
+        use_cache(bool): whether to read and write the commit message cache.
+            Defaults to True.
+        client(Optional[ModelClient]): client used to talk to the model. Defaults
+            to an in-process `ModelClient`.
+        gcop_config(Optional[GcopConfig]): config. Defaults to `get_config()`.
+        history_examples(Optional[List[str]]): past commit messages to show as
+            examples. Defaults to the ones relevant to the diff when
+            `include_git_history` is enabled.
+    """
+
+    def __init__(
+        self,
+        diff: str,
+        instruction: Optional[str] = None,
+        previous_commit_message: Optional[str] = None,
+        use_cache: bool = True,
+        client: Optional[ModelClient] = None,
+        gcop_config: Optional[GcopConfig] = None,
+        history_examples: Optional[List[str]] = None,
+    ) -> None:
+        self.gcop_config: GcopConfig = gcop_config or get_config()
+        self.client: ModelClient = client or ModelClient(
+            self.gcop_config.model_config,
+            enable_prompt_cache=self.gcop_config.enable_prompt_cache,
+            rate_limit=self.gcop_config.rate_limit,
+            transport=get_transport(self.gcop_config.transport),
+        )
+        self.diff: str = diff
+        self.instruction: Optional[str] = instruction
+        self.previous_commit_message: Optional[str] = previous_commit_message
+        self.use_cache: bool = use_cache
+        self.history_examples: Optional[List[str]] = history_examples
+        self.history: ChatMessages = []
+
+        self._base_messages: Optional[ChatMessages] = None
+        # The messages of the last turn and a getter of its answer, which is
+        # only known once a streamed answer has been consumed, None if the
+        # answer is to be asked again.
+        self._last_turn: Optional[
+            Tuple[Optional[ChatMessages], Callable[[], Optional[CommitMessage]]]
+        ] = None
+
+    def _resolve_history_examples(self) -> List[str]:
+        if self.history_examples is None:
+            self.history_examples = []
+            if self.gcop_config.include_git_history:
+                from gcop.examples import get_history_examples
+
+                with telemetry.span("git_history"):
+                    self.history_examples = get_history_examples(
+                        self.diff, self.gcop_config
+                    )
+        return self.history_examples
+
+    @property
+    def base_messages(self) -> ChatMessages:
+        """The messages of the first turn, rendered once per session.
+
+        The system message only depends on the commit template and is followed
+        by the diff, retries are separate turns after it. Providers cache the
+        longest prefix they have seen before, so retries only pay for the new
+        turns.
+        """
+        if self._base_messages is None:
+            self._resolve_history_examples()
+            diff: str = _get_prompt_diff(self.gcop_config, self.diff, self.client.chat)
+            with telemetry.span("prompt"):
+                system: str = prompt.get_commit_system_prompt(
+                    commit_template=self.gcop_config.commit_template,
+                    output_schema=json.dumps(CommitMessage.model_json_schema()),
+                )
+                user: str = prompt.get_commit_user_prompt(
+                    diff=diff,
+                    instruction=self.instruction,
+                    previous_commit_message=self.previous_commit_message,
+                    history_examples=self.history_examples,
+                )
+            self._base_messages = [
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ]
+        return self._base_messages
+
+    @property
+    def last_usage(self) -> Optional[TokenUsage]:
+        """Token usage of the last model call, None if it was answered from the
+        cache or the provider did not report it."""
+        if self._last_turn is not None and self._last_turn[0] is None:
+            return None
+        return self.client.last_usage
+
+    def _next_messages(self, feedback: Optional[str]) -> ChatMessages:
+        if self._last_turn is not None:
+            messages, get_answer = self._last_turn
+            self._last_turn = None
+            answer: Optional[CommitMessage] = get_answer()
+            # There is nothing to improve on in an empty answer, ask again.
+            if answer is not None and answer.content.strip():
+                self.history = [
+                    *(messages or self.base_messages),
+                    {"role": "assistant", "content": answer.model_dump_json()},
+                ]
+
+        if not self.history:
+            return self.base_messages
+        return [
+            *self.history,
+            {"role": "user", "content": prompt.get_retry_instruction(feedback)},
+        ]
+
+    def _get_cache(self) -> Tuple[Optional[CommitMessageCache], Optional[str]]:
+        """The cache and key to use for this turn, only the first turn of a fresh
+        diff is cached."""
+        if (
+            not self.use_cache
+            or self.previous_commit_message
+            or self.history
+            or self._last_turn is not None
+        ):
+            return None, None
+        cache_key = _get_cache_key(
+            self.gcop_config,
+            self.diff,
+            self.instruction,
+            self._resolve_history_examples(),
+        )
+        return CommitMessageCache(), cache_key
+
+    def generate(self, feedback: Optional[str] = None) -> CommitMessage:
+        """Generate the commit message of the next turn.
+
+        Args:
+            feedback(Optional[str]): feedback on the previous commit message, only
+                used for retries. Defaults to None.
+
+        Returns:
+            CommitMessage: the generated commit message.
+        """
+        cache, cache_key = self._get_cache()
+        if cache:
+            cached: Optional[dict] = cache.get(cache_key)
+            if cached:
+                try:
+                    commit_message = CommitMessage(**cached)
+                    self._last_turn = (None, lambda: commit_message)
+                    return commit_message
+                except ValueError:
+                    pass
+
+        messages: ChatMessages = self._next_messages(feedback)
+        with telemetry.span("model"):
+            commit_message: CommitMessage = self.client.generate(messages)
+        self._last_turn = (messages, lambda: commit_message)
+
+        if cache:
+            cache.set(cache_key, commit_message.model_dump())
+        return commit_message
+
+    def generate_candidate(self, temperature: float) -> CommitMessage:
+        """Generate an alternative answer to the first turn, without adding it
+        to the conversation, see `accept`. It may be called from several threads
+        once `base_messages` has been rendered.
+
+        Args:
+            temperature(float): sampling temperature, higher values give more
+                varied messages.
+
+        Returns:
+            CommitMessage: the generated commit message.
+        """
+        return self.client.generate(self.base_messages, temperature=temperature)
+
+    def accept(self, commit_message: CommitMessage) -> None:
+        """Continue the conversation from an answer to the first turn, eg: one
+        returned by `generate_candidate` or pre-generated by `gcop watch`."""
+        self.history = []
+        self._last_turn = (None, lambda: commit_message)
+
+    def stream(self, feedback: Optional[str] = None) -> CommitMessageStream:
+        """Like `generate`, but stream the answer as it is generated. If the
+        stream is interrupted, the partial message is what a retry improves on.
+        If it ended without a valid answer, the next turn asks again.
+        """
+        cache, cache_key = self._get_cache()
+        if cache:
+            cached: Optional[dict] = cache.get(cache_key)
+            if cached:
+                commit_stream = CommitMessageStream([json.dumps(cached)])
+                self._last_turn = (None, lambda: commit_stream.message)
+                return commit_stream
+
+        messages: ChatMessages = self._next_messages(feedback)
+
+        def on_complete(commit_message: CommitMessage) -> None:
+            if cache:
+                cache.set(cache_key, commit_message.model_dump())
+
+        def get_answer() -> Optional[CommitMessage]:
+            if commit_stream.completed and not commit_stream.is_valid:
+                return None
+            return commit_stream.message
+
+        started_at: float = time.perf_counter()
+        commit_stream = CommitMessageStream(
+            _timed_stream(started_at, self.client.stream(messages)),
+            on_complete=on_complete,
+        )
+        self._last_turn = (messages, get_answer)
+        return commit_stream
+
+
+# Temperatures of the speculative candidates, in turn. The first candidate is
+# the regular answer at temperature 0.
+_CANDIDATE_TEMPERATURES: Tuple[float, ...] = (0.4, 0.7, 1.0)
+
+
+class CommitCandidates:
+    """Commit messages for the first turn of a `CommitSession`, generated ahead
+    of time so that a retry does not wait for the model.
+
+    The regular answer is generated in the calling thread while `count - 1`
+    candidates with higher temperatures are generated in the background. Every
+    candidate taken with `next` starts another one, so generation goes on while
+    the user reads. At most `count - 1` candidates are generated at once, the
+    others wait for a slot and are dropped by `close`. The workers are daemon
+    threads, leaving gcop does not wait for them.
+
+    Args:
+        session(CommitSession): session to generate candidates for.
+        count(int): number of candidates generated at the same time, including
+            the regular answer.
+    """
+
+    def __init__(self, session: CommitSession, count: int) -> None:
+        self.session: CommitSession = session
+        self.shown: List[CommitMessage] = []
+        self._futures: List[Future] = []
+        self._taken: int = 0
+        self._closed: bool = False
+        self._slots = threading.Semaphore(max(1, count - 1))
+
+        # Render the prompt once, before the workers read it.
+        session.base_messages
+        for _ in range(count - 1):
+            self._submit()
+
+    def _submit(self) -> None:
+        if self._closed:
+            return
+        temperature: float = _CANDIDATE_TEMPERATURES[
+            len(self._futures) % len(_CANDIDATE_TEMPERATURES)
+        ]
+        future: Future = Future()
+
+        def run() -> None:
+            with self._slots:
+                if self._closed:
+                    future.cancel()
+                if not future.set_running_or_notify_cancel():
+                    return
+                try:
+                    future.set_result(self.session.generate_candidate(temperature))
+                except Exception as e:
+                    future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        self._futures.append(future)
+
+    def _is_new(self, commit_message: CommitMessage) -> bool:
+        return all(shown.content != commit_message.content for shown in self.shown)
+
+    def first(self) -> CommitMessage:
+        """Generate the regular answer, it is cached like any first turn."""
+        commit_message: CommitMessage = self.session.generate()
+        self.shown.append(commit_message)
+        return commit_message
+
+    def next(self) -> Optional[CommitMessage]:
+        """Take the next candidate which differs from the ones shown before,
+        waiting for it if it is not ready yet.
+
+        Returns:
+            Optional[CommitMessage]: the candidate, None if every candidate failed
+                or repeated a previous one.
+        """
+        while self._taken < len(self._futures):
+            future: Future = self._futures[self._taken]
+            self._taken += 1
+            try:
+                commit_message: CommitMessage = future.result()
+            except Exception as e:
+                logger.error(f"[Candidates] {type(e).__name__}: {e}")
+                continue
+            if not self._is_new(commit_message):
+                continue
+
+            self._submit()
+            self.choose(commit_message)
+            return commit_message
+        return None
+
+    @property
+    def ready(self) -> List[CommitMessage]:
+        """The candidates shown so far and the ones ready to be shown."""
+        ready: List[CommitMessage] = list(self.shown)
+        for future in self._futures[self._taken :]:
+            if future.done() and not future.cancelled() and not future.exception():
+                commit_message: CommitMessage = future.result()
+                if all(c.content != commit_message.content for c in ready):
+                    ready.append(commit_message)
+        return ready
+
+    def choose(self, commit_message: CommitMessage) -> None:
+        """Continue the conversation of the session from the given candidate."""
+        if self._is_new(commit_message):
+            self.shown.append(commit_message)
+        self.session.accept(commit_message)
+
+    def close(self) -> None:
+        """Stop starting new candidates and drop the ones waiting for a slot.
+
+        A model call can not be interrupted, the candidates being generated are
+        abandoned: their calls still complete and count towards the rate limits.
+        """
+        self._closed = True
+        for future in self._futures:
+            future.cancel()
+
+
+def generate_commit_message(
+    diff: str,
+    instruction: Optional[str] = None,
+    previous_commit_message: Optional[str] = None,
+    use_cache: bool = True,
+) -> CommitMessage:
+    """Generate a git commit message based on the given diff.
+
+    Messages generated for a fresh diff are cached on disk, see `CommitSession`.
+
+    Args:
+        diff(str): git diff
+        instruction(Optional[str]): additional instruction. Defaults to None.
+        previous_commit_message(Optional[str]): previous commit message. At the first
+            time, it's usually empty. It always uses when you are improving the
+            commit message or providing feedback. Defaults to None.
+        use_cache(bool): whether to read and write the commit message cache.
+            Defaults to True.
+
+    Returns:
+        str: git commit message with ai generated.
+    """
+    return CommitSession(
+        diff, instruction, previous_commit_message, use_cache=use_cache
+    ).generate()
+
+
+def stream_commit_message(
+    diff: str,
+    instruction: Optional[str] = None,
+    previous_commit_message: Optional[str] = None,
+    use_cache: bool = True,
+) -> CommitMessageStream:
+    """Like `generate_commit_message`, but stream the answer as it is generated.
+
+    Args:
+        diff(str): git diff
+        instruction(Optional[str]): additional instruction. Defaults to None.
+        previous_commit_message(Optional[str]): previous commit message to refine.
+            Defaults to None.
+        use_cache(bool): whether to read and write the commit message cache.
+            Defaults to True.
+
+    Returns:
+        CommitMessageStream: the streamed commit message.
+    """
+    return CommitSession(
+        diff, instruction, previous_commit_message, use_cache=use_cache
+    ).stream()
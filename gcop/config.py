@@ -1,10 +1,30 @@
+import json
 import os
-from dataclasses import dataclass
-from typing import Optional
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 
 from zeeland import Singleton
 
-from gcop.utils import get_default_storage_path, read_yaml
+from gcop.cache import make_cache_key
+from gcop.utils import get_default_storage_path, read_yaml, write_json_atomic
+from gcop.utils.logger import logger
+
+# Per-repository config merged over the global one, see `load_config`.
+OVERLAY_FILE: str = ".gcop.yaml"
+_SNAPSHOT_VERSION: int = 2
+# What an overlay may set, the rest only comes from the global config.
+_OVERLAY_KEYS: Tuple[str, ...] = (
+    "commit_template",
+    "include_git_history",
+    "enable_stream",
+    "enable_prompt_cache",
+    "candidates",
+    "diff_filter",
+    "large_diff",
+    "git_history",
+)
+_OVERLAY_MODEL_KEYS: Tuple[str, ...] = ("model_name",)
 
 
 @dataclass
@@ -30,6 +50,164 @@ class ModelConfig:
     api_base: Optional[str] = None
 
 
+@dataclass
+class DiffFilterConfig:
+    """Settings for the pre-processing of staged diffs before they are sent to
+    the model.
+
+    Args:
+        enable (bool): Whether to filter the diff at all.
+        max_tokens (int): Approximate token budget of the diff in the prompt.
+        context_lines (int): Context lines kept around each change when the diff
+            is over budget.
+        filter_lockfiles (bool): Whether to elide lockfiles such as poetry.lock.
+        filter_generated (bool): Whether to elide `linguist-generated` paths.
+        filter_vendored (bool): Whether to elide vendored paths.
+        filter_minified (bool): Whether to elide minified bundles.
+        exclude (List[str]): Extra glob patterns of paths to elide.
+
+    Examples:
+        diff_filter:
+            max_tokens: 8000
+            exclude:
+                - "docs/api/*.md"
+    """
+
+    enable: bool = True
+    max_tokens: int = 12000
+    context_lines: int = 1
+    filter_lockfiles: bool = True
+    filter_generated: bool = True
+    filter_vendored: bool = True
+    filter_minified: bool = True
+    exclude: List[str] = field(default_factory=list)
+
+
+@dataclass
+class LargeDiffConfig:
+    """Settings for staged diffs larger than `diff_filter.max_tokens`.
+
+    Instead of trimming such a diff, gcop splits it by file into parts, summarizes
+    the parts concurrently and writes the commit message from the summaries.
+
+    Args:
+        enable (bool): Whether to summarize large diffs. If False, large diffs are
+            trimmed to the token budget instead.
+        chunk_tokens (int): Approximate token budget of a single part.
+        max_concurrency (int): Maximum number of parts summarized at once.
+
+    Examples:
+        large_diff:
+            chunk_tokens: 8000
+            max_concurrency: 8
+    """
+
+    enable: bool = True
+    chunk_tokens: int = 6000
+    max_concurrency: int = 4
+
+
+@dataclass
+class RateLimitConfig:
+    """Client side limits of the calls to the model, shared by all gcop processes
+    using the same model.
+
+    Args:
+        enable (bool): Whether to limit and retry the calls at all.
+        requests_per_minute (int): Requests per minute allowed by the provider,
+            0 for no limit.
+        tokens_per_minute (int): Tokens per minute allowed by the provider, 0 for
+            no limit.
+        max_retries (int): Times a call is retried after a 429 before failing.
+        max_concurrency (int): Maximum number of calls in flight in one process.
+            Halved on every 429, it grows back as calls succeed.
+
+    Examples:
+        rate_limit:
+            requests_per_minute: 60
+            tokens_per_minute: 90000
+    """
+
+    enable: bool = True
+    requests_per_minute: int = 0
+    tokens_per_minute: int = 0
+    max_retries: int = 3
+    max_concurrency: int = 8
+
+
+@dataclass
+class TransportConfig:
+    """How requests reach the model, eg: to test gcop without a provider.
+
+    Args:
+        mode (str): `live` sends requests to the provider, `record` also saves
+            the answers to the cassette, `replay` answers from the cassette only.
+            The `GCOP_TRANSPORT` environment variable takes precedence.
+        cassette (Optional[str]): path of the cassette file. The `GCOP_CASSETTE`
+            environment variable takes precedence. Defaults to
+            `<storage>/cassettes/cassette.json`.
+
+    Examples:
+        transport:
+            mode: replay
+            cassette: tests/cassettes/commit.json
+    """
+
+    mode: str = "live"
+    cassette: Optional[str] = None
+
+
+@dataclass
+class LogConfig:
+    """What is kept in the log files, in `<storage>/logs`.
+
+    Args:
+        max_message_size (int): Messages longer than this many characters, eg:
+            large diffs, are truncated in the log file, 0 for no limit.
+        max_size_mb (int): Size of the log directory above which the oldest log
+            files are removed, 0 for no limit.
+        max_age_days (int): Days after which a log file is removed, 0 to keep
+            them forever. Log files are compressed once they are no longer
+            written to.
+
+    Examples:
+        log:
+            max_message_size: 4096
+            max_size_mb: 20
+    """
+
+    max_message_size: int = 8192
+    max_size_mb: int = 50
+    max_age_days: int = 30
+
+
+@dataclass
+class GitHistoryConfig:
+    """Past commit messages shown to the model as examples of the style of the
+    repository, when `include_git_history` is enabled.
+
+    gcop keeps an index of the recent commit messages of each repository and of
+    the paths they touched. It picks the messages of the commits which touched
+    the same files or directories as the staged change, the most recent first
+    among equally relevant ones.
+
+    Args:
+        max_examples (int): Maximum number of past commit messages in the prompt.
+        max_tokens (int): Approximate token budget of all the examples.
+        max_commits (int): Number of recent commits kept in the index.
+
+    Examples:
+        include_git_history: true
+        git_history:
+            max_examples: 3
+            max_tokens: 500
+    """
+
+    max_examples: int = 5
+    max_tokens: int = 1000
+    max_commits: int = 1000
+
+
 @dataclass
 class GcopConfig(metaclass=Singleton):
     """Gcop config.
@@ -38,9 +216,32 @@ class GcopConfig(metaclass=Singleton):
         model (ModelConfig): The model config.
         commit_template (Optional[str]): The commit template. If not provided,
             default template _DEFAULT_COMMIT_TEMPLATE will be used.
-        include_git_history (bool): Whether to include the git history in the prompt.
+        include_git_history (bool): Whether to include past commit messages of
+            the repository in the prompt, as examples of its style. Defaults to
+            False.
         enable_data_improvement (bool): Whether to enable data improvement.
             Defaults to False.
+        disable_version_check (bool): Whether to skip the background check for
+            new gcop versions. Defaults to False.
+        enable_stream (bool): Whether `gcop commit` prints the commit message
+            while it is generated. Defaults to False.
+        enable_prompt_cache (bool): Whether to mark the stable prompt prefix for
+            providers which only cache marked prefixes, eg: Anthropic. Defaults
+            to True.
+        candidates (int): Number of commit messages `gcop commit` generates at
+            the same time, so that a retry shows the next one without waiting.
+            Defaults to 1.
+        diff_filter (DiffFilterConfig): How the staged diff is filtered and
+            trimmed before it is sent to the model.
+        large_diff (LargeDiffConfig): How diffs over the token budget are
+            summarized.
+        rate_limit (RateLimitConfig): How calls to the model are limited and
+            retried on 429.
+        transport (TransportConfig): Whether requests are sent, recorded or
+            replayed.
+        log (LogConfig): What is kept in the log files.
+        git_history (GitHistoryConfig): Which past commit messages are used as
+            examples, see `include_git_history`.
 
     Examples:
         The following is an example of the config yaml file:
@@ -78,6 +279,16 @@ class GcopConfig(metaclass=Singleton):
     commit_template: Optional[str] = None
     include_git_history: bool = False
     enable_data_improvement: bool = False
+    disable_version_check: bool = False
+    enable_stream: bool = False
+    enable_prompt_cache: bool = True
+    candidates: int = 1
+    diff_filter: DiffFilterConfig = field(default_factory=DiffFilterConfig)
+    large_diff: LargeDiffConfig = field(default_factory=LargeDiffConfig)
+    rate_limit: RateLimitConfig = field(default_factory=RateLimitConfig)
+    transport: TransportConfig = field(default_factory=TransportConfig)
+    log: LogConfig = field(default_factory=LogConfig)
+    git_history: GitHistoryConfig = field(default_factory=GitHistoryConfig)
 
     _config_path: str = f"{get_default_storage_path()}/config.yaml"
 
@@ -95,8 +306,12 @@ class GcopConfig(metaclass=Singleton):
         Raises:
             ValueError: If model name is not properly configured
         """
-        config: dict = read_yaml(config_path or cls._config_path)
+        return cls.from_dict(read_yaml(config_path or cls._config_path) or {})
 
+    @classmethod
+    def from_dict(cls, config: dict) -> "GcopConfig":
+        """Create the config from the data of a config file, see `from_yaml`."""
+        config = dict(config)
         try:
             config["model"] = ModelConfig(**config.get("model", {}))
         except KeyError:
@@ -114,20 +329,187 @@ class GcopConfig(metaclass=Singleton):
                 "config.\nGo https://gcop.zeeland.top/how-to-config-model see how to config model."  # noqa
             )
 
+        for key, section_cls in (
+            ("diff_filter", DiffFilterConfig),
+            ("large_diff", LargeDiffConfig),
+            ("rate_limit", RateLimitConfig),
+            ("transport", TransportConfig),
+            ("log", LogConfig),
+            ("git_history", GitHistoryConfig),
+        ):
+            if config.get(key) is None:
+                config.pop(key, None)
+            else:
+                config[key] = section_cls(**config[key])
+
         # Set commit_template to None if it's empty or only contains whitespace
         if config.get("commit_template") and not config.get("commit_template").strip():
             config["commit_template"] = None
 
-        return cls(**config)
+        # A new instance, not the singleton: long-lived processes such as
+        # `gcop daemon` load the configs of several repositories concurrently.
+        gcop_config: GcopConfig = cls.__new__(cls)
+        gcop_config.__init__(**config)
+        return gcop_config
 
     @property
     def model_config(self) -> ModelConfig:
         return self.model
 
 
+def find_overlay(cwd: Optional[str] = None) -> Optional[str]:
+    """Find the `.gcop.yaml` of the repository containing `cwd`, in `cwd` or
+    one of its parents up to the root of the repository.
+
+    Args:
+        cwd(Optional[str]): directory to look from. Defaults to the current one.
+
+    Returns:
+        Optional[str]: path of the overlay file, None if there is none.
+    """
+    directory: str = os.path.abspath(cwd or os.getcwd())
+    while True:
+        path: str = os.path.join(directory, OVERLAY_FILE)
+        if os.path.isfile(path):
+            return path
+        parent: str = os.path.dirname(directory)
+        if parent == directory or os.path.exists(os.path.join(directory, ".git")):
+            return None
+        directory = parent
+
+
+def merge_config(base: dict, overlay: dict) -> dict:
+    """Merge the data of an overlay file over the global one, section by section.
+
+    Examples:
+        >>> merge_config(
+        ...     {"model": {"model_name": "openai/gpt-4o", "api_key": "k"}},
+        ...     {"model": {"model_name": "openai/gpt-4o-mini"}, "candidates": 2},
+        ... )
+        {'model': {'model_name': 'openai/gpt-4o-mini', 'api_key': 'k'}, 'candidates': 2}
+    """
+    merged: dict = dict(base)
+    for key, value in overlay.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _read_overlay(path: str) -> dict:
+    overlay: dict = read_yaml(path) or {}
+    # A cloned repository must not be able to send the diff and the API key to
+    # another server, nor make gcop write files elsewhere, eg: a cassette.
+    rejected: List[str] = [
+        key for key in overlay if key not in _OVERLAY_KEYS and key != "model"
+    ]
+    rejected += [
+        f"model.{key}"
+        for key in overlay.get("model") or {}
+        if key not in _OVERLAY_MODEL_KEYS
+    ]
+    if rejected:
+        raise ValueError(
+            f"{path} can not set {', '.join(rejected)}, move these settings to "
+            f"{GcopConfig._config_path}"
+        )
+    return overlay
+
+
+def _get_snapshot_path(config_path: str, overlay: Optional[str]) -> str:
+    return os.path.join(
+        get_default_storage_path("config"),
+        f"{make_cache_key(os.path.abspath(config_path), overlay)}.json",
+    )
+
+
+_loaded: Dict[Tuple[str, Optional[str]], Tuple[list, GcopConfig]] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_config(
+    cwd: Optional[str] = None, config_path: Optional[str] = None
+) -> GcopConfig:
+    """Load the global config with the `.gcop.yaml` overlay of the repository
+    containing `cwd` merged over it, see `merge_config`.
+
+    The merged data is saved as a JSON snapshot per global config and overlay,
+    and the YAML files are only parsed again when one of them changed. Configs
+    are also kept in memory, for long-lived processes such as `gcop daemon`
+    which serve several repositories.
+
+    Args:
+        cwd(Optional[str]): directory to find the overlay from. Defaults to the
+            current one.
+        config_path(Optional[str]): global config file. Defaults to
+            `~/.zeeland/gcop/config.yaml`.
+
+    Returns:
+        GcopConfig: the config.
+
+    Raises:
+        ValueError: a config file is invalid.
+    """
+    config_path = config_path or GcopConfig._config_path
+    overlay: Optional[str] = find_overlay(cwd)
+    sources: list = []
+    for path in [config_path] + ([overlay] if overlay else []):
+        stat: os.stat_result = os.stat(path)
+        sources.append([path, stat.st_mtime_ns, stat.st_size])
+
+    with _loaded_lock:
+        loaded = _loaded.get((config_path, overlay))
+    if loaded and loaded[0] == sources:
+        return loaded[1]
+
+    snapshot_path: str = _get_snapshot_path(config_path, overlay)
+    data: Optional[dict] = None
+    try:
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            snapshot: dict = json.load(f)
+        if (
+            snapshot.get("version") == _SNAPSHOT_VERSION
+            and snapshot.get("sources") == sources
+        ):
+            data = snapshot["config"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    if data is None:
+        data = read_yaml(config_path) or {}
+        if overlay:
+            data = merge_config(data, _read_overlay(overlay))
+        GcopConfig.from_dict(data)  # only valid configs are saved
+        try:
+            write_json_atomic(
+                snapshot_path,
+                {"version": _SNAPSHOT_VERSION, "sources": sources, "config": data},
+            )
+        except (OSError, TypeError, ValueError):
+            pass  # eg: a value JSON can not represent, the YAML is read next time
+
+    config: GcopConfig = GcopConfig.from_dict(data)
+    with _loaded_lock:
+        _loaded[(config_path, overlay)] = (sources, config)
+    return config
+
+
 def get_config() -> GcopConfig:
     """Get the global config instance, loading it if necessary."""
     if not hasattr(get_config, "_instance"):
-        get_config._instance = GcopConfig.from_yaml()
+        get_config._instance = load_config()
+        logger.configure(get_config._instance.log)
 
     return get_config._instance
+
+
+def reload_config() -> GcopConfig:
+    """Reload the global config instance from the config files.
+
+    Used by long-lived processes such as `gcop daemon`, which must pick up
+    changes made to the config file after they started.
+    """
+    get_config._instance = load_config()
+    logger.configure(get_config._instance.log)
+    return get_config._instance
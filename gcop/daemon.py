@@ -0,0 +1,426 @@
+"""Optional long-lived `gcop daemon` which keeps the LLM stack warm.
+
+Importing pne and litellm, parsing the config and opening a TLS connection to
+the model API take seconds in every fresh `gcop commit`. The daemon does that
+once and then serves model requests over a Unix socket, reusing the HTTP
+connections pooled by litellm between requests. Everything else, eg: reading
+the diff and rendering the prompt, stays in the `gcop commit` process.
+
+The protocol is one JSON object per line. The client sends a single request,
+the daemon answers with one or more events:
+
+- `{"command": "ping"}` -> `{"type": "pong", "pid": ..., "version": ...}`
+- `{"command": "stop"}` -> `{"type": "ok"}`
+- `{"command": "complete", "version": ..., "kind": ..., "messages": [...],
+  "cwd": ..., "temperature": ...}` ->
+  `{"type": "accepted"}`, then for kind "text" `{"type": "result", "text": ...}`,
+  for kind "commit_message" `{"type": "result", "message": {...}, "usage": ...}`
+  and for kind "stream" `{"type": "chunk", "text": ...}` events up to
+  `{"type": "done", "usage": ...}`. The usage is the token usage of the call,
+  if the provider reported it.
+
+Any failure is reported as `{"type": "error", "error": ..., "fallback": bool}`.
+When the daemon is not running, not reachable, or of another gcop version,
+requests are made in-process instead.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, Optional
+
+from gcop.utils import get_default_storage_path, spawn_detached
+from gcop.utils.logger import logger
+
+if TYPE_CHECKING:
+    from gcop.commit import ChatMessages, CommitMessage, ModelClient, TokenUsage
+    from gcop.config import ModelConfig, RateLimitConfig
+    from gcop.transport import Transport
+
+__all__ = [
+    "DaemonClient",
+    "DaemonError",
+    "connect",
+    "get_socket_path",
+    "is_supported",
+    "ping",
+    "serve",
+    "start",
+    "stop",
+]
+
+_CONNECT_TIMEOUT: float = 1.0  # seconds
+_ACCEPT_TIMEOUT: float = 0.5  # seconds between checks whether to stop
+_IDLE_TIMEOUT: float = 60 * 60  # seconds without requests before exiting
+_START_TIMEOUT: float = 30.0  # seconds to wait for a spawned daemon
+
+Event = Dict[str, Any]
+
+
+class DaemonError(RuntimeError):
+    """The daemon failed to handle a request."""
+
+
+def is_supported() -> bool:
+    """Unix sockets are not available on every platform, eg: Windows."""
+    return hasattr(socket, "AF_UNIX")
+
+
+def get_socket_path() -> str:
+    return os.path.join(get_default_storage_path("daemon"), "gcop.sock")
+
+
+def _get_version() -> str:
+    from gcop import version
+
+    return version
+
+
+def _send(conn: socket.socket, event: Event) -> None:
+    conn.sendall((json.dumps(event) + "\n").encode("utf-8"))
+
+
+class _Daemon:
+    def __init__(self, socket_path: str, idle_timeout: float) -> None:
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.last_activity: float = time.monotonic()
+        self.stopped = threading.Event()
+
+    def warm_up(self) -> None:
+        """Import the LLM stack and load the config ahead of the first request."""
+        import pne  # noqa: F401
+
+        import gcop.commit  # noqa: F401
+        from gcop.config import load_config
+
+        load_config()
+
+    def handle(self, conn: socket.socket) -> None:
+        self.last_activity = time.monotonic()
+        try:
+            with conn, conn.makefile("r", encoding="utf-8") as reader:
+                try:
+                    request: Dict[str, Any] = json.loads(reader.readline())
+                except ValueError:
+                    return
+                try:
+                    self.dispatch(request, lambda event: _send(conn, event))
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client went away, eg: Ctrl+C while streaming.
+                    pass
+                except Exception as e:
+                    logger.error(f"[Daemon] {type(e).__name__}: {e}")
+                    _send(conn, {"type": "error", "error": f"{e}", "fallback": False})
+        except OSError:
+            pass
+        finally:
+            self.last_activity = time.monotonic()
+
+    def dispatch(self, request: Dict[str, Any], send: Callable[[Event], None]):
+        command: Optional[str] = request.get("command")
+
+        if command == "ping":
+            send({"type": "pong", "pid": os.getpid(), "version": _get_version()})
+        elif command == "stop":
+            send({"type": "ok"})
+            self.stopped.set()
+        elif command == "complete":
+            if request.get("version") != _get_version():
+                send(
+                    {
+                        "type": "error",
+                        "error": "the daemon runs another gcop version",
+                        "fallback": True,
+                    }
+                )
+                return
+            send({"type": "accepted"})
+            self.complete(request, send)
+        else:
+            send({"type": "error", "error": f"unknown command: {command}"})
+
+    def complete(self, request: Dict[str, Any], send: Callable[[Event], None]):
+        from gcop.commit import ModelClient
+        from gcop.config import load_config
+
+        # The config of the repository of the client, reloaded when it changed.
+        gcop_config = load_config(request.get("cwd"))
+        client = ModelClient(
+            gcop_config.model_config,
+            enable_prompt_cache=gcop_config.enable_prompt_cache,
+            rate_limit=gcop_config.rate_limit,
+        )
+        messages: ChatMessages = request["messages"]
+        kind: Optional[str] = request.get("kind")
+
+        def usage() -> Optional[Dict[str, int]]:
+            return asdict(client.last_usage) if client.last_usage else None
+
+        if kind == "text":
+            send({"type": "result", "text": client.chat(messages)})
+        elif kind == "commit_message":
+            message = client.generate(messages, temperature=request.get("temperature"))
+            send({"type": "result", "message": message.model_dump(), "usage": usage()})
+        elif kind == "stream":
+            for chunk in client.stream(messages):
+                if chunk:
+                    send({"type": "chunk", "text": chunk})
+            send({"type": "done", "usage": usage()})
+        else:
+            send({"type": "error", "error": f"unknown kind: {kind}"})
+
+    def watch_idle(self) -> None:
+        while not self.stopped.wait(min(self.idle_timeout, 60)):
+            if time.monotonic() - self.last_activity > self.idle_timeout:
+                logger.info("[Daemon] Idle for too long, stopping")
+                self.stopped.set()
+
+
+def serve(
+    socket_path: Optional[str] = None,
+    idle_timeout: float = _IDLE_TIMEOUT,
+    warm_up: bool = True,
+) -> None:
+    """Run the daemon in the current process until it is stopped or idle.
+
+    Args:
+        socket_path(Optional[str]): path of the Unix socket. Defaults to
+            `get_socket_path()`.
+        idle_timeout(float): seconds without requests after which the daemon
+            exits.
+        warm_up(bool): whether to import the LLM stack and load the config
+            before accepting requests.
+    """
+    if not is_supported():
+        raise DaemonError("gcop daemon requires Unix domain sockets")
+
+    socket_path = socket_path or get_socket_path()
+    daemon = _Daemon(socket_path, idle_timeout)
+    if warm_up:
+        daemon.warm_up()
+
+    if os.path.exists(socket_path):
+        if ping(socket_path) is not None:
+            raise DaemonError(f"gcop daemon is already running on {socket_path}")
+        os.remove(socket_path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(socket_path)
+        os.chmod(socket_path, 0o600)
+        server.listen()
+        server.settimeout(_ACCEPT_TIMEOUT)
+        logger.info(f"[Daemon] Listening on {socket_path}, pid {os.getpid()}")
+
+        threading.Thread(target=daemon.watch_idle, daemon=True).start()
+        while not daemon.stopped.is_set():
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            conn.settimeout(None)
+            threading.Thread(target=daemon.handle, args=(conn,), daemon=True).start()
+    finally:
+        server.close()
+        try:
+            os.remove(socket_path)
+        except OSError:
+            pass
+
+
+def _request(payload: Dict[str, Any], socket_path: Optional[str]) -> Iterator[Event]:
+    """Send a request and iterate over the events of the answer.
+
+    Raises:
+        OSError: the daemon is not reachable.
+    """
+    if not is_supported():
+        raise ConnectionRefusedError("Unix domain sockets are not supported")
+    socket_path = socket_path or get_socket_path()
+    if not os.path.exists(socket_path):
+        raise FileNotFoundError(socket_path)
+
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.settimeout(_CONNECT_TIMEOUT)
+        conn.connect(socket_path)
+        _send(conn, payload)
+        # The model may take a while to answer.
+        conn.settimeout(None)
+        with conn.makefile("r", encoding="utf-8") as reader:
+            for line in reader:
+                yield json.loads(line)
+    finally:
+        conn.close()
+
+
+def ping(socket_path: Optional[str] = None) -> Optional[Event]:
+    """Return the pong event of a running daemon, or None."""
+    try:
+        return next(_request({"command": "ping"}, socket_path), None)
+    except (OSError, ValueError):
+        return None
+
+
+def stop(socket_path: Optional[str] = None) -> bool:
+    """Ask a running daemon to stop. Returns whether one was running."""
+    try:
+        return next(_request({"command": "stop"}, socket_path), None) is not None
+    except (OSError, ValueError):
+        return False
+
+
+def start(timeout: float = _START_TIMEOUT) -> Optional[Event]:
+    """Start the daemon in a detached process and wait until it answers.
+
+    Returns:
+        Optional[Event]: the pong event of the daemon, None if it did not come up
+            in time.
+    """
+    spawn_detached("from gcop.daemon import serve; serve()")
+
+    deadline: float = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        pong: Optional[Event] = ping()
+        if pong is not None:
+            return pong
+        time.sleep(0.2)
+    return None
+
+
+def connect(
+    model_config: "ModelConfig",
+    socket_path: Optional[str] = None,
+    enable_prompt_cache: bool = True,
+    rate_limit: Optional["RateLimitConfig"] = None,
+    transport: Optional["Transport"] = None,
+) -> "ModelClient":
+    """Get a model client which goes through the daemon if it is running.
+
+    Args:
+        model_config(ModelConfig): model to talk to in-process, when the daemon is
+            not running, runs another gcop version or goes away.
+        socket_path(Optional[str]): path of the Unix socket. Defaults to
+            `get_socket_path()`.
+        enable_prompt_cache(bool): see `gcop.commit.ModelClient`. Defaults to
+            True.
+        rate_limit(Optional[RateLimitConfig]): see `gcop.commit.ModelClient`.
+        transport(Optional[Transport]): see `gcop.commit.ModelClient`. Requests
+            which are recorded or replayed do not go through the daemon.
+
+    Returns:
+        ModelClient: a `DaemonClient`, or the in-process `ModelClient`.
+    """
+    from gcop.commit import ModelClient
+
+    local = ModelClient(
+        model_config,
+        enable_prompt_cache=enable_prompt_cache,
+        rate_limit=rate_limit,
+        transport=transport,
+    )
+    if local.transport.mode != "live":
+        return local
+    pong: Optional[Event] = ping(socket_path)
+    if pong is None or pong.get("version") != _get_version():
+        return local
+    return DaemonClient(local, socket_path)
+
+
+class DaemonClient:
+    """Sends chat messages to the model through the daemon, with the interface of
+    `gcop.commit.ModelClient`.
+
+    Args:
+        fallback(ModelClient): used when the daemon can not take a request.
+        socket_path(Optional[str]): path of the Unix socket. Defaults to
+            `get_socket_path()`.
+    """
+
+    def __init__(self, fallback: "ModelClient", socket_path: Optional[str] = None):
+        self.fallback = fallback
+        self.socket_path = socket_path
+        self.last_usage: Optional["TokenUsage"] = None
+
+    def _complete(
+        self, kind: str, messages: "ChatMessages", **options: Any
+    ) -> Optional[Iterator[Event]]:
+        """Send a request, returning its events once the daemon accepted it, or
+        None when it should be made in-process instead."""
+        payload: Dict[str, Any] = {
+            "command": "complete",
+            "version": _get_version(),
+            "kind": kind,
+            "messages": messages,
+            "cwd": os.getcwd(),
+            **options,
+        }
+        try:
+            events: Iterator[Event] = _request(payload, self.socket_path)
+            first: Optional[Event] = next(events, None)
+        except (OSError, ValueError):
+            return None
+
+        if first is None or (first["type"] == "error" and first.get("fallback")):
+            return None
+        if first["type"] == "error":
+            raise DaemonError(first["error"])
+        return events
+
+    def _result(self, events: Iterator[Event]) -> Event:
+        event: Optional[Event] = next(events, None)
+        if event is None:
+            raise DaemonError("the daemon closed the connection")
+        if event["type"] == "error":
+            raise DaemonError(event["error"])
+        return event
+
+    def _read_usage(self, event: Event) -> None:
+        from gcop.commit import TokenUsage
+
+        usage: Optional[Dict[str, int]] = event.get("usage")
+        self.last_usage = TokenUsage(**usage) if usage else None
+
+    def chat(self, messages: "ChatMessages") -> str:
+        events = self._complete("text", messages)
+        if events is None:
+            return self.fallback.chat(messages)
+        return self._result(events)["text"]
+
+    def generate(
+        self, messages: "ChatMessages", temperature: Optional[float] = None
+    ) -> "CommitMessage":
+        from gcop.commit import CommitMessage
+
+        self.last_usage = None
+        events = self._complete("commit_message", messages, temperature=temperature)
+        if events is None:
+            message = self.fallback.generate(messages, temperature=temperature)
+            self.last_usage = self.fallback.last_usage
+            return message
+
+        event: Event = self._result(events)
+        self._read_usage(event)
+        return CommitMessage(**event["message"])
+
+    def stream(self, messages: "ChatMessages") -> Iterable[str]:
+        self.last_usage = None
+        events = self._complete("stream", messages)
+        if events is None:
+            yield from self.fallback.stream(messages)
+            self.last_usage = self.fallback.last_usage
+            return
+
+        for event in events:
+            if event["type"] == "chunk":
+                yield event["text"]
+            elif event["type"] == "done":
+                self._read_usage(event)
+                return
+            else:
+                raise DaemonError(event.get("error", f"unexpected event: {event}"))
+        raise DaemonError("the daemon closed the connection")
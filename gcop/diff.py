@@ -0,0 +1,646 @@
+"""Pre-processing of staged diffs before they are put into the prompt.
+
+Lockfiles, generated and vendored files, minified bundles and binaries carry
+almost no information for a commit message but can easily dominate the prompt.
+`filter_diff` replaces them with a one line stub and then trims the remaining
+diff to fit a token budget, reporting everything it elided.
+"""
+
+import fnmatch
+import re
+import subprocess
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from gcop.config import DiffFilterConfig
+
+__all__ = [
+    "DiffParser",
+    "FileDiff",
+    "FilteredDiff",
+    "Hunk",
+    "LineRange",
+    "format_stat",
+    "parse_diff",
+    "read_git_diff",
+    "render_diff",
+    "split_diff",
+    "filter_diff",
+    "shrink_file_diff",
+    "count_tokens",
+]
+
+LOCKFILE_PATTERNS: List[str] = [
+    "poetry.lock",
+    "Pipfile.lock",
+    "uv.lock",
+    "pdm.lock",
+    "package-lock.json",
+    "npm-shrinkwrap.json",
+    "yarn.lock",
+    "pnpm-lock.yaml",
+    "bun.lockb",
+    "Cargo.lock",
+    "Gemfile.lock",
+    "composer.lock",
+    "go.sum",
+    "mix.lock",
+    "pubspec.lock",
+    "Podfile.lock",
+    "packages.lock.json",
+]
+
+MINIFIED_PATTERNS: List[str] = ["*.min.js", "*.min.css", "*.map"]
+
+VENDORED_DIRS: List[str] = ["vendor", "node_modules", "third_party", "bower_components"]
+
+# Rough average for English text and code with BPE tokenizers. Good enough for a
+# budget, and avoids loading a tokenizer on the commit path.
+_CHARS_PER_TOKEN: int = 4
+
+_HUNK_RANGES = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+_READ_SIZE: int = 64 * 1024
+
+
+def count_tokens(text: str) -> int:
+    """Estimate the number of tokens of `text`.
+
+    Examples:
+        >>> count_tokens("")
+        0
+        >>> count_tokens("abcdefgh")
+        2
+    """
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+class LineRange:
+    """Lines of one side of a hunk, as in its `@@ -start,count +start,count @@`
+    header."""
+
+    __slots__ = ("start", "count")
+
+    def __init__(self, start: int, count: int) -> None:
+        self.start: int = start
+        self.count: int = count
+
+    def __repr__(self) -> str:
+        return f"LineRange({self.start}, {self.count})"
+
+
+class Hunk(list):
+    """A hunk: its `@@` header line followed by its lines, with the line ranges
+    of the header parsed.
+
+    Attributes:
+        old: lines of the file before the change.
+        new: lines of the file after the change.
+    """
+
+    __slots__ = ("old", "new")
+
+    def __init__(self, header: str) -> None:
+        super().__init__([header])
+        match = _HUNK_RANGES.match(header)
+        numbers: List[int] = [
+            int(n) if n is not None else 1 for n in (match.groups() if match else ())
+        ] or [0, 0, 0, 0]
+        self.old: LineRange = LineRange(numbers[0], numbers[1])
+        self.new: LineRange = LineRange(numbers[2], numbers[3])
+
+
+class FileDiff:
+    """The diff of a single file.
+
+    Attributes:
+        path: path of the file after the change.
+        old_path: path of the file before a rename or copy, else None.
+        status: A(dded), D(eleted), M(odified), R(enamed) or C(opied), as in
+            `git diff --name-status`.
+        header: lines from `diff --git` up to the first hunk.
+        hunks: hunks of the file, each one a list of lines starting with `@@`.
+        is_binary: whether git reported a binary change.
+        added: number of added lines, counted when the diff was parsed.
+        removed: number of removed lines, counted when the diff was parsed.
+    """
+
+    __slots__ = (
+        "path",
+        "old_path",
+        "status",
+        "header",
+        "hunks",
+        "is_binary",
+        "added",
+        "removed",
+    )
+
+    def __init__(
+        self,
+        path: str,
+        header: Optional[List[str]] = None,
+        hunks: Optional[List[List[str]]] = None,
+        is_binary: bool = False,
+    ) -> None:
+        self.path: str = path
+        self.old_path: Optional[str] = None
+        self.status: str = "M"
+        self.header: List[str] = header if header is not None else []
+        self.hunks: List[List[str]] = hunks if hunks is not None else []
+        self.is_binary: bool = is_binary
+        self.added: int = sum(
+            1 for hunk in self.hunks for line in hunk[1:] if line.startswith("+")
+        )
+        self.removed: int = sum(
+            1 for hunk in self.hunks for line in hunk[1:] if line.startswith("-")
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"FileDiff({self.path!r}, status={self.status!r}, "
+            f"+{self.added} -{self.removed}, {len(self.hunks)} hunks)"
+        )
+
+    def render(self) -> str:
+        lines: List[str] = list(self.header)
+        for hunk in self.hunks:
+            lines.extend(hunk)
+        return "\n".join(lines) + "\n"
+
+    def stub(self, reason: str) -> str:
+        """Render only the header line and a note about what was elided."""
+        summary = "binary" if self.is_binary else f"+{self.added} -{self.removed}"
+        return f"{self.header[0]}\n[gcop: {reason}, {summary}, content elided]\n"
+
+
+@dataclass
+class FilteredDiff:
+    """Result of `filter_diff`.
+
+    Attributes:
+        text: the diff to put into the prompt.
+        elided: human readable notes about what was removed or trimmed.
+        files: the parsed files of the diff, empty if it was not filtered.
+    """
+
+    text: str
+    elided: List[str] = field(default_factory=list)
+    files: List[FileDiff] = field(default_factory=list)
+
+
+_C_ESCAPES: Dict[str, int] = {
+    "a": 7,
+    "b": 8,
+    "t": 9,
+    "n": 10,
+    "v": 11,
+    "f": 12,
+    "r": 13,
+    '"': 34,
+    "\\": 92,
+}
+
+
+def _unquote_path(path: str, prefix: str = "") -> str:
+    """Undo the C-style quoting git applies to paths with special characters,
+    eg: non-ASCII ones, then remove `prefix`, eg: `b/`."""
+    if len(path) >= 2 and path.startswith('"') and path.endswith('"'):
+        raw = bytearray()
+        i, end = 1, len(path) - 1
+        while i < end:
+            char: str = path[i]
+            if char == "\\" and i + 1 < end:
+                escaped: str = path[i + 1]
+                if escaped in "01234567":
+                    # Octal escapes are the bytes of the UTF-8 encoded path.
+                    raw.append(int(path[i + 1 : i + 4], 8) & 0xFF)
+                    i += 4
+                    continue
+                raw.append(_C_ESCAPES.get(escaped, ord(escaped)))
+                i += 2
+                continue
+            raw += char.encode("utf-8")
+            i += 1
+        path = raw.decode("utf-8", errors="replace")
+    return path[len(prefix) :] if prefix and path.startswith(prefix) else path
+
+
+def _parse_path(diff_line: str) -> str:
+    # `diff --git a/<old> b/<new>`, paths with spaces are not quoted by git
+    # unless they contain special characters, so split on the last " b/".
+    rest = diff_line[len("diff --git ") :]
+    if rest.endswith('"'):
+        # A quoted path can not contain ` "`, its quotes are escaped.
+        return _unquote_path(rest[rest.rfind(' "') + 1 :], "b/")
+    index = rest.rfind(" b/")
+    return rest[index + 3 :] if index != -1 else rest.split(" ")[-1]
+
+
+def _header_path(value: str, prefix: str = "") -> str:
+    # Git ends `---`/`+++` lines with a TAB when the path contains a space.
+    return _unquote_path(value[:-1] if value.endswith("\t") else value, prefix)
+
+
+class DiffParser:
+    """Parse the output of `git diff` incrementally, as it is read.
+
+    Feed it text lines with `feed_line` or raw bytes with `feed`. Bytes are
+    decoded line by line as UTF-8, undecodable bytes are replaced, so diffs of
+    files in other encodings do not fail. A file is complete once the next one
+    starts, or when the parser is closed.
+
+    Examples:
+        >>> parser = DiffParser()
+        >>> parser.feed(b"diff --git a/x.py b/x.py\\n@@ -1 +1,2 @@\\n-a\\n+b")
+        []
+        >>> parser.feed(b"\\n+c\\ndiff --git a/y.py b/y.py\\n")
+        [FileDiff('x.py', status='M', +2 -1, 1 hunks)]
+        >>> parser.close()
+        [FileDiff('y.py', status='M', +0 -0, 0 hunks)]
+    """
+
+    def __init__(self) -> None:
+        self._current: Optional[FileDiff] = None
+        self._done: List[FileDiff] = []
+        self._pending: bytes = b""
+
+    def feed(self, data: bytes) -> List[FileDiff]:
+        """Parse a chunk of bytes and return the files it completed."""
+        data = self._pending + data
+        end: int = data.rfind(b"\n")
+        if end == -1:
+            self._pending = data
+            return self._take()
+        self._pending = data[end + 1 :]
+        # Never in the middle of a UTF-8 sequence, since it ends at a newline.
+        for line in data[:end].decode("utf-8", errors="replace").split("\n"):
+            self.feed_line(line)
+        return self._take()
+
+    def feed_line(self, line: str) -> None:
+        """Parse a single line, without its line break."""
+        current: Optional[FileDiff] = self._current
+        if line.startswith("diff --git "):
+            if current is not None:
+                self._done.append(current)
+            self._current = FileDiff(path=_parse_path(line), header=[line])
+        elif current is None:
+            return
+        elif line.startswith("@@ "):
+            current.hunks.append(Hunk(line))
+        elif current.hunks:
+            current.hunks[-1].append(line)
+            if line.startswith("+"):
+                current.added += 1
+            elif line.startswith("-"):
+                current.removed += 1
+        else:
+            self._parse_header(current, line)
+            current.header.append(line)
+
+    @staticmethod
+    def _parse_header(current: FileDiff, line: str) -> None:
+        if line.startswith("Binary files ") or line == "GIT binary patch":
+            current.is_binary = True
+        elif line.startswith("+++ ") and line != "+++ /dev/null":
+            current.path = _header_path(line[len("+++ ") :], "b/")
+        elif line.startswith("new file mode"):
+            current.status = "A"
+        elif line.startswith("deleted file mode"):
+            current.status = "D"
+        elif line.startswith(("rename from ", "copy from ")):
+            current.status = "R" if line.startswith("rename") else "C"
+            current.old_path = _header_path(line.split(" ", 2)[2])
+        elif line.startswith(("rename to ", "copy to ")):
+            current.path = _header_path(line.split(" ", 2)[2])
+
+    def _take(self) -> List[FileDiff]:
+        done, self._done = self._done, []
+        return done
+
+    def close(self) -> List[FileDiff]:
+        """Parse what is left and return the remaining files."""
+        if self._pending:
+            self.feed_line(self._pending.decode("utf-8", errors="replace"))
+            self._pending = b""
+        if self._current is not None:
+            self._done.append(self._current)
+            self._current = None
+        return self._take()
+
+
+def parse_diff(chunks: Iterable[bytes]) -> Iterator[FileDiff]:
+    """Parse the output of `git diff` read in chunks, yielding every file as
+    soon as it is complete."""
+    parser = DiffParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def split_diff(diff: str) -> List[FileDiff]:
+    """Split the output of `git diff` into one `FileDiff` per file.
+
+    Examples:
+        >>> files = split_diff(
+        ...     "diff --git a/x.py b/x.py\\n--- a/x.py\\n+++ b/x.py\\n"
+        ...     "@@ -1 +1 @@\\n-a\\n+b"
+        ... )
+        >>> [(f.path, f.added, f.removed) for f in files]
+        [('x.py', 1, 1)]
+    """
+    parser = DiffParser()
+    for line in diff.splitlines():
+        parser.feed_line(line)
+    return parser.close()
+
+
+def read_git_diff(*args: str, cwd: Optional[str] = None) -> List[FileDiff]:
+    """Run `git diff` with `args` in `cwd` and parse its output while it is
+    produced.
+
+    Raises:
+        ValueError: git failed.
+    """
+    process = subprocess.Popen(
+        ["git", "diff", "--no-color", "--no-ext-diff", *args],
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    with process:
+        files: List[FileDiff] = list(
+            parse_diff(iter(lambda: process.stdout.read(_READ_SIZE), b""))
+        )
+        error: bytes = process.stderr.read()
+    if process.returncode:
+        raise ValueError(
+            f"Error getting git diff: {error.decode('utf-8', errors='replace')}"
+        )
+    return files
+
+
+def render_diff(files: Iterable[FileDiff]) -> str:
+    """Render parsed files back into the text of the diff."""
+    return "".join(f.render() for f in files)
+
+
+def format_stat(files: List[FileDiff]) -> str:
+    """Summarize files like `git diff --stat`, to show diffs too large to print.
+
+    Examples:
+        >>> print(format_stat(split_diff(
+        ...     "diff --git a/x.py b/x.py\\n@@ -1 +1,2 @@\\n-a\\n+b\\n+c"
+        ... )))
+        M x.py | +2 -1
+        1 file changed, 2 insertions(+), 1 deletion(-)
+    """
+    lines: List[str] = []
+    for f in files:
+        path: str = f"{f.old_path} => {f.path}" if f.old_path else f.path
+        change: str = "binary" if f.is_binary else f"+{f.added} -{f.removed}"
+        lines.append(f"{f.status} {path} | {change}")
+    added: int = sum(f.added for f in files)
+    removed: int = sum(f.removed for f in files)
+    lines.append(
+        f"{len(files)} file{'' if len(files) == 1 else 's'} changed, "
+        f"{added} insertion{'' if added == 1 else 's'}(+), "
+        f"{removed} deletion{'' if removed == 1 else 's'}(-)"
+    )
+    return "\n".join(lines)
+
+
+def _check_attrs(paths: List[str], attrs: List[str]) -> Dict[str, Dict[str, str]]:
+    """Look up git attributes (from `.gitattributes`) for the given paths."""
+    if not paths:
+        return {}
+
+    try:
+        output: str = subprocess.run(
+            ["git", "check-attr", "-z", "--stdin", *attrs],
+            input="\0".join(paths),
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+
+    result: Dict[str, Dict[str, str]] = {}
+    fields: List[str] = output.split("\0")
+    for i in range(0, len(fields) - 2, 3):
+        path, attr, value = fields[i : i + 3]
+        result.setdefault(path, {})[attr] = value
+    return result
+
+
+def _is_set(value: Optional[str]) -> bool:
+    return value in ("set", "true")
+
+
+def _matches(path: str, patterns: Iterable[str]) -> bool:
+    name: str = path.rsplit("/", 1)[-1]
+    return any(
+        fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(name, pattern)
+        for pattern in patterns
+    )
+
+
+def _elide_reason(
+    file_diff: FileDiff, attrs: Dict[str, str], config: DiffFilterConfig
+) -> Optional[str]:
+    path: str = file_diff.path
+    if file_diff.is_binary:
+        return "binary file"
+    if _matches(path, config.exclude):
+        return "excluded by config"
+    if config.filter_lockfiles and _matches(path, LOCKFILE_PATTERNS):
+        return "lockfile"
+    if config.filter_generated and _is_set(attrs.get("linguist-generated")):
+        return "generated file"
+    if config.filter_vendored and (
+        _is_set(attrs.get("linguist-vendored"))
+        or any(part in VENDORED_DIRS for part in path.split("/")[:-1])
+    ):
+        return "vendored file"
+    if config.filter_minified and _matches(path, MINIFIED_PATTERNS):
+        return "minified file"
+    return None
+
+
+def _trim_context(hunk: List[str], context_lines: int) -> List[str]:
+    """Drop context lines further than `context_lines` away from any change."""
+    body: List[str] = hunk[1:]
+    changed: List[int] = [
+        i for i, line in enumerate(body) if line[:1] in ("+", "-", "\\")
+    ]
+    keep = set()
+    for i in changed:
+        keep.update(range(i - context_lines, i + context_lines + 1))
+
+    trimmed: List[str] = [hunk[0]]
+    skipped: bool = False
+    for i, line in enumerate(body):
+        if i in keep:
+            trimmed.append(line)
+            skipped = False
+        elif not skipped:
+            trimmed.append(" ...")
+            skipped = True
+    return trimmed
+
+
+def _truncate(file_diff: FileDiff, budget: int) -> Optional[str]:
+    """Keep whole hunks of `file_diff` while they fit into `budget` tokens.
+    Returns a note if something was dropped."""
+    used: int = count_tokens("\n".join(file_diff.header))
+    kept: List[List[str]] = []
+    dropped_lines: int = 0
+
+    for hunk in file_diff.hunks:
+        size: int = count_tokens("\n".join(hunk))
+        if not dropped_lines and used + size <= budget:
+            kept.append(hunk)
+            used += size
+        elif not dropped_lines and not kept:
+            # Keep the beginning of a single huge hunk rather than nothing.
+            lines: List[str] = [hunk[0]]
+            for line in hunk[1:]:
+                used += count_tokens(line)
+                if used > budget:
+                    break
+                lines.append(line)
+            kept.append(lines)
+            dropped_lines += len(hunk) - len(lines)
+        else:
+            dropped_lines += len(hunk) - 1
+
+    if not dropped_lines:
+        return None
+
+    kept[-1] = kept[-1] + [f"[gcop: {dropped_lines} more lines elided]"]
+    file_diff.hunks = kept
+    return f"{file_diff.path}: trimmed {dropped_lines} lines to fit the token budget"
+
+
+def _fit_budget(files: List[FileDiff], budget: int) -> List[str]:
+    """Shrink the largest files so that all of them fit into `budget` tokens.
+
+    Files smaller than an equal share of the remaining budget are kept as is,
+    their unused share is handed to the larger ones.
+    """
+    notes: List[str] = []
+    sizes: Dict[int, int] = {id(f): count_tokens(f.render()) for f in files}
+
+    remaining_budget: int = budget
+    remaining: List[FileDiff] = sorted(files, key=lambda f: sizes[id(f)])
+    while remaining:
+        share: int = max(remaining_budget // len(remaining), 0)
+        file_diff: FileDiff = remaining.pop(0)
+        if sizes[id(file_diff)] <= share:
+            remaining_budget -= sizes[id(file_diff)]
+            continue
+        note: Optional[str] = _truncate(file_diff, share)
+        if note:
+            notes.append(note)
+        remaining_budget -= min(count_tokens(file_diff.render()), share)
+
+    return notes
+
+
+def shrink_file_diff(
+    file_diff: FileDiff, max_tokens: int, context_lines: int = 1
+) -> List[str]:
+    """Shrink a single file diff in place to roughly `max_tokens` tokens, first
+    by reducing context lines, then by dropping trailing hunks.
+
+    Returns:
+        List[str]: notes about what was elided.
+    """
+    notes: List[str] = []
+    if count_tokens(file_diff.render()) <= max_tokens:
+        return notes
+
+    file_diff.hunks = [_trim_context(h, context_lines) for h in file_diff.hunks]
+    if count_tokens(file_diff.render()) > max_tokens:
+        note: Optional[str] = _truncate(file_diff, max_tokens)
+        if note:
+            notes.append(note)
+    return notes
+
+
+def filter_diff(
+    diff: str,
+    config: Optional[DiffFilterConfig] = None,
+    trim: bool = True,
+    files: Optional[List[FileDiff]] = None,
+) -> FilteredDiff:
+    """Drop noise from a diff and fit it into the token budget.
+
+    1. Binary files, lockfiles, `linguist-generated` and `linguist-vendored` paths
+       (from `.gitattributes`), vendored directories, minified files and paths
+       matching `exclude` are replaced by a one line stub.
+    2. If the diff is still larger than `max_tokens`, context lines are reduced
+       to `context_lines` around each change.
+    3. If it is still too large, trailing hunks of the largest files are
+       dropped until it fits.
+
+    Args:
+        diff(str): output of `git diff`
+        config(Optional[DiffFilterConfig]): filter settings. Defaults to the
+            default `DiffFilterConfig`.
+        trim(bool): whether to apply steps 2 and 3. Large diffs which are
+            summarized part by part skip them. Defaults to True.
+        files(Optional[List[FileDiff]]): `diff` already parsed, eg: by
+            `read_git_diff`. Trimmed in place.
+
+    Returns:
+        FilteredDiff: the filtered diff and notes about what was elided.
+    """
+    config = config or DiffFilterConfig()
+    if not config.enable or not diff:
+        return FilteredDiff(text=diff)
+
+    files = split_diff(diff) if files is None else files
+    attrs: Dict[str, Dict[str, str]] = {}
+    if config.filter_generated or config.filter_vendored:
+        attrs = _check_attrs(
+            [f.path for f in files], ["linguist-generated", "linguist-vendored"]
+        )
+
+    elided: List[str] = []
+    stubs: Dict[int, str] = {}
+    kept: List[FileDiff] = []
+    for file_diff in files:
+        reason: Optional[str] = _elide_reason(
+            file_diff, attrs.get(file_diff.path, {}), config
+        )
+        if reason:
+            stubs[id(file_diff)] = file_diff.stub(reason)
+            elided.append(f"{file_diff.path}: {reason}")
+        else:
+            kept.append(file_diff)
+
+    budget: int = config.max_tokens - sum(count_tokens(s) for s in stubs.values())
+    if trim and sum(count_tokens(f.render()) for f in kept) > budget:
+        trimmed_files: int = 0
+        for file_diff in kept:
+            hunks = [_trim_context(h, config.context_lines) for h in file_diff.hunks]
+            if hunks != file_diff.hunks:
+                file_diff.hunks = hunks
+                trimmed_files += 1
+        if trimmed_files:
+            elided.append(
+                f"context reduced to {config.context_lines} lines "
+                f"in {trimmed_files} files"
+            )
+
+        if sum(count_tokens(f.render()) for f in kept) > budget:
+            elided.extend(_fit_budget(kept, budget))
+
+    if not elided:
+        return FilteredDiff(text=diff, files=files)
+
+    text: str = "".join(stubs.get(id(f)) or f.render() for f in files)
+    return FilteredDiff(text=text, elided=elided, files=files)
@@ -0,0 +1,280 @@
+"""Past commit messages of the repository, used as examples in the prompt.
+
+The recent commits of each repository are kept in an index together with the
+paths they touched, so picking examples does not walk the history. The index
+records the commit it was built at and later runs only read the commits added
+since then. It is rebuilt when that commit is gone, eg: after a rebase and a
+gc. Commits of a rewritten history otherwise stay in the index until newer
+ones push them out, their messages are still good examples.
+
+The examples are the commits which touched the same files, then the same
+directories, as the staged change. Large commits count less, so a commit which
+reformatted the whole tree does not outrank a focused one.
+"""
+
+import json
+import math
+import os
+import posixpath
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+from gcop.cache import make_cache_key
+from gcop.config import GcopConfig, GitHistoryConfig
+from gcop.diff import count_tokens, split_diff
+from gcop.git import GitBackend, GitError, get_git_backend
+from gcop.utils import get_default_storage_path, write_json_atomic
+from gcop.utils.logger import logger
+
+__all__ = [
+    "CommitIndex",
+    "CommitIndexCache",
+    "IndexedCommit",
+    "get_history_examples",
+    "load_commit_index",
+    "select_examples",
+]
+
+_INDEX_VERSION: int = 1
+# Longer messages, eg: squashed changelogs, are not useful as examples.
+_MAX_MESSAGE_SIZE: int = 4000
+
+
+@dataclass
+class IndexedCommit:
+    """A past commit, as kept in the index.
+
+    Args:
+        sha(str): hash of the commit.
+        message(str): the commit message, without trailing whitespace.
+        paths(List[str]): paths changed by the commit.
+    """
+
+    sha: str
+    message: str
+    paths: List[str]
+
+
+@dataclass
+class CommitIndex:
+    """The recent commits of a repository, newest first.
+
+    Args:
+        head(str): the commit the index was updated at.
+        commits(List[IndexedCommit]): the indexed commits.
+    """
+
+    head: str
+    commits: List[IndexedCommit]
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Paths are shared by many commits, store each of them once.
+        paths: Dict[str, int] = {}
+        commits: List[List[Any]] = []
+        for commit in self.commits:
+            ids: List[int] = [paths.setdefault(p, len(paths)) for p in commit.paths]
+            commits.append([commit.sha, commit.message, ids])
+        return {
+            "version": _INDEX_VERSION,
+            "head": self.head,
+            "paths": list(paths),
+            "commits": commits,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CommitIndex":
+        if data["version"] != _INDEX_VERSION:
+            raise ValueError(f"unknown index version {data['version']}")
+        paths: List[str] = data["paths"]
+        return cls(
+            head=data["head"],
+            commits=[
+                IndexedCommit(sha, message, [paths[i] for i in ids])
+                for sha, message, ids in data["commits"]
+            ],
+        )
+
+
+class CommitIndexCache:
+    """Persisted `CommitIndex` of each repository.
+
+    Entries live in `<storage>/examples/<repo key>.json`, where the key is
+    derived from the path of the git directory.
+
+    Args:
+        cache_dir(Optional[str]): cache directory. Defaults to gcop storage path.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None) -> None:
+        self.cache_dir: str = cache_dir or get_default_storage_path("examples")
+
+    def _entry_path(self, git_dir: str) -> str:
+        return os.path.join(self.cache_dir, f"{make_cache_key(git_dir)}.json")
+
+    def get(self, git_dir: str) -> Optional[CommitIndex]:
+        try:
+            with open(self._entry_path(git_dir), "r", encoding="utf-8") as f:
+                return CommitIndex.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError, IndexError):
+            return None
+
+    def set(self, git_dir: str, index: CommitIndex) -> None:
+        try:
+            write_json_atomic(self._entry_path(git_dir), index.to_dict())
+        except OSError:
+            # The cache is an optimization only, never fail because of it.
+            pass
+
+
+def _read_commits(
+    git: GitBackend, rev_range: str, max_commits: int
+) -> List[IndexedCommit]:
+    commits: List[IndexedCommit] = []
+    for entry in git.iter_log(rev_range, max_count=max_commits, with_paths=True):
+        message: str = entry.message.rstrip()
+        # Merges do not list paths and their messages are generated.
+        if len(entry.parents) > 1 or not message or len(message) > _MAX_MESSAGE_SIZE:
+            continue
+        commits.append(IndexedCommit(entry.sha, message, entry.paths))
+    return commits
+
+
+def load_commit_index(
+    git: GitBackend, max_commits: int, cache: Optional[CommitIndexCache] = None
+) -> Optional[CommitIndex]:
+    """Get the index of the repository of `git` up to HEAD, incrementally.
+
+    Args:
+        git(GitBackend): backend of the repository.
+        max_commits(int): number of recent commits to keep.
+        cache(Optional[CommitIndexCache]): cache to use. Defaults to the one in
+            gcop storage path.
+
+    Returns:
+        Optional[CommitIndex]: the index, None if there is no commit yet.
+    """
+    cache = cache or CommitIndexCache()
+    git_dir: Optional[str] = git.git_dir()
+    head: Optional[str] = git.resolve("HEAD")
+    if git_dir is None or head is None:
+        return None
+    git_dir = os.path.normcase(git_dir)
+
+    index: Optional[CommitIndex] = cache.get(git_dir)
+    if index is not None and index.head == head:
+        return index
+
+    if index is not None:
+        try:
+            newer: List[IndexedCommit] = _read_commits(
+                git, f"{index.head}..{head}", max_commits
+            )
+            known: Set[str] = {commit.sha for commit in newer}
+            older: List[IndexedCommit] = [
+                commit for commit in index.commits if commit.sha not in known
+            ]
+            index = CommitIndex(head, (newer + older)[:max_commits])
+        except GitError:
+            # The indexed commit is gone.
+            index = None
+    if index is None:
+        index = CommitIndex(head, _read_commits(git, head, max_commits))
+
+    cache.set(git_dir, index)
+    return index
+
+
+def _score(commit: IndexedCommit, paths: Set[str], dirs: Set[str]) -> float:
+    if not commit.paths:
+        return 0.0
+    same_files: int = len(paths.intersection(commit.paths))
+    same_dirs: int = len(dirs.intersection(map(posixpath.dirname, commit.paths)))
+    return (same_files + 0.5 * same_dirs) / math.sqrt(len(commit.paths))
+
+
+def select_examples(
+    commits: List[IndexedCommit],
+    paths: List[str],
+    max_examples: int,
+    max_tokens: int,
+) -> List[str]:
+    """Pick the messages of the commits most relevant to a change of `paths`.
+
+    Args:
+        commits(List[IndexedCommit]): candidate commits, newest first.
+        paths(List[str]): paths of the staged change.
+        max_examples(int): maximum number of messages.
+        max_tokens(int): approximate token budget of all the messages.
+
+    Returns:
+        List[str]: the messages, most relevant first.
+
+    Examples:
+        >>> commits = [
+        ...     IndexedCommit("c", "docs: update readme", ["README.md"]),
+        ...     IndexedCommit("b", "fix(diff): handle renames", ["gcop/diff.py"]),
+        ...     IndexedCommit("a", "feat(git): add backends", ["gcop/git.py"]),
+        ... ]
+        >>> select_examples(commits, ["gcop/diff.py"], max_examples=2, max_tokens=100)
+        ['fix(diff): handle renames', 'feat(git): add backends']
+    """
+    staged: Set[str] = set(paths)
+    dirs: Set[str] = {posixpath.dirname(path) for path in paths}
+    scores: List[float] = [_score(commit, staged, dirs) for commit in commits]
+    # The most relevant first, then the most recent.
+    order: List[int] = sorted(range(len(commits)), key=lambda i: -scores[i])
+
+    examples: List[str] = []
+    budget: int = max_tokens
+    for i in order:
+        if len(examples) >= max_examples:
+            break
+        message: str = commits[i].message
+        tokens: int = count_tokens(message)
+        if tokens > budget or message in examples:
+            continue
+        examples.append(message)
+        budget -= tokens
+    return examples
+
+
+def get_history_examples(
+    diff: str,
+    gcop_config: GcopConfig,
+    git: Optional[GitBackend] = None,
+    cache: Optional[CommitIndexCache] = None,
+) -> List[str]:
+    """Past commit messages of the current repository relevant to `diff`.
+
+    Failures, eg: outside of a repository, are logged and give no examples, they
+    never fail the commit.
+
+    Args:
+        diff(str): the staged diff.
+        gcop_config(GcopConfig): config, see `GitHistoryConfig`.
+        git(Optional[GitBackend]): backend of the repository. Defaults to the
+            fastest one for walking the history.
+        cache(Optional[CommitIndexCache]): cache of the index.
+
+    Returns:
+        List[str]: the messages, most relevant first.
+    """
+    config: GitHistoryConfig = gcop_config.git_history
+    if config.max_examples <= 0:
+        return []
+    owned: Optional[GitBackend] = None
+    if git is None:
+        git = owned = get_git_backend(prefer=("subprocess", "pygit2"))
+    try:
+        index: Optional[CommitIndex] = load_commit_index(git, config.max_commits, cache)
+    except (GitError, OSError, ValueError) as e:
+        logger.debug(f"Error loading the commit history: {e}")
+        return []
+    finally:
+        if owned is not None:
+            owned.close()
+    if index is None:
+        return []
+
+    paths: List[str] = [f.path for f in split_diff(diff)]
+    return select_examples(index.commits, paths, config.max_examples, config.max_tokens)
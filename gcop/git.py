@@ -0,0 +1,791 @@
+"""Access to the git repository, through `git` subprocesses or in-process.
+
+`SubprocessBackend` runs the `git` command, like gcop always did. Objects and
+commits are read through a single long-lived `git cat-file --batch` process,
+so reading many of them does not spawn a process each. `Pygit2Backend` does the
+same in-process with pygit2 (`pip install pygit2`), which avoids process
+startup entirely, the expensive part of git on Windows and in some containers.
+
+`get_git_backend` picks the backend a command runs fastest with: the
+in-process one when pygit2 is installed, except for walks over long histories
+where a single `git log` wins. The `GCOP_GIT_BACKEND` environment variable
+(`auto`, `subprocess` or `pygit2`) overrides the choice.
+
+Commands without an equivalent in both backends, eg: `git status` or
+`git update-ref`, go through `GitBackend.run`, which runs `git` whatever the
+backend.
+"""
+
+import importlib.util
+import os
+import subprocess
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import IO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from gcop.diff import FileDiff, parse_diff, read_git_diff
+
+__all__ = [
+    "GitBackend",
+    "GitError",
+    "LogEntry",
+    "Pygit2Backend",
+    "SubprocessBackend",
+    "get_git_backend",
+]
+
+_BACKENDS: Tuple[str, ...] = ("auto", "subprocess", "pygit2")
+_FIELD_SEP: str = "\x1f"
+_RECORD_SEP: str = "\x1e"
+# Hash, parents, tree, author and committer name, email and raw date, then the
+# message.
+_LOG_FORMAT: str = (
+    _RECORD_SEP
+    + _FIELD_SEP.join(
+        ["%H", "%P", "%T", "%an", "%ae", "%ad", "%cn", "%ce", "%cd", "%B"]
+    )
+    + _FIELD_SEP
+)
+_READ_SIZE: int = 64 * 1024
+
+
+class GitError(Exception):
+    """A git operation failed, eg: outside of a repository or for an unknown
+    revision. The message is the first line of the error reported by git."""
+
+
+@dataclass
+class LogEntry:
+    """A commit, as listed by `GitBackend.iter_log`.
+
+    Args:
+        sha(str): hash of the commit.
+        parents(List[str]): hashes of the parents.
+        author_name(str): name of the author.
+        author_email(str): email of the author.
+        timestamp(int): author time, in seconds since the epoch.
+        message(str): the full commit message.
+        paths(List[str]): paths changed compared to the parent, only listed on
+            request and empty for merge commits, like `git log --name-only`.
+        tree(str): hash of the tree.
+        author_offset(int): timezone of the author time, in minutes east of UTC.
+        committer_name(str): name of the committer.
+        committer_email(str): email of the committer.
+        committer_timestamp(int): committer time, in seconds since the epoch.
+        committer_offset(int): timezone of the committer time, in minutes.
+    """
+
+    sha: str
+    parents: List[str]
+    author_name: str
+    author_email: str
+    timestamp: int
+    message: str
+    paths: List[str] = field(default_factory=list)
+    tree: str = ""
+    author_offset: int = 0
+    committer_name: str = ""
+    committer_email: str = ""
+    committer_timestamp: int = 0
+    committer_offset: int = 0
+
+    @property
+    def subject(self) -> str:
+        return self.message.partition("\n")[0]
+
+    @property
+    def author_date(self) -> str:
+        """Author date in the raw format of git, eg: `1700000000 +0100`."""
+        return f"{self.timestamp} {_format_offset(self.author_offset)}"
+
+    @property
+    def committer_date(self) -> str:
+        """Committer date in the raw format of git."""
+        return f"{self.committer_timestamp} {_format_offset(self.committer_offset)}"
+
+    @property
+    def author_iso_date(self) -> str:
+        """Author date as printed by `git log --date=iso`.
+
+        Examples:
+            >>> entry = LogEntry("", [], "", "", 1700000000, "", author_offset=60)
+            >>> entry.author_iso_date
+            '2023-11-14 23:13:20 +0100'
+        """
+        tz = timezone(timedelta(minutes=self.author_offset))
+        return datetime.fromtimestamp(self.timestamp, tz).strftime(
+            "%Y-%m-%d %H:%M:%S %z"
+        )
+
+
+def _format_offset(minutes: int) -> str:
+    """Format a timezone offset like git does.
+
+    Examples:
+        >>> _format_offset(60), _format_offset(-210), _format_offset(0)
+        ('+0100', '-0330', '+0000')
+    """
+    sign: str = "-" if minutes < 0 else "+"
+    hours, minutes = divmod(abs(minutes), 60)
+    return f"{sign}{hours:02d}{minutes:02d}"
+
+
+def _parse_date(value: str) -> Tuple[int, int]:
+    """Parse a raw git date into its timestamp and offset in minutes.
+
+    Examples:
+        >>> _parse_date("1700000000 -0330")
+        (1700000000, -210)
+    """
+    timestamp, _, offset = value.strip().partition(" ")
+    minutes: int = int(offset[1:3] or 0) * 60 + int(offset[3:5] or 0)
+    return int(timestamp or 0), -minutes if offset.startswith("-") else minutes
+
+
+def _parse_identity(value: str) -> Tuple[str, str, int, int]:
+    """Parse `Name <email> 1700000000 +0100` of a raw commit object."""
+    name, _, rest = value.partition(" <")
+    email, _, date = rest.partition("> ")
+    return (name, email, *_parse_date(date))
+
+
+class GitBackend:
+    """Git operations used by gcop, in the repository of the current directory.
+
+    Backends hold resources such as co-processes, close them with `close` or
+    use the backend as a context manager.
+    """
+
+    name: str = ""
+
+    cwd: Optional[str] = None
+    timeout: Optional[float] = None
+
+    def run(
+        self,
+        *args: str,
+        input: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """Run a `git` command in the repository and return its output, for
+        the commands without an equivalent in every backend.
+
+        Args:
+            *args(str): arguments of `git`, eg: `"status", "--porcelain"`.
+            input(Optional[str]): standard input of the command.
+            env(Optional[Dict[str, str]]): environment of the command. Defaults
+                to the one of gcop.
+            timeout(Optional[float]): seconds after which git is killed.
+                Defaults to the timeout of the backend.
+
+        Returns:
+            str: the output, bytes which are not UTF-8 are replaced.
+
+        Raises:
+            GitError: git failed.
+            subprocess.TimeoutExpired: git took longer than the timeout.
+        """
+        result = subprocess.run(
+            ["git", *args],
+            cwd=self.cwd,
+            input=input,
+            env=env,
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            timeout=timeout if timeout is not None else self.timeout,
+        )
+        _check_result(result, args)
+        return result.stdout
+
+    def git_dir(self) -> Optional[str]:
+        """Absolute path of the git directory, None outside of a repository."""
+        raise NotImplementedError
+
+    def staged_diff(self) -> List[FileDiff]:
+        """The staged changes, as `git diff --staged`."""
+        raise NotImplementedError
+
+    def write_tree(self) -> str:
+        """Write the index as a tree, as `git write-tree`, and return its hash.
+
+        Raises:
+            GitError: the index can not be written, eg: with conflicts.
+        """
+        raise NotImplementedError
+
+    def iter_log(
+        self,
+        rev_range: str = "HEAD",
+        max_count: Optional[int] = None,
+        with_paths: bool = False,
+        topo_order: bool = False,
+    ) -> Iterator[LogEntry]:
+        """Iterate over the commits of `rev_range`, eg: `HEAD` or `abc..HEAD`,
+        newest first, as `git log`. With `topo_order`, no parent comes before
+        one of its children, as `git log --topo-order`."""
+        raise NotImplementedError
+
+    def read_commit(self, rev: str) -> Optional[LogEntry]:
+        """Read a single commit, without its paths. None if it does not exist."""
+        raise NotImplementedError
+
+    def read_commit_object(self, rev: str) -> Optional[bytes]:
+        """The raw commit object, headers and message bytes as stored by git.
+        None if it does not exist."""
+        raise NotImplementedError
+
+    def write_commit_object(self, data: bytes) -> str:
+        """Store a raw commit object, as `git hash-object -t commit -w`, and
+        return its hash.
+
+        Raises:
+            GitError: the object is not a valid commit.
+        """
+        raise NotImplementedError
+
+    def resolve(self, rev: str) -> Optional[str]:
+        """Hash of the object `rev` names, None if it does not exist."""
+        raise NotImplementedError
+
+    def is_ancestor(self, ancestor: str, rev: str) -> bool:
+        """Whether the commit `ancestor` is `rev` or one of its ancestors."""
+        raise NotImplementedError
+
+    def head_branch(self) -> Optional[str]:
+        """Short name of the current branch, None if HEAD is detached."""
+        raise NotImplementedError
+
+    def list_refs(self, prefix: str = "refs/") -> Dict[str, str]:
+        """Hashes of the refs whose full name starts with `prefix`, by name."""
+        raise NotImplementedError
+
+    def get_config(self, key: str) -> Optional[str]:
+        """Value of a config key, eg: `remote.origin.url`, None if it is unset."""
+        raise NotImplementedError
+
+    def set_config(self, values: Dict[str, str], scope: str = "global") -> None:
+        """Set config keys, in the `global` config or the `local` one of the
+        repository."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "GitBackend":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _check_result(result: subprocess.CompletedProcess, args: Sequence[str]) -> None:
+    if result.returncode:
+        stderr = result.stderr
+        if isinstance(stderr, bytes):
+            stderr = stderr.decode("utf-8", errors="replace")
+        lines: List[str] = stderr.strip().splitlines()
+        raise GitError(lines[0] if lines else f"git {args[0]} failed")
+
+
+def _parse_commit(sha: str, data: bytes) -> LogEntry:
+    """Parse a raw commit object, as stored by git."""
+    text: str = data.decode("utf-8", errors="replace")
+    headers, _, message = text.partition("\n\n")
+    entry = LogEntry(sha, [], "", "", 0, message)
+    for line in headers.splitlines():
+        key, _, value = line.partition(" ")
+        if key == "tree":
+            entry.tree = value
+        elif key == "parent":
+            entry.parents.append(value)
+        elif key == "author":
+            (
+                entry.author_name,
+                entry.author_email,
+                entry.timestamp,
+                entry.author_offset,
+            ) = _parse_identity(value)
+        elif key == "committer":
+            (
+                entry.committer_name,
+                entry.committer_email,
+                entry.committer_timestamp,
+                entry.committer_offset,
+            ) = _parse_identity(value)
+    return entry
+
+
+class _CatFile:
+    """A `git cat-file --batch` co-process, shared by the threads of a backend."""
+
+    def __init__(self, cwd: Optional[str]) -> None:
+        self._process = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._lock = threading.Lock()
+
+    def read(self, rev: str) -> Optional[Tuple[str, str, bytes]]:
+        """Read an object, returns its hash, type and content."""
+        if "\n" in rev:
+            return None
+        stdin: IO[bytes] = self._process.stdin
+        stdout: IO[bytes] = self._process.stdout
+        with self._lock:
+            stdin.write(rev.encode("utf-8") + b"\n")
+            stdin.flush()
+            header: List[str] = stdout.readline().decode("utf-8").split()
+            if len(header) != 3:
+                if not header:
+                    raise GitError("git cat-file exited")
+                return None  # `<rev> missing` or `<rev> ambiguous`
+            sha, kind, size = header
+            data: bytes = stdout.read(int(size))
+            stdout.read(1)
+        return sha, kind, data
+
+    def close(self) -> None:
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        self._process.wait()
+        self._process.stdout.close()
+
+
+class SubprocessBackend(GitBackend):
+    """Runs `git` subprocesses.
+
+    Args:
+        cwd(Optional[str]): directory of the repository. Defaults to the current
+            one.
+        timeout(Optional[float]): seconds after which a git command is killed.
+    """
+
+    name: str = "subprocess"
+
+    def __init__(
+        self, cwd: Optional[str] = None, timeout: Optional[float] = None
+    ) -> None:
+        self.cwd: Optional[str] = cwd
+        self.timeout: Optional[float] = timeout
+        self._cat_file: Optional[_CatFile] = None
+        self._lock = threading.Lock()
+
+    def _git(self, *args: str, check: bool = True) -> Optional[str]:
+        try:
+            return self.run(*args)
+        except GitError:
+            if check:
+                raise
+            return None
+
+    def _read_object(self, rev: str) -> Optional[Tuple[str, str, bytes]]:
+        with self._lock:
+            if self._cat_file is None:
+                self._cat_file = _CatFile(self.cwd)
+            cat_file: _CatFile = self._cat_file
+        return cat_file.read(rev)
+
+    def git_dir(self) -> Optional[str]:
+        output: Optional[str] = self._git(
+            "rev-parse", "--absolute-git-dir", check=False
+        )
+        return output.strip() if output else None
+
+    def staged_diff(self) -> List[FileDiff]:
+        return read_git_diff("--staged", cwd=self.cwd)
+
+    def write_tree(self) -> str:
+        return self.run("write-tree").strip()
+
+    def iter_log(
+        self,
+        rev_range: str = "HEAD",
+        max_count: Optional[int] = None,
+        with_paths: bool = False,
+        topo_order: bool = False,
+    ) -> Iterator[LogEntry]:
+        args: List[str] = ["git", "-c", "core.quotepath=off", "log"]
+        args += ["--date=raw", f"--format={_LOG_FORMAT}"]
+        if max_count is not None:
+            args.append(f"--max-count={max_count}")
+        if with_paths:
+            args.append("--name-only")
+        if topo_order:
+            args.append("--topo-order")
+        args += [rev_range, "--"]
+
+        process = subprocess.Popen(
+            args,
+            cwd=self.cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+        )
+        # The timeout covers the whole walk, not each read.
+        timed_out = threading.Event()
+        timer: Optional[threading.Timer] = None
+        if self.timeout is not None:
+
+            def kill() -> None:
+                timed_out.set()
+                process.kill()
+
+            timer = threading.Timer(self.timeout, kill)
+            timer.start()
+
+        try:
+            with process:
+                pending: str = ""
+                for chunk in iter(lambda: process.stdout.read(_READ_SIZE), ""):
+                    records: List[str] = (pending + chunk).split(_RECORD_SEP)
+                    pending = records.pop()
+                    for record in records:
+                        if record:
+                            yield self._parse_record(record)
+                if pending:
+                    yield self._parse_record(pending)
+                error: str = process.stderr.read()
+        finally:
+            if timer is not None:
+                timer.cancel()
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(args, self.timeout)
+        if process.returncode:
+            lines: List[str] = error.strip().splitlines()
+            raise GitError(lines[0] if lines else "git log failed")
+
+    @staticmethod
+    def _parse_record(record: str) -> LogEntry:
+        (
+            sha,
+            parents,
+            tree,
+            author_name,
+            author_email,
+            author_date,
+            committer_name,
+            committer_email,
+            committer_date,
+            message,
+            paths,
+        ) = record.split(_FIELD_SEP, 10)
+        timestamp, author_offset = _parse_date(author_date)
+        committer_timestamp, committer_offset = _parse_date(committer_date)
+        return LogEntry(
+            sha=sha,
+            parents=parents.split(),
+            author_name=author_name,
+            author_email=author_email,
+            timestamp=timestamp,
+            message=message,
+            paths=[path for path in paths.splitlines() if path],
+            tree=tree,
+            author_offset=author_offset,
+            committer_name=committer_name,
+            committer_email=committer_email,
+            committer_timestamp=committer_timestamp,
+            committer_offset=committer_offset,
+        )
+
+    def read_commit(self, rev: str) -> Optional[LogEntry]:
+        found = self._read_object(f"{rev}^{{commit}}")
+        return _parse_commit(found[0], found[2]) if found else None
+
+    def read_commit_object(self, rev: str) -> Optional[bytes]:
+        found = self._read_object(f"{rev}^{{commit}}")
+        return found[2] if found else None
+
+    def write_commit_object(self, data: bytes) -> str:
+        args: Tuple[str, ...] = ("hash-object", "-t", "commit", "-w", "--stdin")
+        result = subprocess.run(
+            ["git", *args],
+            cwd=self.cwd,
+            input=data,
+            capture_output=True,
+            timeout=self.timeout,
+        )
+        _check_result(result, args)
+        return result.stdout.decode("utf-8").strip()
+
+    def resolve(self, rev: str) -> Optional[str]:
+        found = self._read_object(rev)
+        return found[0] if found else None
+
+    def is_ancestor(self, ancestor: str, rev: str) -> bool:
+        return (
+            self._git("merge-base", "--is-ancestor", ancestor, rev, check=False)
+            is not None
+        )
+
+    def head_branch(self) -> Optional[str]:
+        output: Optional[str] = self._git(
+            "symbolic-ref", "--short", "-q", "HEAD", check=False
+        )
+        return output.strip() if output else None
+
+    def list_refs(self, prefix: str = "refs/") -> Dict[str, str]:
+        output: str = self._git(
+            "for-each-ref", "--format=%(objectname) %(refname)", prefix
+        )
+        refs: Dict[str, str] = {}
+        for line in output.splitlines():
+            sha, _, name = line.partition(" ")
+            refs[name] = sha
+        return refs
+
+    def get_config(self, key: str) -> Optional[str]:
+        output: Optional[str] = self._git("config", "--get", key, check=False)
+        return output.rstrip("\n") if output is not None else None
+
+    def set_config(self, values: Dict[str, str], scope: str = "global") -> None:
+        # `git config` sets one key per call.
+        for key, value in values.items():
+            self._git("config", f"--{scope}", key, value)
+
+    def close(self) -> None:
+        with self._lock:
+            cat_file, self._cat_file = self._cat_file, None
+        if cat_file is not None:
+            cat_file.close()
+
+
+class Pygit2Backend(GitBackend):
+    """Works in-process through pygit2, the repository is opened on first use.
+
+    Args:
+        cwd(Optional[str]): directory of the repository. Defaults to the current
+            one.
+        timeout(Optional[float]): seconds after which a command of `run` is
+            killed, in-process operations can not be interrupted.
+    """
+
+    name: str = "pygit2"
+
+    def __init__(
+        self, cwd: Optional[str] = None, timeout: Optional[float] = None
+    ) -> None:
+        import pygit2
+
+        self._pygit2 = pygit2
+        self.cwd: str = cwd or os.getcwd()
+        self.timeout: Optional[float] = timeout
+        self._repo = None
+        self._lock = threading.Lock()
+
+    @property
+    def repo(self):
+        with self._lock:
+            if self._repo is None:
+                path: Optional[str] = self._pygit2.discover_repository(self.cwd)
+                if path is None:
+                    raise GitError("not a git repository")
+                self._repo = self._pygit2.Repository(path)
+            return self._repo
+
+    def _lookup(self, rev: str):
+        try:
+            return self.repo.revparse_single(rev)
+        except (KeyError, ValueError, self._pygit2.GitError):
+            return None
+
+    def git_dir(self) -> Optional[str]:
+        path: Optional[str] = self._pygit2.discover_repository(self.cwd)
+        return os.path.abspath(path) if path else None
+
+    def staged_diff(self) -> List[FileDiff]:
+        repo = self.repo
+        if repo.head_is_unborn:
+            empty_tree = repo[repo.TreeBuilder().write()]
+            diff = repo.index.diff_to_tree(empty_tree)
+        else:
+            diff = repo.diff("HEAD", cached=True)
+        diff.find_similar()
+        return list(parse_diff(patch.data for patch in diff))
+
+    def write_tree(self) -> str:
+        index = self.repo.index
+        # Another process, eg: `git add`, may have changed it since.
+        index.read()
+        try:
+            return str(index.write_tree())
+        except self._pygit2.GitError as e:
+            raise GitError(str(e)) from e
+
+    def _to_entry(self, commit, with_paths: bool = False) -> LogEntry:
+        paths: List[str] = []
+        if with_paths and len(commit.parent_ids) <= 1:
+            # Only the paths are needed, skip loading the blobs. Without rename
+            # detection, a rename lists both of its paths.
+            flags: int = self._pygit2.GIT_DIFF_SKIP_BINARY_CHECK
+            if commit.parents:
+                diff = commit.parents[0].tree.diff_to_tree(commit.tree, flags=flags)
+            else:
+                diff = commit.tree.diff_to_tree(flags=flags, swap=True)
+            paths = [delta.new_file.path for delta in diff.deltas]
+        return LogEntry(
+            sha=str(commit.id),
+            parents=[str(parent) for parent in commit.parent_ids],
+            author_name=commit.author.name,
+            author_email=commit.author.email,
+            timestamp=commit.author.time,
+            message=commit.message,
+            paths=paths,
+            tree=str(commit.tree_id),
+            author_offset=commit.author.offset,
+            committer_name=commit.committer.name,
+            committer_email=commit.committer.email,
+            committer_timestamp=commit.committer.time,
+            committer_offset=commit.committer.offset,
+        )
+
+    def iter_log(
+        self,
+        rev_range: str = "HEAD",
+        max_count: Optional[int] = None,
+        with_paths: bool = False,
+        topo_order: bool = False,
+    ) -> Iterator[LogEntry]:
+        hide, dots, show = rev_range.rpartition("..")
+        if not dots:
+            hide, show = "", rev_range
+        tip = self._lookup(show or "HEAD")
+        if tip is None:
+            raise GitError(f"unknown revision {show or 'HEAD'}")
+        sort: int = self._pygit2.GIT_SORT_TIME
+        if topo_order:
+            sort |= self._pygit2.GIT_SORT_TOPOLOGICAL
+        walker = self.repo.walk(tip.peel(self._pygit2.Commit).id, sort)
+        if hide:
+            hidden = self._lookup(hide)
+            if hidden is None:
+                raise GitError(f"unknown revision {hide}")
+            walker.hide(hidden.peel(self._pygit2.Commit).id)
+        for count, commit in enumerate(walker):
+            if max_count is not None and count >= max_count:
+                return
+            yield self._to_entry(commit, with_paths)
+
+    def read_commit(self, rev: str) -> Optional[LogEntry]:
+        found = self._lookup(rev)
+        if found is None:
+            return None
+        try:
+            return self._to_entry(found.peel(self._pygit2.Commit))
+        except (ValueError, self._pygit2.GitError):
+            return None
+
+    def read_commit_object(self, rev: str) -> Optional[bytes]:
+        found = self._lookup(rev)
+        if found is None:
+            return None
+        try:
+            return found.peel(self._pygit2.Commit).read_raw()
+        except (ValueError, self._pygit2.GitError):
+            return None
+
+    def write_commit_object(self, data: bytes) -> str:
+        try:
+            return str(self.repo.odb.write(self._pygit2.GIT_OBJECT_COMMIT, data))
+        except (ValueError, self._pygit2.GitError) as e:
+            raise GitError(str(e)) from e
+
+    def resolve(self, rev: str) -> Optional[str]:
+        found = self._lookup(rev)
+        return str(found.id) if found is not None else None
+
+    def is_ancestor(self, ancestor: str, rev: str) -> bool:
+        found = [self._lookup(ancestor), self._lookup(rev)]
+        if None in found:
+            return False
+        try:
+            older, newer = [f.peel(self._pygit2.Commit).id for f in found]
+        except (ValueError, self._pygit2.GitError):
+            return False
+        return older == newer or self.repo.descendant_of(newer, older)
+
+    def head_branch(self) -> Optional[str]:
+        repo = self.repo
+        if repo.head_is_detached:
+            return None
+        target: str = repo.references["HEAD"].target
+        return target[len("refs/heads/") :]
+
+    def list_refs(self, prefix: str = "refs/") -> Dict[str, str]:
+        references = self.repo.references
+        return {
+            name: str(references[name].resolve().target)
+            for name in references
+            if name.startswith(prefix)
+        }
+
+    def get_config(self, key: str) -> Optional[str]:
+        try:
+            return self.repo.config[key]
+        except KeyError:
+            return None
+
+    def set_config(self, values: Dict[str, str], scope: str = "global") -> None:
+        if scope == "local":
+            config = self.repo.config
+        else:
+            try:
+                config = self._pygit2.Config.get_global_config()
+            except (OSError, KeyError, self._pygit2.GitError):
+                config = self._pygit2.Config(os.path.expanduser("~/.gitconfig"))
+        try:
+            for key, value in values.items():
+                config[key] = value
+        except self._pygit2.GitError as e:
+            raise GitError(str(e)) from e
+
+
+def get_git_backend(
+    name: Optional[str] = None,
+    cwd: Optional[str] = None,
+    timeout: Optional[float] = None,
+    prefer: Sequence[str] = ("pygit2", "subprocess"),
+) -> GitBackend:
+    """Get a git backend for the repository of `cwd`.
+
+    Args:
+        name(Optional[str]): `subprocess`, `pygit2`, or `auto` for the first
+            available backend of `prefer`. Defaults to `GCOP_GIT_BACKEND`, else
+            `auto`.
+        cwd(Optional[str]): directory of the repository. Defaults to the current
+            one.
+        timeout(Optional[float]): timeout of git subprocesses, in seconds. The
+            walk of `GitBackend.iter_log` counts as one.
+        prefer(Sequence[str]): backends by preference, for the operations of
+            the caller. pygit2 is faster for a few objects and the staged diff,
+            `git log` for walking long histories with the changed paths.
+
+    Returns:
+        GitBackend: the backend.
+
+    Raises:
+        ValueError: unknown backend name.
+    """
+    name = name or os.environ.get("GCOP_GIT_BACKEND") or "auto"
+    if name not in _BACKENDS:
+        raise ValueError(f"unknown git backend {name!r}, expected one of {_BACKENDS}")
+    if name == "auto":
+        available = [
+            backend
+            for backend in prefer
+            if backend == "subprocess" or importlib.util.find_spec(backend)
+        ]
+        name = available[0] if available else "subprocess"
+    if name == "pygit2":
+        return Pygit2Backend(cwd, timeout=timeout)
+    return SubprocessBackend(cwd, timeout=timeout)
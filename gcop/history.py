@@ -0,0 +1,234 @@
+"""Aggregate statistics of the commit history, computed in a single pass.
+
+The log of the git backend is streamed commit by commit and folded into a
+`HistoryStats`, so the memory used depends on the number of authors and files,
+not on the number of commits.
+
+The stats are persisted per repository together with the commit they were
+computed at. Later runs only scan the commits added since then, and rebuild
+from scratch when the history was rewritten.
+"""
+
+import json
+import os
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional
+
+from gcop.cache import make_cache_key
+from gcop.git import GitBackend, LogEntry, get_git_backend
+from gcop.utils import get_default_storage_path, write_json_atomic
+
+__all__ = ["HistoryStats", "HistoryStatsCache", "load_history_stats", "scan_history"]
+
+
+@dataclass
+class HistoryStats:
+    """Aggregates over a range of commits.
+
+    Args:
+        commits(int): number of commits.
+        emails(Counter): commits per author email, merges included.
+        authors(Counter): commits per author name, merges excluded.
+        file_changes(Counter): number of commits touching each path.
+        first_commit_date(Optional[str]): iso date of the oldest commit.
+        last_commit_date(Optional[str]): iso date of the newest commit.
+    """
+
+    commits: int = 0
+    emails: Counter = field(default_factory=Counter)
+    authors: Counter = field(default_factory=Counter)
+    file_changes: Counter = field(default_factory=Counter)
+    first_commit_date: Optional[str] = None
+    last_commit_date: Optional[str] = None
+
+    @property
+    def most_active_author(self) -> Optional[str]:
+        return _most_common(self.authors)
+
+    @property
+    def most_changed_file(self) -> Optional[str]:
+        return _most_common(self.file_changes)
+
+    def update(self, newer: "HistoryStats") -> None:
+        """Fold in the stats of the commits that came after these ones."""
+        self.commits += newer.commits
+        self.emails.update(newer.emails)
+        self.authors.update(newer.authors)
+        self.file_changes.update(newer.file_changes)
+        self.first_commit_date = self.first_commit_date or newer.first_commit_date
+        self.last_commit_date = newer.last_commit_date or self.last_commit_date
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "commits": self.commits,
+            "emails": dict(self.emails),
+            "authors": dict(self.authors),
+            "file_changes": dict(self.file_changes),
+            "first_commit_date": self.first_commit_date,
+            "last_commit_date": self.last_commit_date,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HistoryStats":
+        return cls(
+            commits=data["commits"],
+            emails=Counter(data["emails"]),
+            authors=Counter(data["authors"]),
+            file_changes=Counter(data["file_changes"]),
+            first_commit_date=data["first_commit_date"],
+            last_commit_date=data["last_commit_date"],
+        )
+
+    def add_log(self, entries: Iterable[LogEntry]) -> None:
+        """Fold commits listed with their paths, newest first, see
+        `scan_history`."""
+        for entry in entries:
+            date: str = entry.author_iso_date
+            self.commits += 1
+            self.emails[entry.author_email] += 1
+            if len(entry.parents) <= 1:
+                self.authors[entry.author_name] += 1
+            if self.last_commit_date is None:
+                self.last_commit_date = date
+            self.first_commit_date = date
+            self.file_changes.update(entry.paths)
+
+
+def _most_common(counter: Counter) -> Optional[str]:
+    """Return the most common key, ties are broken by name to be deterministic.
+
+    Examples:
+        >>> _most_common(Counter({"b": 2, "a": 2, "c": 1}))
+        'a'
+        >>> _most_common(Counter()) is None
+        True
+    """
+    if not counter:
+        return None
+    return min(counter.items(), key=lambda item: (-item[1], item[0]))[0]
+
+
+def scan_history(
+    rev_range: str = "HEAD",
+    timeout: Optional[float] = None,
+    stats: Optional[HistoryStats] = None,
+    git: Optional[GitBackend] = None,
+) -> HistoryStats:
+    """Compute the statistics of a range of commits with a single walk.
+
+    Args:
+        rev_range(str): revision range, eg: `HEAD` or `abc..HEAD`.
+        timeout(Optional[float]): seconds after which git is killed, when `git`
+            is not given.
+        stats(Optional[HistoryStats]): stats to fold the range into, a new
+            one is created if not given.
+        git(Optional[GitBackend]): backend of the repository. Defaults to the
+            fastest one for walking the history.
+
+    Returns:
+        HistoryStats: the updated stats.
+
+    Raises:
+        GitError: git failed, eg: the repository is empty.
+        subprocess.TimeoutExpired: the scan took longer than `timeout`.
+    """
+    stats = HistoryStats() if stats is None else stats
+    if git is None:
+        with _history_backend(timeout) as git:
+            stats.add_log(git.iter_log(rev_range, with_paths=True))
+    else:
+        stats.add_log(git.iter_log(rev_range, with_paths=True))
+    return stats
+
+
+def _history_backend(timeout: Optional[float]) -> GitBackend:
+    # A single `git log` walks long histories faster than pygit2.
+    return get_git_backend(timeout=timeout, prefer=("subprocess", "pygit2"))
+
+
+class HistoryStatsCache:
+    """Persisted `HistoryStats` of each repository.
+
+    Entries live in `<storage>/history/<repo key>.json`, where the key is
+    derived from the path of the git directory. Each entry records the commit
+    the stats were computed at.
+
+    Args:
+        cache_dir(Optional[str]): cache directory. Defaults to gcop storage path.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None) -> None:
+        self.cache_dir: str = cache_dir or get_default_storage_path("history")
+
+    def _entry_path(self, git_dir: str) -> str:
+        return os.path.join(self.cache_dir, f"{make_cache_key(git_dir)}.json")
+
+    def get(self, git_dir: str) -> Optional[Dict[str, Any]]:
+        """Get the cached `{"head": str, "stats": HistoryStats}` of a repo."""
+        try:
+            with open(self._entry_path(git_dir), "r", encoding="utf-8") as f:
+                data: Dict[str, Any] = json.load(f)
+            return {
+                "head": data["head"],
+                "stats": HistoryStats.from_dict(data["stats"]),
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def set(self, git_dir: str, head: str, stats: HistoryStats) -> None:
+        try:
+            write_json_atomic(
+                self._entry_path(git_dir), {"head": head, "stats": stats.to_dict()}
+            )
+        except OSError:
+            # The cache is an optimization only, never fail because of it.
+            pass
+
+
+def load_history_stats(
+    timeout: Optional[float] = None,
+    cache: Optional[HistoryStatsCache] = None,
+    git: Optional[GitBackend] = None,
+) -> HistoryStats:
+    """Get the stats of the current repository up to HEAD, incrementally.
+
+    Only `<cached head>..HEAD` is scanned when the cached commit is an ancestor
+    of HEAD. The stats are rebuilt from scratch when it is not, eg: after a
+    rebase or a reset.
+
+    Args:
+        timeout(Optional[float]): timeout of every git command in seconds, when
+            `git` is not given.
+        cache(Optional[HistoryStatsCache]): cache to use. Defaults to the one in
+            gcop storage path.
+        git(Optional[GitBackend]): backend of the repository. Defaults to the
+            fastest one for walking the history.
+
+    Returns:
+        HistoryStats: stats of all the commits reachable from HEAD.
+    """
+    if git is None:
+        with _history_backend(timeout) as git:
+            return load_history_stats(cache=cache, git=git)
+    cache = cache or HistoryStatsCache()
+
+    head: Optional[str] = git.resolve("HEAD")
+    git_dir: Optional[str] = git.git_dir()
+    if head is None or git_dir is None:
+        # Eg: no commit yet, let the scan report the error.
+        return scan_history(git=git)
+    git_dir = os.path.normcase(git_dir)
+
+    cached: Optional[Dict[str, Any]] = cache.get(git_dir)
+    if cached is not None and cached["head"] == head:
+        return cached["stats"]
+
+    if cached is not None and git.is_ancestor(cached["head"], head):
+        stats: HistoryStats = cached["stats"]
+        stats.update(scan_history(f"{cached['head']}..{head}", git=git))
+    else:
+        stats = scan_history(head, git=git)
+
+    cache.set(git_dir, head, stats)
+    return stats
@@ -0,0 +1,327 @@
+"""Repository information shown by `gcop info`.
+
+Every section is computed by an independent probe. The probes run concurrently
+on a thread pool, each one with its own timeout and error handling, so a slow
+or failing probe (eg: counting lines of a large tree) does not hold back the
+others.
+"""
+
+import os
+import subprocess
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from gcop.git import GitBackend, GitError, get_git_backend
+from gcop.history import HistoryStats, load_history_stats
+from gcop.linecount import (
+    TrackedFile,
+    count_file_types,
+    count_lines_by_language,
+    list_tracked_files,
+)
+
+__all__ = ["InfoProbe", "ProbeContext", "PROBES", "iter_repo_info"]
+
+T = TypeVar("T")
+
+_QUICK_TIMEOUT: float = 10
+_HISTORY_TIMEOUT: float = 60
+_LINE_COUNT_TIMEOUT: float = 120
+
+
+class ProbeContext:
+    """What a probe gets to work with during one `gcop info` run.
+
+    Probes of the same run can share an expensive computation (eg: the walk
+    over the history) through `once`, and the git backend through `git`.
+
+    Args:
+        timeout(float): timeout of the probe in seconds, to be passed on to its
+            subprocesses.
+        shared(Dict[str, Future]): results shared by the probes of the run.
+        lock(threading.Lock): guards `shared`.
+        git(Optional[GitBackend]): git backend of the run. Defaults to a new
+            one.
+    """
+
+    def __init__(
+        self,
+        timeout: float,
+        shared: Dict[str, Future],
+        lock: threading.Lock,
+        git: Optional[GitBackend] = None,
+    ):
+        self.timeout = timeout
+        self._shared = shared
+        self._lock = lock
+        self.git: GitBackend = git or get_git_backend(timeout=timeout)
+
+    def once(self, key: str, compute: Callable[[float], T]) -> T:
+        """Compute a value once per run, concurrent callers wait for it.
+
+        Args:
+            key(str): name of the shared value.
+            compute(Callable[[float], T]): computes the value, receives the
+                timeout of the first caller.
+
+        Returns:
+            T: the shared value. The exception raised by `compute`, if any, is
+                raised to every caller.
+        """
+        with self._lock:
+            future: Optional[Future] = self._shared.get(key)
+            owner: bool = future is None
+            if owner:
+                future = self._shared[key] = Future()
+
+        if owner:
+            try:
+                future.set_result(compute(self.timeout))
+            except BaseException as e:
+                future.set_exception(e)
+        return future.result(timeout=self.timeout)
+
+
+@dataclass
+class InfoProbe:
+    """A single section of `gcop info`.
+
+    Args:
+        label (str): section title.
+        func (Callable[[ProbeContext], str]): computes the section.
+        timeout (float): timeout of the probe in seconds.
+        multiline (bool): whether the value is rendered below the title.
+    """
+
+    label: str
+    func: Callable[[ProbeContext], str]
+    timeout: float = _QUICK_TIMEOUT
+    multiline: bool = False
+
+    def render(self, value: str) -> str:
+        separator: str = "\n" if self.multiline else " "
+        return f"{self.label}:{separator}{value}"
+
+
+def _project_name(ctx: ProbeContext) -> str:
+    return os.path.basename(os.getcwd())
+
+
+def _current_branch(ctx: ProbeContext) -> str:
+    return ctx.git.head_branch() or "HEAD"
+
+
+def _latest_commit(ctx: ProbeContext) -> str:
+    commit = ctx.git.read_commit("HEAD")
+    if commit is None:
+        raise GitError("no commits yet")
+    return f"{commit.sha[:7]} {commit.subject}"
+
+
+def _uncommitted_changes(ctx: ProbeContext) -> str:
+    return str(
+        len(ctx.git.run("status", "--porcelain", timeout=ctx.timeout).splitlines())
+    )
+
+
+def _remote_url(ctx: ProbeContext) -> str:
+    url: Optional[str] = ctx.git.get_config("remote.origin.url")
+    if url is None:
+        raise GitError("no remote named origin")
+    return url
+
+
+def _history(ctx: ProbeContext) -> HistoryStats:
+    # One walk over the history answers every history related section, and
+    # only the commits added since the previous run are walked.
+    return ctx.once("history", lambda timeout: load_history_stats(timeout=timeout))
+
+
+def _total_commits(ctx: ProbeContext) -> str:
+    return str(_history(ctx).commits)
+
+
+def _contributors(ctx: ProbeContext) -> str:
+    return str(len(_history(ctx).emails))
+
+
+def _creation_time(ctx: ProbeContext) -> str:
+    return _history(ctx).first_commit_date or "No commits"
+
+
+def _last_modified(ctx: ProbeContext) -> str:
+    return _history(ctx).last_commit_date or "No commits"
+
+
+def _repo_size(ctx: ProbeContext) -> str:
+    return (
+        ctx.git.run("count-objects", "-vH", timeout=ctx.timeout)
+        .split("\n")[2]
+        .split(":")[1]
+        .strip()
+    )
+
+
+def _most_active(ctx: ProbeContext) -> str:
+    return _history(ctx).most_active_author or "No commits"
+
+
+def _most_changed(ctx: ProbeContext) -> str:
+    return _history(ctx).most_changed_file or "No commits"
+
+
+def _tracked_files(ctx: ProbeContext) -> List[TrackedFile]:
+    return ctx.once("files", lambda timeout: list_tracked_files(timeout=timeout))
+
+
+def _line_count(ctx: ProbeContext) -> str:
+    stats = count_lines_by_language(_tracked_files(ctx), timeout=ctx.timeout)
+    if not stats:
+        return "No source files found"
+    return "\n".join(
+        f"{language}: {language_stats.code} lines"
+        for language, language_stats in stats.items()
+    )
+
+
+def _latest_tag(ctx: ProbeContext) -> str:
+    try:
+        return ctx.git.run(
+            "describe", "--tags", "--abbrev=0", timeout=ctx.timeout
+        ).strip()
+    except GitError:
+        return "No tags found"
+
+
+def _branch_count(ctx: ProbeContext) -> str:
+    refs: Dict[str, str] = ctx.git.list_refs("refs/")
+    return str(sum(name.startswith(("refs/heads/", "refs/remotes/")) for name in refs))
+
+
+def _untracked_count(ctx: ProbeContext) -> str:
+    return str(
+        len(
+            ctx.git.run(
+                "ls-files", "--others", "--exclude-standard", timeout=ctx.timeout
+            ).splitlines()
+        )
+    )
+
+
+def _submodules(ctx: ProbeContext) -> str:
+    try:
+        return (
+            ctx.git.run("submodule", "status", timeout=ctx.timeout).strip()
+            or "No submodules"
+        )
+    except GitError:
+        return "No submodules"
+
+
+def _latest_merge(ctx: ProbeContext) -> str:
+    try:
+        latest_merge: str = ctx.git.run(
+            "log", "--merges", "-n", "1", "--pretty=format:%h - %s", timeout=ctx.timeout
+        ).strip()
+        return latest_merge or "No merge commits found"
+    except GitError:
+        return "No merge commits found"
+
+
+def _file_types(ctx: ProbeContext) -> str:
+    file_types = count_file_types(_tracked_files(ctx))
+    return "\n".join(f"{count:7} {ext}" for ext, count in file_types.most_common())
+
+
+PROBES: List[InfoProbe] = [
+    InfoProbe("Project Name", _project_name),
+    InfoProbe("Current Branch", _current_branch),
+    InfoProbe("Latest Commit", _latest_commit),
+    InfoProbe("Uncommitted Changes", _uncommitted_changes),
+    InfoProbe("Remote URL", _remote_url),
+    InfoProbe("Total Commits", _total_commits, timeout=_HISTORY_TIMEOUT),
+    InfoProbe("Contributors", _contributors, timeout=_HISTORY_TIMEOUT),
+    InfoProbe("Repository Created", _creation_time, timeout=_HISTORY_TIMEOUT),
+    InfoProbe("Last Modified", _last_modified, timeout=_HISTORY_TIMEOUT),
+    InfoProbe("Repository Size", _repo_size),
+    InfoProbe("Most Active Contributor", _most_active, timeout=_HISTORY_TIMEOUT),
+    InfoProbe("Most Changed File", _most_changed, timeout=_HISTORY_TIMEOUT),
+    InfoProbe(
+        "Line Count by Language",
+        _line_count,
+        timeout=_LINE_COUNT_TIMEOUT,
+        multiline=True,
+    ),
+    InfoProbe("Latest Tag", _latest_tag),
+    InfoProbe("Branch Count", _branch_count),
+    InfoProbe("Untracked Files", _untracked_count),
+    InfoProbe("Submodules", _submodules),
+    InfoProbe("Latest Merge Commit", _latest_merge),
+    InfoProbe("File Type Statistics", _file_types, multiline=True),
+]
+
+
+def _run_probe(probe: InfoProbe, ctx: ProbeContext) -> Tuple[str, bool]:
+    """Run a probe and turn any failure into a message for its section.
+
+    Returns:
+        Tuple[str, bool]: the value and whether the probe succeeded.
+    """
+    try:
+        return probe.func(ctx), True
+    except (subprocess.TimeoutExpired, FutureTimeoutError):
+        return f"timed out after {probe.timeout:g}s", False
+    except subprocess.CalledProcessError as e:
+        stderr: List[str] = (e.stderr or "").strip().splitlines()
+        detail: str = stderr[0] if stderr else f"exit status {e.returncode}"
+        return f"unavailable ({detail})", False
+    except Exception as e:
+        return f"unavailable ({e})", False
+
+
+def iter_repo_info(
+    probes: Optional[List[InfoProbe]] = None,
+    max_workers: int = 16,
+    git: Optional[GitBackend] = None,
+) -> Iterator[Tuple[InfoProbe, str, bool]]:
+    """Run the probes concurrently and yield each section as soon as it is done.
+
+    Args:
+        probes(Optional[List[InfoProbe]]): probes to run. Defaults to `PROBES`.
+        max_workers(int): maximum number of probes running at once.
+        git(Optional[GitBackend]): git backend shared by the probes. Defaults
+            to a new one, closed at the end of the run.
+
+    Yields:
+        Tuple[InfoProbe, str, bool]: the probe, its value and whether it
+            succeeded, in order of completion.
+    """
+    probes = PROBES if probes is None else probes
+
+    shared: Dict[str, Future] = {}
+    lock = threading.Lock()
+    owned: Optional[GitBackend] = None
+    if git is None:
+        git = owned = get_git_backend(timeout=_QUICK_TIMEOUT)
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    pending: Dict[Future, InfoProbe] = {}
+    try:
+        for probe in probes:
+            ctx = ProbeContext(probe.timeout, shared, lock, git)
+            pending[pool.submit(_run_probe, probe, ctx)] = probe
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            # Keep the declared order among probes finishing at the same time.
+            for future in sorted(done, key=lambda f: probes.index(pending[f])):
+                value, ok = future.result()
+                yield pending.pop(future), value, ok
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False)
+        if owned is not None:
+            owned.close()
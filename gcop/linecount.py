@@ -0,0 +1,454 @@
+"""Line counting by language for `gcop info`, without depending on `cloc`.
+
+Only files tracked by git are counted. Files are read in a process pool, large
+ones through a memory map, and the counts are cached by blob SHA so files that
+did not change since a previous run are never read again.
+"""
+
+import json
+import mmap
+import multiprocessing
+import os
+import subprocess
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from gcop.utils import get_default_storage_path, write_json_atomic
+
+__all__ = [
+    "LanguageStats",
+    "LineCountCache",
+    "TrackedFile",
+    "count_file_types",
+    "count_lines",
+    "count_lines_by_language",
+    "detect_language",
+    "list_tracked_files",
+]
+
+_MMAP_THRESHOLD: int = 1024 * 1024  # bytes
+_MAX_FILE_SIZE: int = 64 * 1024 * 1024  # bytes, bigger files are skipped
+_BINARY_SNIFF_SIZE: int = 8000  # bytes, same heuristic as git
+_PARALLEL_THRESHOLD: int = 256  # files, fewer are counted in-process
+_BATCH_SIZE: int = 64  # files per task sent to the process pool
+_MAX_CACHE_ENTRIES: int = 200_000
+
+# git modes of entries which are not regular files
+_SKIPPED_MODES: Tuple[str, ...] = ("120000", "160000")
+
+LANGUAGES: Dict[str, str] = {
+    "bash": "Bourne Again Shell",
+    "c": "C",
+    "cc": "C++",
+    "cfg": "INI",
+    "cjs": "JavaScript",
+    "cpp": "C++",
+    "cs": "C#",
+    "css": "CSS",
+    "cxx": "C++",
+    "dart": "Dart",
+    "go": "Go",
+    "h": "C/C++ Header",
+    "hpp": "C/C++ Header",
+    "htm": "HTML",
+    "html": "HTML",
+    "ini": "INI",
+    "java": "Java",
+    "js": "JavaScript",
+    "json": "JSON",
+    "jsx": "JavaScript",
+    "kt": "Kotlin",
+    "kts": "Kotlin",
+    "less": "LESS",
+    "lua": "Lua",
+    "md": "Markdown",
+    "mjs": "JavaScript",
+    "mts": "TypeScript",
+    "php": "PHP",
+    "pl": "Perl",
+    "ps1": "PowerShell",
+    "py": "Python",
+    "pyi": "Python",
+    "r": "R",
+    "rb": "Ruby",
+    "rs": "Rust",
+    "rst": "reStructuredText",
+    "sass": "Sass",
+    "scala": "Scala",
+    "scss": "SCSS",
+    "sh": "Bourne Shell",
+    "sql": "SQL",
+    "svelte": "Svelte",
+    "swift": "Swift",
+    "toml": "TOML",
+    "ts": "TypeScript",
+    "tsx": "TypeScript",
+    "vue": "Vuejs Component",
+    "xml": "XML",
+    "yaml": "YAML",
+    "yml": "YAML",
+    "zsh": "zsh",
+}
+
+_FILENAMES: Dict[str, str] = {
+    "CMakeLists.txt": "CMake",
+    "Dockerfile": "Dockerfile",
+    "Makefile": "make",
+    "makefile": "make",
+}
+
+
+@dataclass(frozen=True)
+class _CommentSyntax:
+    line: Tuple[bytes, ...] = ()
+    block: Optional[Tuple[bytes, bytes]] = None
+
+
+_HASH = _CommentSyntax(line=(b"#",))
+_C_LIKE = _CommentSyntax(line=(b"//",), block=(b"/*", b"*/"))
+_MARKUP = _CommentSyntax(block=(b"<!--", b"-->"))
+_NO_COMMENTS = _CommentSyntax()
+
+_SYNTAX: Dict[str, _CommentSyntax] = {
+    "Bourne Again Shell": _HASH,
+    "Bourne Shell": _HASH,
+    "C": _C_LIKE,
+    "C#": _C_LIKE,
+    "C++": _C_LIKE,
+    "C/C++ Header": _C_LIKE,
+    "CMake": _HASH,
+    "CSS": _CommentSyntax(block=(b"/*", b"*/")),
+    "Dart": _C_LIKE,
+    "Dockerfile": _HASH,
+    "Go": _C_LIKE,
+    "HTML": _MARKUP,
+    "INI": _CommentSyntax(line=(b";", b"#")),
+    "Java": _C_LIKE,
+    "JavaScript": _C_LIKE,
+    "Kotlin": _C_LIKE,
+    "LESS": _C_LIKE,
+    "Lua": _CommentSyntax(line=(b"--",)),
+    "Markdown": _MARKUP,
+    "PHP": _CommentSyntax(line=(b"//", b"#"), block=(b"/*", b"*/")),
+    "Perl": _HASH,
+    "PowerShell": _CommentSyntax(line=(b"#",), block=(b"<#", b"#>")),
+    "Python": _HASH,
+    "R": _HASH,
+    "Ruby": _HASH,
+    "Rust": _C_LIKE,
+    "SCSS": _C_LIKE,
+    "SQL": _CommentSyntax(line=(b"--",), block=(b"/*", b"*/")),
+    "Sass": _C_LIKE,
+    "Scala": _C_LIKE,
+    "Svelte": _MARKUP,
+    "Swift": _C_LIKE,
+    "TOML": _HASH,
+    "TypeScript": _C_LIKE,
+    "Vuejs Component": _MARKUP,
+    "XML": _MARKUP,
+    "YAML": _HASH,
+    "make": _HASH,
+    "zsh": _HASH,
+}
+
+
+@dataclass
+class TrackedFile:
+    """A file of the index.
+
+    Args:
+        path(str): path relative to the repository root.
+        sha(str): blob SHA of the staged content.
+        modified(bool): whether the working tree content differs from the blob,
+            in which case the counts of the blob can not be reused.
+    """
+
+    path: str
+    sha: str
+    modified: bool = False
+
+
+@dataclass
+class LanguageStats:
+    files: int = 0
+    blank: int = 0
+    comment: int = 0
+    code: int = 0
+
+
+def _git_z(*args: str, timeout: Optional[float]) -> List[str]:
+    output: str = subprocess.run(
+        ["git", *args],
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        errors="surrogateescape",
+        check=True,
+        timeout=timeout,
+    ).stdout
+    return [entry for entry in output.split("\0") if entry]
+
+
+def list_tracked_files(timeout: Optional[float] = None) -> List[TrackedFile]:
+    """List the regular files of the index of the current repository.
+
+    Paths are relative to the current directory, like `git ls-files`.
+    """
+    modified = set(_git_z("ls-files", "-m", "-z", timeout=timeout))
+
+    files: List[TrackedFile] = []
+    seen = set()
+    for entry in _git_z("ls-files", "-s", "-z", timeout=timeout):
+        info, path = entry.split("\t", 1)
+        mode, sha, _ = info.split(" ", 2)
+        # Conflicted paths are listed once per stage.
+        if mode in _SKIPPED_MODES or path in seen:
+            continue
+        seen.add(path)
+        files.append(TrackedFile(path, sha, path in modified))
+    return files
+
+
+def detect_language(path: str) -> Optional[str]:
+    """Detect the language of a file from its name.
+
+    Examples:
+        >>> detect_language("gcop/__main__.py")
+        'Python'
+        >>> detect_language("docker/Dockerfile")
+        'Dockerfile'
+        >>> detect_language("LICENSE") is None
+        True
+    """
+    name: str = os.path.basename(path)
+    if name in _FILENAMES:
+        return _FILENAMES[name]
+    if "." not in name:
+        return None
+    return LANGUAGES.get(name.rsplit(".", 1)[1].lower())
+
+
+def count_lines(lines: Iterable[bytes], language: str) -> Tuple[int, int, int]:
+    """Count the blank, comment and code lines of a file.
+
+    A line holding both code and a comment is counted as code.
+
+    Args:
+        lines(Iterable[bytes]): lines of the file.
+        language(str): language of the file, see `detect_language`.
+
+    Returns:
+        Tuple[int, int, int]: blank, comment and code line counts.
+
+    Examples:
+        >>> count_lines([b"# comment", b"", b"x = 1  # set x"], "Python")
+        (1, 1, 1)
+        >>> count_lines([b"/* a", b" b */", b"int x; /* c", b"*/", b"// d"], "C")
+        (0, 4, 1)
+    """
+    syntax: _CommentSyntax = _SYNTAX.get(language, _NO_COMMENTS)
+    blank = comment = code = 0
+    in_block: bool = False
+
+    for line in lines:
+        stripped: bytes = line.strip()
+        if in_block:
+            comment += 1
+            in_block = syntax.block[1] not in stripped
+        elif not stripped:
+            blank += 1
+        elif syntax.line and stripped.startswith(syntax.line):
+            comment += 1
+        elif syntax.block and stripped.startswith(syntax.block[0]):
+            comment += 1
+            start: int = len(syntax.block[0])
+            in_block = syntax.block[1] not in stripped[start:]
+        else:
+            code += 1
+            if syntax.block and syntax.block[0] in stripped:
+                start = stripped.rindex(syntax.block[0]) + len(syntax.block[0])
+                in_block = syntax.block[1] not in stripped[start:]
+
+    return blank, comment, code
+
+
+def _count_file(path: str, language: str) -> Optional[Tuple[int, int, int]]:
+    """Count the lines of a file on disk, None if it is binary or unreadable."""
+    try:
+        with open(path, "rb") as f:
+            size: int = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return 0, 0, 0
+            if size > _MAX_FILE_SIZE:
+                return None
+            if size < _MMAP_THRESHOLD:
+                data: bytes = f.read()
+                if b"\0" in data[:_BINARY_SNIFF_SIZE]:
+                    return None
+                return count_lines(data.splitlines(), language)
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.find(b"\0", 0, _BINARY_SNIFF_SIZE) != -1:
+                    return None
+                return count_lines(iter(mm.readline, b""), language)
+    except (OSError, ValueError):
+        return None
+
+
+def _count_batch(
+    batch: List[Tuple[str, str]],
+) -> List[Optional[Tuple[int, int, int]]]:
+    return [_count_file(path, language) for path, language in batch]
+
+
+def _stop_pool(pool: ProcessPoolExecutor, futures: Iterable[Future]) -> None:
+    """Shut the pool down without waiting for the batches still running.
+
+    `shutdown(wait=False)` alone leaves them to be joined at interpreter exit,
+    so the workers are terminated when any batch is left, eg: after a timeout.
+    """
+    futures = list(futures)
+    for future in futures:
+        future.cancel()
+    running: bool = not all(future.done() for future in futures)
+    # There is no public way to reach the workers.
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=not running)
+    if running:
+        for process in processes:
+            process.terminate()
+
+
+class LineCountCache:
+    """Line counts of blobs, keyed by blob SHA and language.
+
+    The counts live in `<storage>/cache/line_counts.json`. A blob SHA identifies
+    the content of a file, so the counts are shared between all repositories
+    and branches.
+
+    Args:
+        cache_dir(Optional[str]): cache directory. Defaults to gcop storage path.
+        max_entries(int): maximum number of blobs kept.
+    """
+
+    def __init__(
+        self, cache_dir: Optional[str] = None, max_entries: int = _MAX_CACHE_ENTRIES
+    ) -> None:
+        self.path: str = os.path.join(
+            cache_dir or get_default_storage_path("cache"), "line_counts.json"
+        )
+        self.max_entries: int = max_entries
+
+    def load(self) -> Dict[str, List[int]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self, used: Dict[str, List[int]], previous: Dict[str, List[int]]):
+        """Save the counts used by this run, then older ones while there is room."""
+        entries: Dict[str, List[int]] = dict(used)
+        for key, value in previous.items():
+            if len(entries) >= self.max_entries:
+                break
+            entries.setdefault(key, value)
+        try:
+            write_json_atomic(self.path, entries)
+        except OSError:
+            # The cache is an optimization only, never fail because of it.
+            pass
+
+
+def count_lines_by_language(
+    files: List[TrackedFile],
+    cache: Optional[LineCountCache] = None,
+    max_workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Dict[str, LanguageStats]:
+    """Count the lines of the given files by language.
+
+    Files of unknown languages and binary files are ignored.
+
+    Args:
+        files(List[TrackedFile]): files to count, see `list_tracked_files`.
+        cache(Optional[LineCountCache]): cache of the counts by blob SHA.
+            Defaults to the one in gcop storage path.
+        max_workers(Optional[int]): size of the process pool, its workers are
+            spawned rather than forked.
+        timeout(Optional[float]): timeout in seconds.
+
+    Returns:
+        Dict[str, LanguageStats]: stats by language, most code first.
+    """
+    cache = cache or LineCountCache()
+    previous: Dict[str, List[int]] = cache.load()
+    used: Dict[str, List[int]] = {}
+
+    stats: Dict[str, LanguageStats] = {}
+    todo: List[Tuple[TrackedFile, str]] = []
+
+    def add(language: str, counts: Optional[Tuple[int, int, int]]) -> None:
+        if counts is None:
+            return
+        language_stats = stats.setdefault(language, LanguageStats())
+        language_stats.files += 1
+        language_stats.blank += counts[0]
+        language_stats.comment += counts[1]
+        language_stats.code += counts[2]
+
+    for file in files:
+        language: Optional[str] = detect_language(file.path)
+        if language is None:
+            continue
+        key: str = f"{file.sha}:{language}"
+        if not file.modified and key in previous:
+            used[key] = previous[key]
+            add(language, tuple(previous[key]))
+        else:
+            todo.append((file, language))
+
+    def collect(batch: List[Tuple[TrackedFile, str]], results) -> None:
+        for (file, language), counts in zip(batch, results):
+            add(language, counts)
+            if counts is not None and not file.modified:
+                used[f"{file.sha}:{language}"] = list(counts)
+
+    batches: List[List[Tuple[TrackedFile, str]]] = [
+        todo[i : i + _BATCH_SIZE] for i in range(0, len(todo), _BATCH_SIZE)
+    ]
+    if len(todo) < _PARALLEL_THRESHOLD:
+        for batch in batches:
+            collect(batch, _count_batch([(f.path, lang) for f, lang in batch]))
+    else:
+        # This runs in a thread of `gcop info`, forking there can deadlock the
+        # workers on locks held by the other threads.
+        pool = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        futures: Dict[Future, List[Tuple[TrackedFile, str]]] = {}
+        try:
+            for batch in batches:
+                paths = [(file.path, language) for file, language in batch]
+                futures[pool.submit(_count_batch, paths)] = batch
+            for future in as_completed(futures, timeout=timeout):
+                collect(futures[future], future.result())
+        finally:
+            _stop_pool(pool, futures)
+
+    if todo:
+        cache.save(used, previous)
+    return dict(sorted(stats.items(), key=lambda item: (-item[1].code, item[0])))
+
+
+def count_file_types(files: List[TrackedFile]) -> Counter:
+    """Count files by extension, or by name for files without one.
+
+    Examples:
+        >>> count_file_types([TrackedFile("a.py", ""), TrackedFile("b/c.py", ""),
+        ...                   TrackedFile("Makefile", "")])
+        Counter({'py': 2, 'Makefile': 1})
+    """
+    return Counter(os.path.basename(file.path).rsplit(".", 1)[-1] for file in files)
@@ -1,8 +1,13 @@
-from typing import Optional
+from typing import List, Optional, Tuple
 
-import pne
-
-__all__ = ["get_commit_instrcution"]
+__all__ = [
+    "get_commit_instrcution",
+    "get_commit_system_prompt",
+    "get_commit_user_prompt",
+    "get_diff_summary_instruction",
+    "get_retry_instruction",
+    "get_summarized_diff",
+]
 
 _DEFAULT_COMMIT_TEMPLATE: str = """
 <good_example>
@@ -72,36 +77,160 @@ Generate a conventional git commit message adhering to the following format and
 </commit_templates>
 
 release generate a conventional commit message based on the provided git diff, following the above guidelines.
+"""  # noqa
+
+_OUTPUT_FORMAT_PROMPT: str = """
+## Output Format
+Answer with a single JSON object which conforms to the JSON schema below, and nothing else.
 
+<json_schema>
+{schema}
+</json_schema>
+"""  # noqa
+
+_COMMIT_DIFF_PROMPT: str = """
 <git_diff>
 {diff}
 </git_diff>
+"""
+
+_HISTORY_EXAMPLES_PROMPT: str = """
+These are past commit messages of this repository, most of them for changes to the same files. Follow their conventions (e.g. scopes, wording, language and level of detail) where they do not conflict with the guidelines, but describe the changes of the git diff above only.
+
+<commit_history>
+{examples}
+</commit_history>
 """  # noqa
 
 
-def get_commit_instrcution(
+_DIFF_SUMMARY_PROMPT: str = """
+# Git Diff Summarizer
+You are a professional software developer. The git diff below is one part of a staged change that is too large to review at once. Summaries of all parts will later be combined to write a single commit message.
+
+## Guidelines
+- For every file, describe what changed and, if it is apparent, why.
+- Mention added, removed or renamed functions, classes, options and dependencies by name.
+- Be concise and factual, use a markdown list with one entry per file.
+- Do not write a commit message and do not add an introduction or conclusion.
+
+<git_diff>
+{diff}
+</git_diff>
+"""  # noqa
+
+_RETRY_PROMPT: str = """
+The commit message above needs improvement. Please generate a better git commit message for the same git diff, following the same guidelines.
+"""  # noqa
+
+_SUMMARIZED_DIFF_HEADER: str = """
+The staged diff is too large to include in full. It was split into {count} parts by file, and each part was summarized separately. Use these summaries as the git diff.
+"""  # noqa
+
+
+def get_diff_summary_instruction(diff: str) -> str:
+    """Get the prompt for summarizing one part of a large diff.
+
+    Args:
+        diff (str): part of a git diff
+
+    Returns:
+        str: prompt for summarizing the diff
+    """
+    return _DIFF_SUMMARY_PROMPT.format(diff=diff)
+
+
+def get_retry_instruction(feedback: Optional[str] = None) -> str:
+    """Get the follow-up prompt asking the model to improve its previous commit
+    message, in the same conversation.
+
+    Args:
+        feedback (Optional[str], optional): feedback of the user. Defaults to None.
+
+    Returns:
+        str: prompt for improving the previous commit message
+    """
+    _: str = _RETRY_PROMPT
+    if feedback:
+        _ += f"<user_feedback>{feedback}</user_feedback>"
+    return _
+
+
+def get_summarized_diff(summaries: List[Tuple[List[str], str]]) -> str:
+    """Combine the summaries of all parts of a large diff into the text that is
+    used in place of the diff.
+
+    Args:
+        summaries (List[Tuple[List[str], str]]): the files and the summary of
+            every part, in order.
+
+    Returns:
+        str: the combined summaries
+    """
+    parts: List[str] = [_SUMMARIZED_DIFF_HEADER.format(count=len(summaries))]
+    for index, (paths, summary) in enumerate(summaries, start=1):
+        parts.append(
+            f'<diff_part index="{index}" files="{", ".join(paths)}">\n'
+            f"{summary.strip()}\n"
+            "</diff_part>\n"
+        )
+    return "\n".join(parts)
+
+
+def get_commit_system_prompt(
+    commit_template: Optional[str] = None, output_schema: Optional[str] = None
+) -> str:
+    """Get the static part of the prompt for generating commit messages: the
+    guidelines, the commit template and the output format.
+
+    It does not depend on the diff, so it is sent as the first message and
+    providers can cache it across calls.
+
+    Args:
+        commit_template (Optional[str], optional): commit template. Defaults to None.
+        output_schema (Optional[str], optional): JSON schema of the answer. Defaults
+            to None.
+
+    Returns:
+        str: system prompt for generating commit messages
+    """
+    _: str = _COMMIT_SYS_PROMPT.format(
+        commit_template=commit_template or _DEFAULT_COMMIT_TEMPLATE
+    )
+    if output_schema:
+        _ += _OUTPUT_FORMAT_PROMPT.format(schema=output_schema)
+    return _
+
+
+def get_commit_user_prompt(
     diff: str,
-    commit_template: Optional[str] = None,
     instruction: Optional[str] = None,
     previous_commit_message: Optional[str] = None,
+    history_examples: Optional[List[str]] = None,
 ) -> str:
-    """Get the system prompt for generating commit messages.
+    """Get the part of the prompt for generating commit messages which depends
+    on the diff.
 
     Args:
         diff (str): git diff
-        commit_template (Optional[str], optional): commit template. Defaults to None.
         instruction (Optional[str], optional): additional instruction. Defaults to None.
         previous_commit_message (Optional[str], optional): previous commit message. At
             the first time, it's usually empty. It always uses when you are
             improving the commit message or providing feedback.
+        history_examples (Optional[List[str]], optional): past commit messages of
+            the repository, as examples of its style. Defaults to None.
 
     Returns:
-        str: system prompt for generating commit messages
+        str: prompt with the diff
     """
-    commit_template: str = commit_template or _DEFAULT_COMMIT_TEMPLATE
-    _: str = pne.StringTemplate(_COMMIT_SYS_PROMPT).format(
-        commit_template=commit_template, diff=diff
-    )
+    _: str = _COMMIT_DIFF_PROMPT.format(diff=diff)
+
+    if history_examples:
+        _ += _HISTORY_EXAMPLES_PROMPT.format(
+            examples="\n".join(
+                f"<commit_message>\n{message}\n</commit_message>"
+                for message in history_examples
+            )
+        )
 
     if previous_commit_message:
         _ += f"""
@@ -117,3 +246,27 @@ def get_commit_instrcution(
         _ += f"<user_feedback>{instruction}</user_feedback>"
 
     return _
+
+
+def get_commit_instrcution(
+    diff: str,
+    commit_template: Optional[str] = None,
+    instruction: Optional[str] = None,
+    previous_commit_message: Optional[str] = None,
+) -> str:
+    """Get the system prompt for generating commit messages, as a single string.
+
+    Args:
+        diff (str): git diff
+        commit_template (Optional[str], optional): commit template. Defaults to None.
+        instruction (Optional[str], optional): additional instruction. Defaults to None.
+        previous_commit_message (Optional[str], optional): previous commit message. At
+            the first time, it's usually empty. It always uses when you are
+            improving the commit message or providing feedback.
+
+    Returns:
+        str: system prompt for generating commit messages
+    """
+    return get_commit_system_prompt(commit_template) + get_commit_user_prompt(
+        diff, instruction, previous_commit_message
+    )
@@ -0,0 +1,326 @@
+"""Client side rate limiting of model calls.
+
+Every model call takes one request and its estimated tokens out of two token
+buckets, refilled at `requests_per_minute` and `tokens_per_minute`. The buckets
+live in a file under the storage path, one per model, updated under an
+exclusive file lock, so `gcop commit`, `gcop watch`, `gcop reword` and the
+daemon share the budget of the provider account instead of each spending all
+of it.
+
+On a 429 the refill rate is halved and every process waits for the
+`Retry-After` of the provider, or an exponential backoff, before its next call.
+Each success adds back a tenth of the configured rate (AIMD). The number of
+calls in flight in one process follows the same rule, so the thread pools of
+large diffs, candidates and `gcop reword` shrink instead of retrying all at
+once.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Iterator, Optional, TypeVar
+
+from gcop.cache import make_cache_key
+from gcop.config import ModelConfig, RateLimitConfig
+from gcop.utils import get_default_storage_path, write_json_atomic
+from gcop.utils.logger import Color, logger
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover, Windows
+    fcntl = None
+    import msvcrt
+
+__all__ = [
+    "RateLimiter",
+    "get_rate_limiter",
+    "get_retry_after",
+    "is_rate_limit_error",
+]
+
+T = TypeVar("T")
+
+_MIN_RATE_SCALE: float = 0.1
+_RATE_SCALE_STEP: float = 0.1
+_MAX_BACKOFF: float = 60.0  # seconds
+_MIN_SLEEP: float = 0.05  # seconds, rounding errors must not spin
+_MAX_SLEEP: float = 5.0  # seconds between two looks at the shared state
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Whether `error` is a 429 of the provider, as raised by litellm or an
+    OpenAI compatible SDK."""
+    return (
+        getattr(error, "status_code", None) == 429
+        or type(error).__name__ == "RateLimitError"
+    )
+
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    """Get the seconds to wait from the `Retry-After` header of a 429.
+
+    Examples:
+        >>> from types import SimpleNamespace
+        >>> error = Exception()
+        >>> error.response = SimpleNamespace(headers={"retry-after": "7"})
+        >>> get_retry_after(error)
+        7.0
+        >>> get_retry_after(Exception()) is None
+        True
+    """
+    headers: Optional[dict] = getattr(error, "litellm_response_headers", None)
+    if not headers:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    headers = {str(k).lower(): v for k, v in dict(headers).items()}
+    try:
+        if "retry-after-ms" in headers:
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value: Optional[str] = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _FileLock:
+    """Exclusive lock on a file, held across processes and threads.
+
+    The threads of a process, eg: the candidates or `gcop reword --jobs`, share
+    one instance, each acquisition opens its own handle of the file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def hold(self) -> Iterator[None]:
+        with self._thread_lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a+") as f:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                else:  # pragma: no cover
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                    else:  # pragma: no cover
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class _AdaptiveSemaphore:
+    """Semaphore whose limit grows by one after `limit` successes and halves on
+    a rate limit."""
+
+    def __init__(self, max_limit: int) -> None:
+        self.max_limit: int = max(1, max_limit)
+        self.limit: float = float(self.max_limit)
+        self._in_flight: int = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, rate_limited: bool = False) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            if rate_limited:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class RateLimiter:
+    """Shared request and token budgets of one model.
+
+    Args:
+        config(RateLimitConfig): budgets and retries.
+        key(str): name of the budget, calls with the same key share it.
+        state_dir(Optional[str]): directory of the shared state. Defaults to
+            gcop storage path.
+        clock(Callable[[], float]): wall clock, shared by all processes.
+        sleep(Callable[[float], None]): used to wait for the budget.
+    """
+
+    def __init__(
+        self,
+        config: RateLimitConfig,
+        key: str,
+        state_dir: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        state_dir = state_dir or get_default_storage_path("ratelimit")
+        self.config: RateLimitConfig = config
+        self.path: str = os.path.join(state_dir, f"{key}.json")
+        self._lock = _FileLock(os.path.join(state_dir, f"{key}.lock"))
+        self._slots = _AdaptiveSemaphore(config.max_concurrency)
+        self._clock = clock
+        self._sleep = sleep
+
+    def _load(self, now: float) -> Dict[str, float]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state: Dict[str, float] = {k: float(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            state = {}
+        state.setdefault("requests", float(self.config.requests_per_minute))
+        state.setdefault("tokens", float(self.config.tokens_per_minute))
+        state.setdefault("rate_scale", 1.0)
+        state.setdefault("backoff", 0.0)
+        state.setdefault("blocked_until", 0.0)
+        state.setdefault("updated_at", now)
+
+        # Refill both buckets for the time since the last update.
+        elapsed: float = max(0.0, now - state["updated_at"]) / 60
+        for bucket, per_minute in (
+            ("requests", self.config.requests_per_minute),
+            ("tokens", self.config.tokens_per_minute),
+        ):
+            state[bucket] = min(
+                float(per_minute),
+                state[bucket] + elapsed * per_minute * state["rate_scale"],
+            )
+        state["updated_at"] = now
+        return state
+
+    def _take(self, tokens: int) -> float:
+        """Take one request and `tokens` from the buckets, or return the seconds
+        to wait before they are available."""
+        requests_per_minute: int = self.config.requests_per_minute
+        tokens_per_minute: int = self.config.tokens_per_minute
+        # A single call larger than the whole budget waits for a full bucket.
+        tokens = min(tokens, tokens_per_minute)
+
+        with self._lock.hold():
+            now: float = self._clock()
+            state: Dict[str, float] = self._load(now)
+            wait: float = state["blocked_until"] - now
+            if wait <= 0:
+                for bucket, need, per_minute in (
+                    ("requests", 1, requests_per_minute),
+                    ("tokens", tokens, tokens_per_minute),
+                ):
+                    if per_minute and state[bucket] < need:
+                        rate: float = per_minute * state["rate_scale"] / 60
+                        wait = max(wait, (need - state[bucket]) / rate)
+            # Without budgets, only the backoff after a 429 is shared.
+            if wait <= 0 and (requests_per_minute or tokens_per_minute):
+                state["requests"] -= 1 if requests_per_minute else 0
+                state["tokens"] -= tokens if tokens_per_minute else 0
+                write_json_atomic(self.path, state)
+        return max(0.0, wait)
+
+    def _update(self, rate_limited: bool, retry_after: Optional[float]) -> None:
+        with self._lock.hold():
+            now: float = self._clock()
+            state: Dict[str, float] = self._load(now)
+            if rate_limited:
+                state["rate_scale"] = max(_MIN_RATE_SCALE, state["rate_scale"] / 2)
+                state["backoff"] = min(_MAX_BACKOFF, max(1.0, state["backoff"] * 2))
+                wait: float = (
+                    retry_after if retry_after is not None else state["backoff"]
+                )
+                state["blocked_until"] = max(state["blocked_until"], now + wait)
+                # Whatever was left is not available on the provider side.
+                state["requests"] = min(state["requests"], 0.0)
+                state["tokens"] = min(state["tokens"], 0.0)
+            else:
+                if state["rate_scale"] >= 1 and not state["backoff"]:
+                    return
+                state["rate_scale"] = min(1.0, state["rate_scale"] + _RATE_SCALE_STEP)
+                state["backoff"] = 0.0
+            write_json_atomic(self.path, state)
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Wait until the budgets allow a call of about `tokens` tokens."""
+        while True:
+            wait: float = self._take(tokens)
+            if wait <= 0:
+                return
+            self._sleep(min(max(wait, _MIN_SLEEP), _MAX_SLEEP))
+
+    def call(self, fn: Callable[[], T], tokens: int = 0) -> T:
+        """Call `fn` within the budgets, retrying it on a 429.
+
+        Args:
+            fn(Callable[[], T]): the model call.
+            tokens(int): estimated tokens of the call, prompt and answer.
+
+        Returns:
+            T: what `fn` returned.
+
+        Raises:
+            Exception: what `fn` raised, or its 429 once `max_retries` are spent.
+        """
+        attempt: int = 0
+        while True:
+            self._slots.acquire()
+            try:
+                self.acquire(tokens)
+                result: T = fn()
+            except Exception as e:
+                rate_limited: bool = is_rate_limit_error(e)
+                self._slots.release(rate_limited)
+                if not rate_limited or attempt >= self.config.max_retries:
+                    raise
+                attempt += 1
+                retry_after: Optional[float] = get_retry_after(e)
+                self._update(True, retry_after)
+                logger.color_info(
+                    f"[Rate limit] Retrying in "
+                    f"{retry_after if retry_after is not None else 'a few'} seconds "
+                    f"({attempt}/{self.config.max_retries})",
+                    color=Color.YELLOW,
+                )
+                continue
+
+            self._slots.release()
+            self._update(False, None)
+            return result
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(
+    model_config: ModelConfig, config: RateLimitConfig
+) -> Optional[RateLimiter]:
+    """Get the rate limiter of a model, shared by all its clients in the process.
+
+    Args:
+        model_config(ModelConfig): the model, its name and API base identify the
+            budget.
+        config(RateLimitConfig): budgets and retries.
+
+    Returns:
+        Optional[RateLimiter]: the limiter, None if rate limiting is disabled.
+    """
+    if not config.enable:
+        return None
+    key: str = make_cache_key(model_config.model_name, model_config.api_base)
+    with _limiters_lock:
+        limiter: Optional[RateLimiter] = _limiters.get(key)
+        if limiter is None or limiter.config != config:
+            limiter = _limiters[key] = RateLimiter(config, key)
+        return limiter
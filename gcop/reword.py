@@ -0,0 +1,356 @@
+"""Rewrite the commit messages of a whole range of commits, eg: a feature branch
+before it is merged.
+
+The messages are generated concurrently on a bounded thread pool, one commit
+diff per task, and saved to a state file as they complete, so an interrupted
+run resumes where it stopped. They are then applied in one pass: every commit
+of the range is recreated from its raw object with the new message and parents,
+every other header and the bytes of a kept message are copied, and the branch
+is moved to the new tip with a single `git update-ref`. The working tree and the
+index are not touched.
+
+Merge commits keep their message. Signatures of rewritten commits no longer
+match and are dropped, see `signed_commits`.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set
+
+from gcop.cache import make_cache_key
+from gcop.config import GcopConfig
+from gcop.git import GitBackend, GitError, get_git_backend
+from gcop.utils import get_default_storage_path, write_json_atomic
+from gcop.utils.logger import logger
+
+__all__ = [
+    "RewordError",
+    "RewordState",
+    "RewrittenCommit",
+    "apply_messages",
+    "generate_messages",
+    "list_commits",
+    "signed_commits",
+]
+
+# Headers of GPG, SSH and X.509 commit signatures.
+_SIGNATURE_HEADERS: Set[bytes] = {b"gpgsig", b"gpgsig-sha256"}
+
+
+class RewordError(RuntimeError):
+    """The range can not be reworded."""
+
+
+@dataclass
+class RewrittenCommit:
+    """A commit of the range to reword.
+
+    Args:
+        sha(str): commit hash.
+        parents(List[str]): parent commit hashes.
+        tree(str): tree hash.
+        author(Dict[str, str]): `GIT_AUTHOR_*` environment of the commit.
+        committer(Dict[str, str]): `GIT_COMMITTER_*` environment of the commit.
+        message(str): current commit message.
+        signed(bool): whether the commit is signed. Defaults to False.
+    """
+
+    sha: str
+    parents: List[str]
+    tree: str
+    author: Dict[str, str]
+    committer: Dict[str, str]
+    message: str
+    signed: bool = False
+
+    @property
+    def is_merge(self) -> bool:
+        return len(self.parents) > 1
+
+    @property
+    def subject(self) -> str:
+        return self.message.partition("\n")[0]
+
+
+def list_commits(
+    rev_range: str, git: Optional[GitBackend] = None
+) -> List[RewrittenCommit]:
+    """List the commits of a range, parents before children.
+
+    Args:
+        rev_range(str): revision range, eg: `main..HEAD`. It must end at HEAD.
+        git(Optional[GitBackend]): backend of the repository. Defaults to a new
+            one.
+
+    Returns:
+        List[RewrittenCommit]: the commits, the last one is HEAD.
+
+    Raises:
+        RewordError: the range is empty or does not end at HEAD.
+        GitError: git failed, eg: for an unknown revision.
+    """
+    if git is None:
+        with get_git_backend() as git:
+            return list_commits(rev_range, git)
+
+    commits: List[RewrittenCommit] = [
+        RewrittenCommit(
+            sha=entry.sha,
+            parents=entry.parents,
+            tree=entry.tree,
+            author={
+                "GIT_AUTHOR_NAME": entry.author_name,
+                "GIT_AUTHOR_EMAIL": entry.author_email,
+                "GIT_AUTHOR_DATE": entry.author_date,
+            },
+            committer={
+                "GIT_COMMITTER_NAME": entry.committer_name,
+                "GIT_COMMITTER_EMAIL": entry.committer_email,
+                "GIT_COMMITTER_DATE": entry.committer_date,
+            },
+            message=entry.message.rstrip("\n"),
+            signed=_is_signed(git.read_commit_object(entry.sha) or b""),
+        )
+        for entry in git.iter_log(rev_range, topo_order=True)
+    ]
+    commits.reverse()
+
+    if not commits:
+        raise RewordError(f"no commits in {rev_range}")
+    if commits[-1].sha != git.resolve("HEAD"):
+        raise RewordError(f"{rev_range} must end at HEAD, eg: main..HEAD")
+    return commits
+
+
+def _is_signed(data: bytes) -> bool:
+    headers: bytes = data.partition(b"\n\n")[0]
+    return any(
+        line.partition(b" ")[0] in _SIGNATURE_HEADERS for line in headers.split(b"\n")
+    )
+
+
+def _rewrite_commit_object(
+    data: bytes, parents: List[str], message: Optional[str]
+) -> bytes:
+    r"""Replace the parents of a raw commit object and its message, unless it is
+    None. Signatures are dropped, other headers and a kept message are copied
+    byte for byte, even if they are not UTF-8.
+
+    Examples:
+        >>> data = b"tree t\nparent a\nauthor x\ngpgsig -----BEGIN\n sig\n\nold\n"
+        >>> _rewrite_commit_object(data, ["b"], None)
+        b'tree t\nparent b\nauthor x\n\nold\n'
+        >>> _rewrite_commit_object(data, [], "new")
+        b'tree t\nauthor x\n\nnew\n'
+    """
+    headers, _, body = data.partition(b"\n\n")
+    lines: List[bytes] = []
+    dropped: bool = False
+    for line in headers.split(b"\n"):
+        # Lines of a multi-line header, eg: a signature, start with a space.
+        if not line.startswith(b" "):
+            key: bytes = line.partition(b" ")[0]
+            dropped = key in _SIGNATURE_HEADERS or key == b"parent"
+            # A new message is written in UTF-8.
+            dropped = dropped or (message is not None and key == b"encoding")
+        if not dropped:
+            lines.append(line)
+    # The tree always comes first, then the parents.
+    lines[1:1] = [b"parent " + parent.encode("ascii") for parent in parents]
+    if message is not None:
+        body = message.encode("utf-8") + b"\n"
+    return b"\n".join(lines) + b"\n\n" + body
+
+
+class RewordState:
+    """Messages generated so far for a range, persisted after every commit.
+
+    Entries live in `<storage>/reword/<key>.json`, where the key is derived from
+    the commits of the range, so a run on the same range picks up the messages
+    of an interrupted one.
+
+    Args:
+        commits(List[RewrittenCommit]): commits of the range.
+        state_dir(Optional[str]): state directory. Defaults to gcop storage path.
+    """
+
+    def __init__(
+        self, commits: List[RewrittenCommit], state_dir: Optional[str] = None
+    ) -> None:
+        state_dir = state_dir or get_default_storage_path("reword")
+        key: str = make_cache_key(*(commit.sha for commit in commits))
+        self.path: str = os.path.join(state_dir, f"{key}.json")
+        self.messages: Dict[str, str] = self._load()
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, str]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return dict(json.load(f))
+        except (OSError, ValueError, TypeError):
+            return {}
+
+    def set(self, sha: str, message: str) -> None:
+        with self._lock:
+            self.messages[sha] = message
+            write_json_atomic(self.path, self.messages)
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _generate_message(commit: RewrittenCommit, gcop_config: GcopConfig) -> str:
+    from gcop.commit import CommitSession
+    from gcop.diff import filter_diff
+
+    with get_git_backend() as git:
+        diff: str = git.run("show", "--format=", "--no-color", commit.sha)
+    diff = filter_diff(
+        diff, gcop_config.diff_filter, trim=not gcop_config.large_diff.enable
+    ).text
+    # The messages being replaced are not examples to follow.
+    return (
+        CommitSession(diff, gcop_config=gcop_config, history_examples=[])
+        .generate()
+        .content
+    )
+
+
+def generate_messages(
+    commits: List[RewrittenCommit],
+    gcop_config: GcopConfig,
+    state: RewordState,
+    jobs: int = 4,
+    on_progress: Optional[Callable[[RewrittenCommit, Optional[str]], None]] = None,
+) -> Dict[str, str]:
+    """Generate the new message of every commit which is not a merge and has
+    none in `state` yet.
+
+    Args:
+        commits(List[RewrittenCommit]): commits of the range.
+        gcop_config(GcopConfig): config
+        state(RewordState): messages generated so far, updated as messages
+            complete.
+        jobs(int): maximum number of messages generated at once.
+        on_progress(Optional[Callable[[RewrittenCommit, Optional[str]], None]]):
+            called with every finished commit and its message, or None if the
+            generation failed.
+
+    Returns:
+        Dict[str, str]: the new message of every commit it could be generated
+            for, by commit hash.
+    """
+    pending: List[RewrittenCommit] = [
+        commit
+        for commit in commits
+        if not commit.is_merge and commit.sha not in state.messages
+    ]
+    if not pending:
+        return dict(state.messages)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(jobs, len(pending))))
+    futures: Dict[Future, RewrittenCommit] = {
+        pool.submit(_generate_message, commit, gcop_config): commit
+        for commit in pending
+    }
+    try:
+        for future in as_completed(futures):
+            commit: RewrittenCommit = futures[future]
+            message: Optional[str] = None
+            try:
+                message = future.result().strip() or None
+            except Exception as e:
+                logger.error(f"[Reword] {commit.sha[:12]}: {type(e).__name__}: {e}")
+            if message:
+                state.set(commit.sha, message)
+            if on_progress:
+                on_progress(commit, message)
+    finally:
+        # On Ctrl+C, only the messages already being generated are finished.
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=False)
+
+    return dict(state.messages)
+
+
+def signed_commits(
+    commits: List[RewrittenCommit], messages: Dict[str, str]
+) -> List[RewrittenCommit]:
+    """The signed commits `apply_messages` rewrites, whose signature is lost:
+    the ones with a new message and their descendants in the range.
+
+    Args:
+        commits(List[RewrittenCommit]): commits of the range, see `list_commits`.
+        messages(Dict[str, str]): new message by commit hash.
+
+    Returns:
+        List[RewrittenCommit]: the signed commits to rewrite, parents first.
+    """
+    changed: Set[str] = set()
+    for commit in commits:
+        if messages.get(commit.sha, commit.message) != commit.message or any(
+            parent in changed for parent in commit.parents
+        ):
+            changed.add(commit.sha)
+    return [commit for commit in commits if commit.signed and commit.sha in changed]
+
+
+def apply_messages(
+    commits: List[RewrittenCommit],
+    messages: Dict[str, str],
+    git: Optional[GitBackend] = None,
+) -> Optional[str]:
+    """Recreate the commits of the range with the new messages and move the
+    current branch to the new tip. The rewritten commits lose their signature,
+    see `signed_commits`.
+
+    Args:
+        commits(List[RewrittenCommit]): commits of the range, see `list_commits`.
+        messages(Dict[str, str]): new message by commit hash, commits without
+            one keep their message.
+        git(Optional[GitBackend]): backend of the repository. Defaults to a new
+            one.
+
+    Returns:
+        Optional[str]: the new HEAD, None if nothing changed.
+
+    Raises:
+        RewordError: HEAD moved since the commits were listed.
+    """
+    if git is None:
+        with get_git_backend() as git:
+            return apply_messages(commits, messages, git)
+
+    rewritten: Dict[str, str] = {}
+    for commit in commits:
+        message: Optional[str] = messages.get(commit.sha)
+        if message == commit.message:
+            message = None
+        parents: List[str] = [rewritten.get(p, p) for p in commit.parents]
+        if message is None and parents == commit.parents:
+            continue
+
+        data: Optional[bytes] = git.read_commit_object(commit.sha)
+        if data is None:
+            raise RewordError(f"commit {commit.sha[:12]} not found")
+        rewritten[commit.sha] = git.write_commit_object(
+            _rewrite_commit_object(data, parents, message)
+        )
+
+    old_head: str = commits[-1].sha
+    new_head: Optional[str] = rewritten.get(old_head)
+    if new_head is None:
+        return None
+
+    try:
+        git.run("update-ref", "-m", "gcop reword", "HEAD", new_head, old_head)
+    except GitError as e:
+        raise RewordError(f"HEAD moved while rewording: {e}")
+    return new_head
@@ -0,0 +1,309 @@
+"""A local OpenAI compatible server for testing gcop without a provider.
+
+`gcop stub-server` answers `POST /v1/chat/completions`, streamed or not, with
+a made-up answer built from the request: a commit message in the JSON output
+format for requests with a system prompt, a plain text summary otherwise. Point
+a model at it with `api_base`, eg:
+
+    model:
+        model_name: openai/stub
+        api_key: stub
+        api_base: http://127.0.0.1:8765/v1
+
+The time to the first token, the rate at which tokens are produced and the
+share of requests answered with an error are configurable, so the latency and
+concurrency features of gcop can be exercised on an isolated machine.
+`GET /stats` reports the number of requests served so far.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from gcop.diff import count_tokens
+
+__all__ = ["StubServer", "StubServerConfig", "make_answer"]
+
+_CHARS_PER_CHUNK: int = 4
+_DIFF_PATH_RE = re.compile(r"^diff --git a/(\S+) b/", re.MULTILINE)
+
+
+@dataclass
+class StubServerConfig:
+    """Behavior of the stub server.
+
+    Args:
+        latency(float): seconds before the first token of every answer.
+        token_rate(float): tokens produced per second, 0 to produce the whole
+            answer at once.
+        error_rate(float): share of requests answered with `error_status`,
+            between 0 and 1.
+        error_status(int): HTTP status of injected errors, eg: 429 or 500.
+        retry_after(float): `Retry-After` of injected 429s, in seconds.
+        seed(Optional[int]): seed of the error injection, for reproducible runs.
+    """
+
+    latency: float = 0.0
+    token_rate: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 429
+    retry_after: float = 1.0
+    seed: Optional[int] = None
+
+
+def make_answer(messages: List[Dict[str, Any]]) -> str:
+    """Make up the answer to a request, from the paths of the diff it contains.
+
+    Examples:
+        >>> diff = "diff --git a/gcop/cli.py b/gcop/cli.py"
+        >>> make_answer([{"role": "user", "content": diff}])
+        'Changes to gcop/cli.py.'
+        >>> json.loads(make_answer([
+        ...     {"role": "system", "content": "..."},
+        ...     {"role": "user", "content": diff},
+        ... ]))["content"]
+        'chore: update 1 file\\n\\n- Update gcop/cli.py'
+    """
+    text: str = "\n".join(
+        message["content"]
+        if isinstance(message.get("content"), str)
+        else "".join(part.get("text", "") for part in message.get("content") or [])
+        for message in messages
+    )
+    paths: List[str] = list(dict.fromkeys(_DIFF_PATH_RE.findall(text)))
+    if not any(message.get("role") == "system" for message in messages):
+        return f"Changes to {', '.join(paths) or 'no files'}."
+
+    files: str = f"{len(paths)} file{'' if len(paths) == 1 else 's'}"
+    return json.dumps(
+        {
+            "thought": f"The diff changes {files}.",
+            "content": "\n".join(
+                [f"chore: update {files}", ""] + [f"- Update {path}" for path in paths]
+            ),
+        }
+    )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_HTTPServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _send_json(
+        self, status: int, body: dict, headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        raw: bytes = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(
+                200,
+                {"object": "list", "data": [{"id": "stub", "object": "model"}]},
+            )
+        elif self.path.rstrip("/") == "/stats":
+            self._send_json(200, self.server.get_stats())
+        else:
+            self._send_json(404, {"error": {"message": f"no route {self.path}"}})
+
+    def do_POST(self) -> None:
+        length: int = int(self.headers.get("Content-Length") or 0)
+        try:
+            body: dict = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid JSON body"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"no route {self.path}"}})
+            return
+
+        config: StubServerConfig = self.server.config
+        if self.server.inject_error():
+            is_rate_limit: bool = config.error_status == 429
+            self._send_json(
+                config.error_status,
+                {
+                    "error": {
+                        "message": "injected by gcop stub-server",
+                        "type": "rate_limit_error" if is_rate_limit else "server_error",
+                        "code": config.error_status,
+                    }
+                },
+                {"Retry-After": f"{config.retry_after:g}"} if is_rate_limit else None,
+            )
+            return
+
+        messages: List[Dict[str, Any]] = body.get("messages") or []
+        answer: str = make_answer(messages)
+        usage: Dict[str, int] = {
+            "prompt_tokens": sum(count_tokens(json.dumps(m)) for m in messages),
+            "completion_tokens": count_tokens(answer),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id: str = f"chatcmpl-{uuid.uuid4().hex}"
+        model: str = body.get("model") or "stub"
+
+        time.sleep(config.latency)
+        if body.get("stream"):
+            include_usage: bool = bool(
+                (body.get("stream_options") or {}).get("include_usage")
+            )
+            self._stream(completion_id, model, answer, usage if include_usage else None)
+            return
+
+        if config.token_rate:
+            time.sleep(usage["completion_tokens"] / config.token_rate)
+        self._send_json(
+            200,
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": answer},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            },
+        )
+
+    def _stream(
+        self,
+        completion_id: str,
+        model: str,
+        answer: str,
+        usage: Optional[Dict[str, int]],
+    ) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(choices: List[dict], **extra) -> None:
+            chunk: dict = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": choices,
+                **extra,
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        delay: float = (
+            1 / self.server.config.token_rate if self.server.config.token_rate else 0
+        )
+        for start in range(0, len(answer), _CHARS_PER_CHUNK):
+            send(
+                [
+                    {
+                        "index": 0,
+                        "delta": {"content": answer[start : start + _CHARS_PER_CHUNK]},
+                        "finish_reason": None,
+                    }
+                ]
+            )
+            time.sleep(delay)
+        send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if usage:
+            send([], usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config: StubServerConfig) -> None:
+        super().__init__(address, _Handler)
+        self.config: StubServerConfig = config
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {"requests": 0, "errors": 0}
+
+    def inject_error(self) -> bool:
+        with self._lock:
+            self._stats["requests"] += 1
+            failed: bool = self._random.random() < self.config.error_rate
+            self._stats["errors"] += failed
+            return failed
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+
+class StubServer:
+    """The stub server, listening on `host:port` once started.
+
+    Args:
+        config(Optional[StubServerConfig]): behavior of the server. Defaults to
+            answering immediately, without errors.
+        host(str): interface to listen on. Defaults to 127.0.0.1.
+        port(int): port to listen on, 0 for any free port. Defaults to 0.
+
+    Examples:
+        >>> with StubServer() as server:
+        ...     server.api_base.startswith("http://127.0.0.1:")
+        True
+    """
+
+    def __init__(
+        self,
+        config: Optional[StubServerConfig] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self._server = _HTTPServer((host, port), config or StubServerConfig())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def api_base(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def get_stats(self) -> Dict[str, int]:
+        return self._server.get_stats()
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def start(self) -> "StubServer":
+        """Serve on a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
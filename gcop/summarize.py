@@ -0,0 +1,111 @@
+"""Map-reduce summarization of staged diffs that are too large for one prompt.
+
+The diff is split by file into parts of at most `chunk_tokens` tokens. Files of
+the same directory are kept next to each other so related changes end up in
+the same part. The parts are summarized concurrently, and the combined
+summaries replace the diff in the commit message prompt. Wall-clock time is
+roughly that of the slowest part plus the final call.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+from gcop import prompt
+from gcop.cache import make_cache_key
+from gcop.diff import FileDiff, count_tokens, shrink_file_diff, split_diff
+from gcop.utils.logger import Color, logger
+
+__all__ = ["chunk_diff", "summarize_diff"]
+
+# Summaries of diff parts already computed in this process, so that retrying the
+# commit message does not summarize the same parts again.
+_summaries: Dict[str, str] = {}
+_summaries_lock = threading.Lock()
+
+
+def chunk_diff(diff: str, chunk_tokens: int) -> List[Tuple[List[str], str]]:
+    """Split a diff into parts of at most roughly `chunk_tokens` tokens.
+
+    Files larger than a part on their own are shrunk to fit.
+
+    Args:
+        diff(str): git diff
+        chunk_tokens(int): token budget of a part
+
+    Returns:
+        List[Tuple[List[str], str]]: the paths and the diff text of every part.
+    """
+    files: List[FileDiff] = sorted(split_diff(diff), key=lambda f: f.path)
+
+    chunks: List[Tuple[List[str], str]] = []
+    paths: List[str] = []
+    texts: List[str] = []
+    used: int = 0
+
+    for file_diff in files:
+        shrink_file_diff(file_diff, chunk_tokens)
+        text: str = file_diff.render()
+        tokens: int = count_tokens(text)
+
+        if texts and used + tokens > chunk_tokens:
+            chunks.append((paths, "".join(texts)))
+            paths, texts, used = [], [], 0
+
+        paths.append(file_diff.path)
+        texts.append(text)
+        used += tokens
+
+    if texts:
+        chunks.append((paths, "".join(texts)))
+    return chunks
+
+
+def _summarize_chunk(chunk: str, chat: Callable[[str], str], model: str) -> str:
+    key: str = make_cache_key(chunk, model)
+    with _summaries_lock:
+        if key in _summaries:
+            return _summaries[key]
+
+    summary: str = chat(prompt.get_diff_summary_instruction(chunk))
+
+    with _summaries_lock:
+        _summaries[key] = summary
+    return summary
+
+
+def summarize_diff(
+    diff: str,
+    chat: Callable[[str], str],
+    model: str,
+    chunk_tokens: int,
+    max_concurrency: int,
+) -> str:
+    """Summarize a large diff part by part on a bounded thread pool.
+
+    Args:
+        diff(str): git diff
+        chat(Callable[[str], str]): sends a prompt to the model and returns the
+            answer.
+        model(str): model name, part of the key of the in-process summary cache.
+        chunk_tokens(int): token budget of a part
+        max_concurrency(int): maximum number of parts summarized at once
+
+    Returns:
+        str: the combined summaries, to be used in place of the diff.
+    """
+    chunks: List[Tuple[List[str], str]] = chunk_diff(diff, chunk_tokens)
+    workers: int = max(1, min(max_concurrency, len(chunks)))
+    logger.color_info(
+        f"[Large diff] Summarizing {len(chunks)} parts with {workers} workers...",
+        color=Color.YELLOW,
+    )
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        summaries: List[str] = list(
+            pool.map(lambda chunk: _summarize_chunk(chunk[1], chat, model), chunks)
+        )
+
+    return prompt.get_summarized_diff(
+        [(paths, summary) for (paths, _), summary in zip(chunks, summaries)]
+    )
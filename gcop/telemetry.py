@@ -0,0 +1,268 @@
+"""Where the time of a gcop run goes, recorded locally.
+
+Every command run records how long its phases took, eg: startup, the version
+check, `git diff`, building the prompt, the time to the first token, the model
+and the time spent waiting for the user, and the tokens of its model calls.
+When the command exits, the record is appended as one line to
+`<storage>/telemetry/runs.jsonl`, which is rotated when it grows too large.
+Nothing is ever sent anywhere. `gcop stats` reports percentiles per phase and
+model, and `GCOP_DISABLE_TELEMETRY=1` turns the recording off.
+
+With `GCOP_PROFILE=1`, the command runs under cProfile and the profile is
+saved next to the records.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from gcop.utils import get_default_storage_path
+
+__all__ = [
+    "add_usage",
+    "finish_run",
+    "is_profiling",
+    "load_records",
+    "percentile",
+    "profile",
+    "record",
+    "set_model",
+    "span",
+    "start_run",
+    "summarize",
+]
+
+T = TypeVar("T")
+
+_MAX_BYTES: int = 1024 * 1024
+_BACKUPS: int = 2
+_PROFILE_TOP: int = 25
+
+
+class _Run:
+    def __init__(self, command: str) -> None:
+        self.command: str = command
+        self.model: Optional[str] = None
+        self.phases: Dict[str, float] = {}
+        self.tokens: Dict[str, int] = {"prompt": 0, "completion": 0}
+        self.lock = threading.Lock()
+
+
+_run: Optional[_Run] = None
+
+
+def _get_path() -> str:
+    return os.path.join(get_default_storage_path("telemetry"), "runs.jsonl")
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _is_enabled() -> bool:
+    return not _env_flag("GCOP_DISABLE_TELEMETRY")
+
+
+def is_profiling() -> bool:
+    """Whether commands run under cProfile, with `GCOP_PROFILE=1`."""
+    return _env_flag("GCOP_PROFILE")
+
+
+def start_run(command: str) -> None:
+    """Start recording a run of `command`, its startup is the time since gcop
+    was imported."""
+    from gcop import _started_at
+
+    global _run
+    _run = _Run(command)
+    record("startup", time.perf_counter() - _started_at)
+
+
+def record(phase: str, seconds: float) -> None:
+    """Add `seconds` to a phase of the current run, if any. Phases which happen
+    several times per run, eg: model calls on retries, add up."""
+    run: Optional[_Run] = _run
+    if run is None:
+        return
+    with run.lock:
+        run.phases[phase] = run.phases.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def span(phase: str) -> Iterator[None]:
+    """Record the time spent in the block as `phase`."""
+    start: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - start)
+
+
+def set_model(model_name: str) -> None:
+    if _run is not None:
+        _run.model = model_name
+
+
+def add_usage(prompt_tokens: int, completion_tokens: int) -> None:
+    run: Optional[_Run] = _run
+    if run is None:
+        return
+    with run.lock:
+        run.tokens["prompt"] += prompt_tokens
+        run.tokens["completion"] += completion_tokens
+
+
+def _rotate(path: str) -> None:
+    try:
+        if os.path.getsize(path) < _MAX_BYTES:
+            return
+    except OSError:
+        return
+    for index in range(_BACKUPS, 0, -1):
+        source: str = path if index == 1 else f"{path}.{index - 1}"
+        try:
+            os.replace(source, f"{path}.{index}")
+        except OSError:
+            pass
+
+
+def finish_run(status: str = "ok", path: Optional[str] = None) -> Optional[dict]:
+    """Stop recording and append the record of the run to the runs file.
+
+    Args:
+        status(str): how the run ended, eg: ok or error.
+        path(Optional[str]): runs file. Defaults to the one in gcop storage path.
+
+    Returns:
+        Optional[dict]: the record, None if no run was started. Without its
+            `version` when telemetry is disabled.
+    """
+    global _run
+    run, _run = _run, None
+    if run is None:
+        return None
+
+    entry: Dict[str, Any] = {
+        "time": int(time.time()),
+        "command": run.command,
+        "model": run.model,
+        "status": status,
+        "phases": {name: round(s * 1000, 1) for name, s in run.phases.items()},
+        "tokens": run.tokens,
+    }
+    if not _is_enabled():
+        return entry
+    # Resolving the version reads the package metadata, only pay for it when
+    # the record is written.
+    from gcop import version
+
+    entry["version"] = version
+
+    path = path or _get_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _rotate(path)
+        # A single short append, so lines of concurrent runs do not interleave.
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    except OSError:
+        pass
+    return entry
+
+
+def load_records(path: Optional[str] = None) -> List[dict]:
+    """Read the records of the runs file and its rotated backups, oldest first."""
+    path = path or _get_path()
+    records: List[dict] = []
+    for file_path in [f"{path}.{i}" for i in range(_BACKUPS, 0, -1)] + [path]:
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                lines: List[str] = f.readlines()
+        except OSError:
+            continue
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue  # a line cut short by a crash
+    return records
+
+
+def percentile(values: List[float], q: float) -> float:
+    """The `q`th percentile of `values`, by the nearest rank method.
+
+    Examples:
+        >>> values = list(range(1, 101))
+        >>> percentile(values, 50), percentile(values, 95), percentile(values, 99)
+        (50, 95, 99)
+        >>> percentile([3.0], 99)
+        3.0
+    """
+    ordered: List[float] = sorted(values)
+    rank: int = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(
+    records: List[dict], command: Optional[str] = None
+) -> Dict[Tuple[str, str], Dict[str, float]]:
+    """Percentiles of every phase, per model.
+
+    Args:
+        records(List[dict]): run records, see `load_records`.
+        command(Optional[str]): only summarize runs of this command.
+
+    Returns:
+        Dict[Tuple[str, str], Dict[str, float]]: count, p50, p95 and p99 by model
+            and phase. Token counts are reported as the `prompt_tokens` and
+            `completion_tokens` phases.
+    """
+    values: Dict[Tuple[str, str], List[float]] = {}
+    for entry in records:
+        if command and entry.get("command") != command:
+            continue
+        model: str = entry.get("model") or "-"
+        samples: Dict[str, float] = dict(entry.get("phases") or {})
+        tokens: Dict[str, int] = entry.get("tokens") or {}
+        if tokens.get("prompt") or tokens.get("completion"):
+            samples["prompt_tokens"] = tokens.get("prompt", 0)
+            samples["completion_tokens"] = tokens.get("completion", 0)
+        for phase, value in samples.items():
+            values.setdefault((model, phase), []).append(value)
+
+    return {
+        key: {
+            "count": len(samples),
+            "p50": percentile(samples, 50),
+            "p95": percentile(samples, 95),
+            "p99": percentile(samples, 99),
+        }
+        for key, samples in sorted(values.items())
+    }
+
+
+def profile(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run `func` under cProfile, save the profile to the telemetry directory
+    and print the functions with the highest cumulative time."""
+    import cProfile
+    import pstats
+    import sys
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        path: str = os.path.join(
+            get_default_storage_path("telemetry"),
+            f"profile-{getattr(func, '__name__', 'run')}-{int(time.time())}.prof",
+        )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        profiler.dump_stats(path)
+        stats = pstats.Stats(profiler, stream=sys.stderr)
+        stats.sort_stats("cumulative").print_stats(_PROFILE_TOP)
+        print(
+            f"Profile saved to {path}, view it with `python -m pstats`", file=sys.stderr
+        )
@@ -0,0 +1,380 @@
+"""How requests of `gcop.commit.ModelClient` reach the model.
+
+- `LiveTransport` sends them to the provider through pne, or litellm for
+  providers which need cache markers.
+- `RecordingTransport` does the same and saves every answer to a cassette.
+- `ReplayTransport` answers from a cassette only, deterministically and without
+  network access.
+
+Together with the stub server in `gcop.stub_server`, which is an OpenAI
+compatible provider selected through `api_base`, this lets gcop be tested,
+load-tested and benchmarked offline.
+"""
+
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from gcop.cache import make_cache_key
+from gcop.config import ModelConfig, TransportConfig
+from gcop.utils import get_default_storage_path, write_json_atomic
+
+if TYPE_CHECKING:
+    from gcop.commit import ChatMessages
+
+__all__ = [
+    "Cassette",
+    "CassetteError",
+    "Completion",
+    "LiveTransport",
+    "ModelRequest",
+    "RecordingTransport",
+    "ReplayTransport",
+    "Transport",
+    "get_transport",
+]
+
+_MODES: Tuple[str, ...] = ("live", "record", "replay")
+_CASSETTE_VERSION: int = 1
+
+
+class CassetteError(LookupError):
+    """The cassette has no answer for a request."""
+
+
+@dataclass
+class ModelRequest:
+    """A request to the model.
+
+    Args:
+        model_config(ModelConfig): model to send it to.
+        messages(ChatMessages): chat messages in the OpenAI format.
+        temperature(Optional[float]): sampling temperature. Defaults to 0.
+        cache_markers(bool): whether to mark the prompt for caching, see
+            `gcop.commit.ModelClient`.
+    """
+
+    model_config: ModelConfig
+    messages: "ChatMessages"
+    temperature: Optional[float] = None
+    cache_markers: bool = False
+
+
+@dataclass
+class Completion:
+    """The answer to a request, or a chunk of a streamed one.
+
+    Args:
+        text(str): text of the answer or of the chunk.
+        usage(Optional[dict]): token usage as reported by the provider, on the
+            last chunk of a stream if at all.
+    """
+
+    text: str
+    usage: Optional[dict] = None
+
+
+def _get_model_kwargs(
+    model_config: ModelConfig, temperature: Optional[float] = None
+) -> dict:
+    return {
+        "api_key": model_config.api_key,
+        "api_base": model_config.api_base,
+        "temperature": 0.0 if temperature is None else temperature,
+    }
+
+
+def _as_dict(value) -> Optional[dict]:
+    if value is None or isinstance(value, dict):
+        return value
+    return value.model_dump() if hasattr(value, "model_dump") else dict(value)
+
+
+def _add_cache_markers(messages: "ChatMessages") -> List[dict]:
+    """Mark the system prompt, which is the same for every diff, and the end of
+    the conversation, so the next retry reads everything before it from the
+    cache."""
+    marked: List[dict] = []
+    for index, message in enumerate(messages):
+        if message["role"] == "system" or index == len(messages) - 1:
+            message = {
+                **message,
+                "content": [
+                    {
+                        "type": "text",
+                        "text": message["content"],
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ],
+            }
+        marked.append(message)
+    return marked
+
+
+class Transport:
+    """Sends requests to the model.
+
+    `stream` sends the request when it is called and returns an iterator over
+    the answer, so that errors of the request are raised by the call itself.
+    """
+
+    mode: str = ""
+
+    def complete(self, request: ModelRequest) -> Completion:
+        raise NotImplementedError
+
+    def stream(self, request: ModelRequest) -> Iterator[Completion]:
+        raise NotImplementedError
+
+
+class LiveTransport(Transport):
+    """Sends requests to the provider.
+
+    pne pulls in litellm and every provider SDK, which takes seconds to import, so
+    it is only loaded once a request is actually made. pne can not pass
+    `cache_control`, so requests with cache markers go to litellm directly.
+    """
+
+    mode: str = "live"
+
+    def complete(self, request: ModelRequest) -> Completion:
+        model_config: ModelConfig = request.model_config
+        if request.cache_markers:
+            import litellm
+
+            response = litellm.completion(
+                model=model_config.model_name,
+                messages=_add_cache_markers(request.messages),
+                **_get_model_kwargs(model_config, request.temperature),
+            )
+            return Completion(
+                text=response.choices[0].message.content,
+                usage=_as_dict(getattr(response, "usage", None)),
+            )
+
+        import pne
+
+        response = pne.chat(
+            messages=request.messages,
+            model=model_config.model_name,
+            model_config=_get_model_kwargs(model_config, request.temperature),
+            return_raw_response=True,
+        )
+        return Completion(
+            text=response.content, usage=response.additional_kwargs.get("usage")
+        )
+
+    def stream(self, request: ModelRequest) -> Iterator[Completion]:
+        model_config: ModelConfig = request.model_config
+        if not request.cache_markers:
+            import pne
+
+            chunks = pne.chat(
+                messages=request.messages,
+                model=model_config.model_name,
+                model_config=_get_model_kwargs(model_config, request.temperature),
+                stream=True,
+            )
+            return (Completion(text=chunk) for chunk in chunks)
+
+        import litellm
+
+        response = litellm.completion(
+            model=model_config.model_name,
+            messages=_add_cache_markers(request.messages),
+            stream=True,
+            stream_options={"include_usage": True},
+            **_get_model_kwargs(model_config, request.temperature),
+        )
+        return self._read_stream(response)
+
+    @staticmethod
+    def _read_stream(response) -> Iterator[Completion]:
+        for chunk in response:
+            usage: Optional[dict] = _as_dict(getattr(chunk, "usage", None))
+            text: str = ""
+            if chunk.choices and chunk.choices[0].delta.content:
+                text = chunk.choices[0].delta.content
+            if text or usage:
+                yield Completion(text=text, usage=usage)
+
+
+@dataclass
+class _Interaction:
+    key: str
+    request: dict
+    chunks: List[dict] = field(default_factory=list)
+
+
+class Cassette:
+    """Answers of the model saved to a JSON file, by request.
+
+    A request is identified by the model name, the messages, the temperature and
+    whether it was streamed, not by the API key or base. Answers recorded for the
+    same request are replayed in the recorded order, then from the first again.
+
+    Args:
+        path(str): path of the cassette file, created on the first record.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self._lock = threading.Lock()
+        self._interactions: List[_Interaction] = self._load()
+        self._replayed: Dict[str, int] = {}
+
+    def _load(self) -> List[_Interaction]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data: dict = json.load(f)
+        except FileNotFoundError:
+            return []
+        return [_Interaction(**item) for item in data.get("interactions", [])]
+
+    @staticmethod
+    def get_key(request: ModelRequest, stream: bool) -> Tuple[str, dict]:
+        """Get the key of a request, and the request as it is saved."""
+        saved: dict = {
+            "model": request.model_config.model_name,
+            "messages": request.messages,
+            "temperature": request.temperature,
+            "stream": stream,
+        }
+        return make_cache_key(json.dumps(saved, sort_keys=True)), saved
+
+    def record(self, request: ModelRequest, stream: bool, chunks: List[Completion]):
+        key, saved = self.get_key(request, stream)
+        with self._lock:
+            self._interactions.append(
+                _Interaction(key, saved, [asdict(chunk) for chunk in chunks])
+            )
+            write_json_atomic(
+                self.path,
+                {
+                    "version": _CASSETTE_VERSION,
+                    "interactions": [asdict(item) for item in self._interactions],
+                },
+            )
+
+    def play(self, request: ModelRequest, stream: bool) -> List[Completion]:
+        """Get the next recorded answer of a request.
+
+        Raises:
+            CassetteError: no answer was recorded for the request.
+        """
+        key, saved = self.get_key(request, stream)
+        with self._lock:
+            recorded: List[_Interaction] = [
+                item for item in self._interactions if item.key == key
+            ]
+            if not recorded:
+                raise CassetteError(
+                    f"no answer recorded in {self.path} for "
+                    f"{'streamed ' if stream else ''}request to {saved['model']} "
+                    f"with {len(saved['messages'])} messages, record it with "
+                    f"transport mode `record`"
+                )
+            index: int = self._replayed.get(key, 0)
+            self._replayed[key] = index + 1
+        return [Completion(**chunk) for chunk in recorded[index % len(recorded)].chunks]
+
+
+class RecordingTransport(Transport):
+    """Sends requests through `inner` and records the answers to `cassette`.
+
+    Args:
+        inner(Transport): transport which gets the answers.
+        cassette(Cassette): cassette to record to.
+    """
+
+    mode: str = "record"
+
+    def __init__(self, inner: Transport, cassette: Cassette) -> None:
+        self.inner: Transport = inner
+        self.cassette: Cassette = cassette
+
+    def complete(self, request: ModelRequest) -> Completion:
+        completion: Completion = self.inner.complete(request)
+        self.cassette.record(request, False, [completion])
+        return completion
+
+    def stream(self, request: ModelRequest) -> Iterator[Completion]:
+        chunks: Iterator[Completion] = self.inner.stream(request)
+
+        def read() -> Iterator[Completion]:
+            recorded: List[Completion] = []
+            for chunk in chunks:
+                recorded.append(chunk)
+                yield chunk
+            # A stream stopped early is not recorded.
+            self.cassette.record(request, True, recorded)
+
+        return read()
+
+
+class ReplayTransport(Transport):
+    """Answers requests from `cassette`, see `Cassette.play`.
+
+    Args:
+        cassette(Cassette): cassette to replay.
+    """
+
+    mode: str = "replay"
+
+    def __init__(self, cassette: Cassette) -> None:
+        self.cassette: Cassette = cassette
+
+    def complete(self, request: ModelRequest) -> Completion:
+        chunks: List[Completion] = self.cassette.play(request, False)
+        return chunks[0]
+
+    def stream(self, request: ModelRequest) -> Iterator[Completion]:
+        return iter(self.cassette.play(request, True))
+
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def _get_cassette(path: str) -> Cassette:
+    path = os.path.abspath(os.path.expanduser(path))
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+
+def get_transport(config: Optional[TransportConfig] = None) -> Transport:
+    """Get the transport selected by the config and the `GCOP_TRANSPORT` and
+    `GCOP_CASSETTE` environment variables.
+
+    Clients of the same process share a cassette, so the answers of concurrent
+    requests are all recorded to the same file.
+
+    Args:
+        config(Optional[TransportConfig]): transport config. Defaults to
+            `TransportConfig()`, the live transport.
+
+    Returns:
+        Transport: the transport.
+
+    Raises:
+        ValueError: unknown transport mode.
+    """
+    config = config or TransportConfig()
+    mode: str = os.environ.get("GCOP_TRANSPORT") or config.mode
+    if mode not in _MODES:
+        raise ValueError(f"unknown transport mode {mode!r}, expected one of {_MODES}")
+    if mode == "live":
+        return LiveTransport()
+
+    cassette: Cassette = _get_cassette(
+        os.environ.get("GCOP_CASSETTE")
+        or config.cassette
+        or os.path.join(get_default_storage_path("cassettes"), "cassette.json")
+    )
+    if mode == "record":
+        return RecordingTransport(LiveTransport(), cassette)
+    return ReplayTransport(cassette)
@@ -2,45 +2,66 @@ import json
 import os
 import shutil
 import subprocess
+import sys
 import tempfile
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Any, Dict, Optional, Tuple
 
-import questionary
-import requests
-import yaml
-from rich.console import Console
 from zeeland import get_default_storage_path as _get_default_storage_path
 
-from gcop import version
 from gcop.utils.logger import Color, logger
 
 
+def _parse_datetime(value: Any) -> Optional[datetime]:
+    """Parse an ISO formatted datetime, returning None if it is missing or
+    malformed."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        return None
+
+
 @dataclass
 class VersionMetadata:
-    """Version metadata for caching version information."""
+    """Version metadata for caching version information.
+
+    Attributes:
+        last_check: When PyPI was last queried successfully.
+        latest_version: The latest version found on PyPI.
+        last_attempt: When a background refresh was last started. Used to avoid
+            spawning a refresh on every command while offline.
+        last_notified: When the user was last asked to update.
+    """
 
     last_check: Optional[datetime] = None
     latest_version: Optional[str] = None
+    last_attempt: Optional[datetime] = None
+    last_notified: Optional[datetime] = None
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "VersionMetadata":
         """Create VersionMetadata from dictionary."""
-        last_check = None
-        if data.get("last_check"):
-            try:
-                last_check = datetime.fromisoformat(data["last_check"])
-            except (ValueError, TypeError):
-                last_check = None
-
-        return cls(last_check=last_check, latest_version=data.get("latest_version"))
+        return cls(
+            last_check=_parse_datetime(data.get("last_check")),
+            latest_version=data.get("latest_version"),
+            last_attempt=_parse_datetime(data.get("last_attempt")),
+            last_notified=_parse_datetime(data.get("last_notified")),
+        )
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for JSON serialization."""
         return {
             "last_check": self.last_check.isoformat() if self.last_check else None,
             "latest_version": self.latest_version,
+            "last_attempt": (
+                self.last_attempt.isoformat() if self.last_attempt else None
+            ),
+            "last_notified": (
+                self.last_notified.isoformat() if self.last_notified else None
+            ),
         }
 
 
@@ -95,11 +116,37 @@ def read_yaml(file_path: str) -> dict:
                 }
             }
     """
+    import yaml
+
     with open(file_path, "r", encoding="utf-8") as file:
         config = yaml.safe_load(file)
         return config
 
 
+def write_json_atomic(file_path: str, data: Any) -> None:
+    """Write JSON data to a file atomically.
+
+    The data is written to a temporary file in the same directory and then moved
+    over the target, so concurrent readers never observe a partial file.
+
+    Args:
+        file_path(str): target file path
+        data(Any): JSON serializable data
+    """
+    dir_name = os.path.dirname(file_path) or "."
+    os.makedirs(dir_name, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=dir_name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
 def _load_metadata(metadata_path: str) -> VersionMetadata:
     """Load version metadata from file or create new if not exists.
 
@@ -117,58 +164,161 @@ def _load_metadata(metadata_path: str) -> VersionMetadata:
             # If file is corrupted, create new metadata
             pass
 
-    os.makedirs(os.path.dirname(metadata_path), exist_ok=True)
-
     metadata = VersionMetadata()
-
-    with open(metadata_path, "w") as f:
-        json.dump(metadata.to_dict(), f)
+    write_json_atomic(metadata_path, metadata.to_dict())
 
     return metadata
 
 
-def check_version_update() -> None:
-    """Check for new version of gcop using cached data.
-    Only checks PyPI once per day and caches the result.
+def _get_metadata_path() -> str:
+    return os.path.join(get_default_storage_path(), "metadata.json")
+
+
+def _is_version_check_disabled_by_env() -> bool:
+    env_value: str = os.environ.get("GCOP_DISABLE_VERSION_CHECK", "")
+    return env_value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def is_version_check_disabled() -> bool:
+    """Whether the version check is turned off, either through the
+    `GCOP_DISABLE_VERSION_CHECK` environment variable or the
+    `disable_version_check` field of the global config.
+
+    Only that field is read, the config is neither validated nor loaded.
     """
-    metadata_path: str = os.path.join(get_default_storage_path(), "metadata.json")
-    current_time: datetime = datetime.now()
+    if _is_version_check_disabled_by_env():
+        return True
+
+    import yaml
+
+    try:
+        data: Any = read_yaml(os.path.join(get_default_storage_path(), "config.yaml"))
+    except (OSError, UnicodeDecodeError, yaml.YAMLError):
+        # The config may not exist yet, eg: when running `gcop init`.
+        return False
+    return isinstance(data, dict) and data.get("disable_version_check") is True
+
+
+def refresh_version_metadata() -> None:
+    """Query PyPI for the latest gcop version and store it in metadata.json.
+
+    This runs in a detached background process spawned by
+    `check_version_update`, so it is allowed to block on the network.
+    """
+    import requests
+
+    metadata_path: str = _get_metadata_path()
+
+    response = requests.get("https://pypi.org/pypi/gcop/json", timeout=10)
+    latest_version = response.json()["info"]["version"]
 
     metadata: VersionMetadata = _load_metadata(metadata_path)
+    metadata.last_check = datetime.now()
+    metadata.latest_version = latest_version
+    write_json_atomic(metadata_path, metadata.to_dict())
+
+
+def spawn_detached(code: str) -> None:
+    """Run Python code in a detached process which outlives the current command
+    and never blocks it.
+
+    Args:
+        code(str): code passed to `python -c`
+    """
+    kwargs: Dict[str, Any] = {
+        "stdin": subprocess.DEVNULL,
+        "stdout": subprocess.DEVNULL,
+        "stderr": subprocess.DEVNULL,
+        "close_fds": True,
+    }
+    if sys.platform == "win32":
+        kwargs["creationflags"] = (
+            subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        )
+    else:
+        kwargs["start_new_session"] = True
+
+    subprocess.Popen([sys.executable, "-c", code], **kwargs)
+
+
+def _spawn_version_refresh() -> None:
+    """Start `refresh_version_metadata` in a detached process."""
+    spawn_detached(
+        "from gcop.utils import refresh_version_metadata; refresh_version_metadata()"
+    )
 
-    if metadata.last_check and current_time - metadata.last_check <= timedelta(days=1):
+
+def check_version_update() -> None:
+    """Check for new version of gcop using cached data.
+
+    The command never waits for PyPI. When the cached data is older than a day, a
+    detached background process refreshes it and the result is shown on the next
+    run. The check can be turned off with `GCOP_DISABLE_VERSION_CHECK=1` or
+    `disable_version_check: true` in the config file. The config file is only
+    read when there is something to do, not on every command.
+    """
+    if _is_version_check_disabled_by_env():
         return
 
+    metadata_path: str = _get_metadata_path()
+    current_time: datetime = datetime.now()
+
     try:
-        response = requests.get("https://pypi.org/pypi/gcop/json", timeout=1)
-        latest_version = response.json()["info"]["version"]
+        metadata: VersionMetadata = _load_metadata(metadata_path)
 
-        metadata = VersionMetadata(
-            last_check=current_time, latest_version=latest_version
+        is_stale: bool = (
+            not metadata.last_check
+            or current_time - metadata.last_check > timedelta(days=1)
         )
-        with open(metadata_path, "w") as f:
-            json.dump(metadata.to_dict(), f)
-
-        if latest_version != version:
-            should_update = questionary.confirm(
-                f"A new version of gcop is available: {latest_version} "
-                f"(current: {version}). Would you like to update now?"
-            ).ask()
-
-            if should_update:
-                try:
-                    logger.color_info("Updating gcop...", color=Color.YELLOW)
-                    subprocess.run(["pip", "install", "-U", "gcop"], check=True)
-                    logger.color_info("Update successful!", color=Color.GREEN)
-                    subprocess.run(["gcop", "init"], check=True)
-                    logger.color_info(
-                        "GCOP reinitialized successfully!", color=Color.GREEN
-                    )
-                except subprocess.CalledProcessError as e:
-                    logger.color_info(f"Failed to update gcop: {e}", color=Color.RED)
-
+        # Do not spawn a refresh on every command while PyPI is unreachable.
+        recently_attempted: bool = bool(
+            metadata.last_attempt
+            and current_time - metadata.last_attempt <= timedelta(hours=1)
+        )
+        if is_stale and not recently_attempted:
+            metadata.last_attempt = current_time
+            write_json_atomic(metadata_path, metadata.to_dict())
+            # Recorded first, so the config is read at most once an hour here.
+            if is_version_check_disabled():
+                return
+            _spawn_version_refresh()
+
+        if not metadata.latest_version:
+            return
+
+        from gcop import version
+
+        if metadata.latest_version == version:
+            return
+
+        if metadata.last_notified and current_time - metadata.last_notified <= (
+            timedelta(days=1)
+        ):
+            return
+
+        metadata.last_notified = current_time
+        write_json_atomic(metadata_path, metadata.to_dict())
+        if is_version_check_disabled():
+            return
     except Exception:
-        pass
+        return
+
+    import questionary
+
+    should_update = questionary.confirm(
+        f"A new version of gcop is available: {metadata.latest_version} "
+        f"(current: {version}). Would you like to update now?"
+    ).ask()
+
+    if should_update:
+        try:
+            logger.color_info("Updating gcop...", color=Color.YELLOW)
+            subprocess.run(["pip", "install", "-U", "gcop"], check=True)
+            logger.color_info("Update successful!", color=Color.GREEN)
+            subprocess.run(["gcop", "init"], check=True)
+            logger.color_info("GCOP reinitialized successfully!", color=Color.GREEN)
+        except subprocess.CalledProcessError as e:
+            logger.color_info(f"Failed to update gcop: {e}", color=Color.RED)
 
 
 def migrate_config_if_needed() -> None:
@@ -1,14 +1,29 @@
+import atexit
 import datetime
+import gzip
 import logging
+import os
+import queue
+import shutil
 import sys
+import threading
+import time
 import traceback
 from enum import Enum
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 from rich.console import Console
 from zeeland import Singleton, get_default_storage_path
 
+if TYPE_CHECKING:
+    from gcop.config import LogConfig
+
+_QUEUE_SIZE: int = 10000
+# Files written to less than this many seconds ago may still be open.
+_IDLE_SECONDS: int = 3600
+
 
 class Color(Enum):
     DEFAULT = "default"
@@ -17,23 +32,150 @@ class Color(Enum):
     RED = "red"
 
 
+def truncate_message(message: str, max_size: int) -> str:
+    """Keep the head and the tail of a message longer than `max_size`.
+
+    Examples:
+        >>> truncate_message("a" * 10 + "b" * 10, 8)
+        'aaaa\\n... [12 characters truncated] ...\\nbbbb'
+        >>> truncate_message("short", 0)
+        'short'
+    """
+    if not max_size or len(message) <= max_size:
+        return message
+    head: int = max_size // 2
+    tail: int = max_size - head
+    return (
+        f"{message[:head]}\n... [{len(message) - max_size} characters truncated] "
+        f"...\n{message[-tail:]}"
+    )
+
+
+def prune_logs(
+    log_dir: str,
+    max_size: int,
+    max_age_days: int,
+    keep: Optional[str] = None,
+    now: Optional[float] = None,
+) -> None:
+    """Compress idle log files, then remove the ones older than `max_age_days`
+    and the oldest ones until the directory is smaller than `max_size` bytes.
+
+    Args:
+        log_dir(str): the log directory.
+        max_size(int): maximum size of the directory in bytes, 0 for no limit.
+        max_age_days(int): maximum age of a log file in days, 0 for no limit.
+        keep(Optional[str]): name of the file being written, never touched.
+        now(Optional[float]): current time, for tests.
+    """
+    now = time.time() if now is None else now
+    try:
+        names: List[str] = os.listdir(log_dir)
+    except OSError:
+        return
+
+    for name in names:
+        path: str = os.path.join(log_dir, name)
+        try:
+            idle: bool = now - os.path.getmtime(path) > _IDLE_SECONDS
+            if name == keep or name.endswith(".gz") or not idle:
+                continue
+            with open(path, "rb") as source, gzip.open(f"{path}.tmp", "wb") as target:
+                shutil.copyfileobj(source, target)
+            os.replace(f"{path}.tmp", f"{path}.gz")
+            os.utime(f"{path}.gz", (now, os.path.getmtime(path)))
+            os.remove(path)
+        except OSError:
+            continue
+
+    files: List[Tuple[str, os.stat_result]] = []
+    for name in os.listdir(log_dir):
+        if name == keep:
+            continue
+        try:
+            files.append((name, os.stat(os.path.join(log_dir, name))))
+        except OSError:
+            continue
+    files.sort(key=lambda item: item[1].st_mtime, reverse=True)
+
+    total: int = 0
+    for name, stat in files:
+        total += stat.st_size
+        expired: bool = bool(max_age_days) and (
+            now - stat.st_mtime > max_age_days * 86400
+        )
+        if expired or (max_size and total > max_size):
+            try:
+                os.remove(os.path.join(log_dir, name))
+            except OSError:
+                pass
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Queues records for the writer thread, drops them rather than blocking
+    when the writer falls behind, and truncates long messages."""
+
+    def __init__(self, records: "queue.Queue", max_message_size: int) -> None:
+        super().__init__(records)
+        self.max_message_size: int = max_message_size
+        self.dropped: int = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        record.msg = truncate_message(record.msg, self.max_message_size)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Wait for room, so that the records queued before are written.
+        self.queue.put(self._sentinel)
+
+
 class Logger(logging.Logger, metaclass=Singleton):
     """A custom logger class that extends logging.Logger with color output
-    capabilities."""
+    capabilities.
+
+    Records are written to the log file by a background thread, which is only
+    started by the first record, so logging costs the caller a queue put. Long
+    messages, eg: the staged diff, are truncated in the log file, and old log
+    files are compressed and pruned, see `LogConfig`.
+    """
 
     def __init__(self, name: str = "gcop", level: int = logging.DEBUG) -> None:
-        """Initialize the logger with file and console handlers.
+        """Initialize the logger with console output, the file output is set up
+        by the first record.
 
         Args:
             name: Logger name, defaults to "gcop"
             level: Logging level, defaults to DEBUG
         """
         super().__init__(name, level)
-        self._setup_file_handler()
         self.console = Console()
+        self.max_message_size: int = 8192
+        self.max_size: int = 50 * 1024 * 1024
+        self.max_age_days: int = 30
+        self._queue_handler: Optional[_DroppingQueueHandler] = None
+        self._listener: Optional[_Listener] = None
+        self._setup_lock = threading.Lock()
+
+    def configure(self, config: "LogConfig") -> None:
+        """Apply the log section of the gcop config."""
+        self.max_message_size = config.max_message_size
+        self.max_size = config.max_size_mb * 1024 * 1024
+        self.max_age_days = config.max_age_days
+        if self._queue_handler is not None:
+            self._queue_handler.max_message_size = config.max_message_size
 
     def _setup_file_handler(self) -> None:
-        """Set up rotating file handler with formatting."""
+        """Set up rotating file handler with formatting, written to by a
+        background thread."""
         log_dir = Path(get_default_storage_path("gcop", "logs"))
         log_file = log_dir / f"{datetime.datetime.now().strftime('%Y%m%d')}.log"
 
@@ -47,7 +189,38 @@ class Logger(logging.Logger, metaclass=Singleton):
             "%Y-%m-%d %H:%M:%S",
         )
         handler.setFormatter(formatter)
-        self.addHandler(handler)
+
+        records: queue.Queue = queue.Queue(_QUEUE_SIZE)
+        self._listener = _Listener(records, handler, respect_handler_level=True)
+        self._listener.start()
+        atexit.register(self.flush)
+        self._queue_handler = _DroppingQueueHandler(records, self.max_message_size)
+        self.addHandler(self._queue_handler)
+
+        threading.Thread(
+            target=prune_logs,
+            args=(str(log_dir), self.max_size, self.max_age_days, log_file.name),
+            daemon=True,
+        ).start()
+
+    def handle(self, record: logging.LogRecord) -> None:
+        if self._queue_handler is None:
+            with self._setup_lock:
+                if self._queue_handler is None:
+                    self._setup_file_handler()
+        super().handle(record)
+
+    def flush(self) -> None:
+        """Write the queued records and stop the writer thread."""
+        listener, self._listener = self._listener, None
+        if listener is None:
+            return
+        if self._queue_handler is not None:
+            self.removeHandler(self._queue_handler)
+            self._queue_handler = None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
 
     def color_info(
         self, message: str, color: Color = Color.DEFAULT, *args, **kwargs
@@ -61,10 +234,8 @@ class Logger(logging.Logger, metaclass=Singleton):
             **kwargs: Additional kwargs passed to logger
         """
         self.info(message, *args, **kwargs)
-        formatted_msg = (
-            f"[{color.value}]{message}[/]" if color != Color.DEFAULT else message
-        )
-        self.console.print(formatted_msg, style=color.value)
+        # Messages such as diffs may contain brackets, they are not markup.
+        self.console.print(message, style=color.value, markup=False)
 
 
 def handle_exception(exc_type, exc_value, exc_tb) -> None:
@@ -0,0 +1,271 @@
+"""Pre-generation of commit messages while changes are being staged.
+
+`gcop watch` polls the git index of the current repository. Once it has not
+changed for `debounce` seconds, the commit message for the staged diff is
+generated in the background and stored under the hash of the staged tree, as
+returned by `git write-tree`, and the commit HEAD points to. `gcop commit` looks
+them up first and shows the stored message without waiting for the model. When
+the index or HEAD changed in the meantime, eg: after `git reset --soft`, the
+diff is another one and the message is generated live.
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+
+from gcop.cache import CommitMessageCache, make_cache_key
+from gcop.config import GcopConfig
+from gcop.git import GitBackend, GitError, get_git_backend
+from gcop.utils import get_default_storage_path
+from gcop.utils.logger import Color, logger
+
+if TYPE_CHECKING:
+    from gcop.commit import CommitMessage
+
+__all__ = [
+    "Debouncer",
+    "get_staged_tree",
+    "load_pregenerated",
+    "pregenerate",
+    "watch",
+]
+
+_DEFAULT_INTERVAL: float = 1.0  # seconds
+_DEFAULT_DEBOUNCE: float = 2.0  # seconds
+
+
+def get_staged_tree(git: Optional[GitBackend] = None) -> Optional[str]:
+    """Get the hash of the tree the staged changes would commit.
+
+    Args:
+        git(Optional[GitBackend]): backend of the repository. Defaults to a new
+            one.
+
+    Returns:
+        Optional[str]: the tree hash, None if it can not be written, eg: during
+            a merge with conflicts or outside of a git repository.
+    """
+    if git is None:
+        with get_git_backend() as git:
+            return get_staged_tree(git)
+    try:
+        return git.write_tree()
+    except (OSError, GitError):
+        return None
+
+
+def _get_head(git: Optional[GitBackend] = None) -> str:
+    """Get the commit HEAD points to, empty before the first commit."""
+    if git is None:
+        with get_git_backend() as git:
+            return _get_head(git)
+    try:
+        return git.resolve("HEAD") or ""
+    except (OSError, GitError):
+        return ""
+
+
+def _get_store() -> CommitMessageCache:
+    return CommitMessageCache(
+        os.path.join(get_default_storage_path("cache"), "pregenerated")
+    )
+
+
+def _get_store_key(gcop_config: GcopConfig, tree: str, head: str) -> str:
+    from gcop import prompt
+
+    # The staged diff is the difference between HEAD and the staged tree, the
+    # rest of the config decides how it is turned into a prompt.
+    return make_cache_key(
+        tree,
+        head,
+        gcop_config.commit_template or prompt._DEFAULT_COMMIT_TEMPLATE,
+        gcop_config.model_config.model_name,
+        json.dumps(
+            {
+                "diff_filter": asdict(gcop_config.diff_filter),
+                "large_diff": asdict(gcop_config.large_diff),
+                "include_git_history": gcop_config.include_git_history,
+                "git_history": asdict(gcop_config.git_history),
+            },
+            sort_keys=True,
+        ),
+    )
+
+
+def load_pregenerated(
+    gcop_config: GcopConfig,
+    tree: Optional[str] = None,
+    head: Optional[str] = None,
+    git: Optional[GitBackend] = None,
+) -> Optional["CommitMessage"]:
+    """Get the commit message pre-generated for the staged tree and HEAD.
+
+    Args:
+        gcop_config(GcopConfig): config, the settings which change the prompt
+            and the model are part of the key.
+        tree(Optional[str]): staged tree hash. Defaults to `get_staged_tree()`.
+        head(Optional[str]): commit of HEAD. Defaults to the current one.
+        git(Optional[GitBackend]): backend of the repository, to get the tree
+            and HEAD. Defaults to a new one.
+
+    Returns:
+        Optional[CommitMessage]: the message, None if there is none for the tree
+            and HEAD.
+    """
+    from gcop.commit import CommitMessage
+
+    store: CommitMessageCache = _get_store()
+    # Without `gcop watch`, do not run git for nothing on every commit.
+    if store.is_empty():
+        return None
+    tree = tree or get_staged_tree(git)
+    if not tree:
+        return None
+    head = _get_head(git) if head is None else head
+    stored: Optional[dict] = store.get(_get_store_key(gcop_config, tree, head))
+    if not stored:
+        return None
+    try:
+        return CommitMessage(**stored)
+    except ValueError:
+        return None
+
+
+def pregenerate(
+    gcop_config: GcopConfig, git: Optional[GitBackend] = None
+) -> Optional[str]:
+    """Generate and store the commit message for the staged changes.
+
+    Args:
+        gcop_config(GcopConfig): config
+        git(Optional[GitBackend]): backend of the repository. Defaults to a new
+            one.
+
+    Returns:
+        Optional[str]: the staged tree hash the message was stored for, None if
+            nothing is staged, a message is already stored, or the index or HEAD
+            changed during generation.
+    """
+    from gcop.commit import CommitMessage, CommitSession
+    from gcop.diff import FileDiff, filter_diff, render_diff
+
+    if git is None:
+        with get_git_backend() as git:
+            return pregenerate(gcop_config, git)
+
+    tree: Optional[str] = get_staged_tree(git)
+    head: str = _get_head(git)
+    if not tree or load_pregenerated(gcop_config, tree, head):
+        return None
+
+    files: List[FileDiff] = git.staged_diff()
+    diff: str = render_diff(files)
+    if not diff:
+        return None
+    diff = filter_diff(
+        diff,
+        gcop_config.diff_filter,
+        trim=not gcop_config.large_diff.enable,
+        files=files,
+    ).text
+
+    logger.color_info(f"[Watch] Generating commit message for tree {tree[:12]}...")
+    commit_message: CommitMessage = CommitSession(
+        diff, gcop_config=gcop_config
+    ).generate()
+
+    if get_staged_tree(git) != tree or _get_head(git) != head:
+        logger.color_info(
+            "[Watch] Staged changes changed while generating, discarding",
+            color=Color.YELLOW,
+        )
+        return None
+    _get_store().set(
+        _get_store_key(gcop_config, tree, head), commit_message.model_dump()
+    )
+    subject: str = commit_message.content.partition("\n")[0]
+    logger.color_info(f"[Watch] Ready: {subject}", color=Color.GREEN)
+    return tree
+
+
+class Debouncer:
+    """Report a value as settled once it has not changed for `delay` seconds.
+
+    Args:
+        delay(float): seconds the value must stay the same.
+
+    Examples:
+        >>> debouncer = Debouncer(2.0)
+        >>> debouncer.update("a", now=0.0), debouncer.update("a", now=1.0)
+        (False, False)
+        >>> debouncer.update("a", now=2.5), debouncer.update("a", now=3.0)
+        (True, False)
+    """
+
+    def __init__(self, delay: float) -> None:
+        self.delay: float = delay
+        self._value: object = None
+        self._changed_at: Optional[float] = None
+
+    def update(self, value: object, now: float) -> bool:
+        """Feed the current value, returns True once when it has settled."""
+        if value != self._value:
+            self._value = value
+            self._changed_at = now
+            return False
+        if self._changed_at is not None and now - self._changed_at >= self.delay:
+            self._changed_at = None
+            return True
+        return False
+
+
+def _get_index_stamp(index_path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(index_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def watch(
+    gcop_config: GcopConfig,
+    interval: float = _DEFAULT_INTERVAL,
+    debounce: float = _DEFAULT_DEBOUNCE,
+    stop: Optional[threading.Event] = None,
+    on_settled: Optional[Callable[[GcopConfig], Optional[str]]] = None,
+) -> None:
+    """Pre-generate commit messages whenever the staged changes settle, until
+    `stop` is set or the process is interrupted.
+
+    Args:
+        gcop_config(GcopConfig): config
+        interval(float): seconds between two looks at the index.
+        debounce(float): seconds the index must stay unchanged before a message
+            is generated.
+        stop(Optional[threading.Event]): stops watching when set.
+        on_settled(Optional[Callable[[GcopConfig], Optional[str]]]): called when
+            the index settled. Defaults to `pregenerate`.
+    """
+    stop = stop or threading.Event()
+    on_settled = on_settled or pregenerate
+    with get_git_backend() as git:
+        index_path: str = os.path.abspath(
+            git.run("rev-parse", "--git-path", "index").strip()
+        )
+    debouncer = Debouncer(debounce)
+
+    logger.color_info(f"[Watch] Watching {index_path}, press Ctrl+C to stop")
+    # The changes already staged settle right away.
+    debouncer.update(_get_index_stamp(index_path), time.monotonic() - debounce)
+
+    while not stop.is_set():
+        if debouncer.update(_get_index_stamp(index_path), time.monotonic()):
+            try:
+                on_settled(gcop_config)
+            except Exception as e:
+                logger.color_info(f"[Watch] {type(e).__name__}: {e}", color=Color.RED)
+        stop.wait(interval)
@@ -0,0 +1,50 @@
+import os
+import subprocess
+from typing import Dict, Optional
+
+import pytest
+
+
+class GitRepo:
+    """A throwaway git repository for tests that need real git history."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.git("init", "-q", "-b", "main")
+        self.git("config", "user.name", "Tester")
+        self.git("config", "user.email", "tester@example.com")
+        self.git("config", "commit.gpgsign", "false")
+
+    def git(self, *args: str) -> str:
+        return subprocess.run(
+            ["git", *args],
+            cwd=self.path,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+    def write(self, files: Dict[str, str]) -> None:
+        for name, content in files.items():
+            file_path = os.path.join(self.path, name)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(content)
+
+    def commit(
+        self, files: Dict[str, str], message: str, author: Optional[str] = None
+    ) -> str:
+        self.write(files)
+        self.git("add", *files)
+        args = ["commit", "-q", "-m", message]
+        if author:
+            args.append(f"--author={author}")
+        self.git(*args)
+        return self.git("rev-parse", "HEAD").strip()
+
+
+@pytest.fixture
+def git_repo(tmp_path, monkeypatch) -> GitRepo:
+    """An empty git repository, which is also the working directory."""
+    monkeypatch.chdir(tmp_path)
+    return GitRepo(str(tmp_path))
@@ -0,0 +1,47 @@
+import os
+import time
+
+import pytest
+
+from gcop.cache import CommitMessageCache, make_cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CommitMessageCache(cache_dir=str(tmp_path), max_entries=3, max_age=60)
+
+
+def test_make_cache_key_is_stable():
+    assert make_cache_key("diff", "template") == make_cache_key("diff", "template")
+    assert make_cache_key("diff", "template") != make_cache_key("diff", "other")
+
+
+def test_get_missing_returns_none(cache):
+    assert cache.get("missing") is None
+
+
+def test_set_then_get(cache):
+    cache.set("key", {"thought": "t", "content": "feat: x"})
+    assert cache.get("key") == {"thought": "t", "content": "feat: x"}
+
+
+def test_expired_entry_is_dropped(cache, tmp_path):
+    cache.set("key", {"content": "x"})
+    old = time.time() - 120
+    os.utime(tmp_path / "key.json", (old, old))
+
+    assert cache.get("key") is None
+    assert not (tmp_path / "key.json").exists()
+
+
+def test_evicts_least_recently_used(cache, tmp_path):
+    for i in range(3):
+        cache.set(f"k{i}", {"content": str(i)})
+        stamp = time.time() - 30 + i
+        os.utime(tmp_path / f"k{i}.json", (stamp, stamp))
+
+    # touching k0 makes k1 the least recently used entry
+    assert cache.get("k0") is not None
+    cache.set("k3", {"content": "3"})
+
+    assert sorted(p.stem for p in tmp_path.iterdir()) == ["k0", "k2", "k3"]
@@ -0,0 +1,306 @@
+import json
+
+import pytest
+
+from gcop.commit import CommitMessage, CommitMessageStream
+
+
+def _chunks(text: str, size: int):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_stream_decodes_fields_across_chunk_boundaries(size):
+    expected = CommitMessage(
+        thought='a "quoted" thought\twith \\ escapes é',
+        content="feat: add x\n\n- detail one\n- detail two",
+    )
+    text = "```json\n" + json.dumps(expected.model_dump()) + "\n```"
+
+    commit_stream = CommitMessageStream(_chunks(text, size))
+    pieces = {"thought": "", "content": ""}
+    for field, delta in commit_stream:
+        pieces[field] += delta
+
+    assert pieces == expected.model_dump()
+    assert commit_stream.message == expected
+
+
+def test_stream_message_is_partial_when_interrupted():
+    text = '{"thought": "because", "content": "feat: add'
+    commit_stream = CommitMessageStream(_chunks(text, 4))
+
+    for _ in zip(range(100), commit_stream):
+        pass
+
+    assert commit_stream.message == CommitMessage(
+        thought="because", content="feat: add"
+    )
+
+
+@pytest.mark.parametrize(
+    "text", ['{"thought": "t", "content": "feat: add', '{"thought": "t"}', "sorry"]
+)
+def test_stream_without_a_complete_message_is_not_valid(text):
+    completed = []
+    commit_stream = CommitMessageStream([text], on_complete=completed.append)
+
+    list(commit_stream)
+
+    assert commit_stream.completed and not commit_stream.is_valid
+    assert completed == []
+
+
+def test_stream_calls_on_complete_once_consumed():
+    completed = []
+    text = json.dumps({"thought": "t", "content": "c"})
+    commit_stream = CommitMessageStream([text], on_complete=completed.append)
+
+    list(commit_stream)
+
+    assert completed == [CommitMessage(thought="t", content="c")]
+
+
+class _FakeClient:
+    def __init__(self):
+        self.requests = []
+        self.last_usage = None
+
+    def chat(self, messages):
+        raise AssertionError("small diffs are not summarized")
+
+    def generate(self, messages, temperature=None):
+        self.requests.append(messages)
+        return CommitMessage(thought="t", content=f"feat: attempt {len(self.requests)}")
+
+    def stream(self, messages):
+        self.requests.append(messages)
+        return [json.dumps({"thought": "t", "content": "feat: streamed"})]
+
+
+@pytest.fixture
+def gcop_config(tmp_path, monkeypatch):
+    from zeeland import Singleton
+
+    from gcop import commit
+    from gcop.cache import CommitMessageCache
+    from gcop.config import GcopConfig, ModelConfig
+
+    monkeypatch.setattr(
+        commit, "CommitMessageCache", lambda: CommitMessageCache(str(tmp_path))
+    )
+    Singleton._instances.pop(GcopConfig, None)
+    yield GcopConfig(model=ModelConfig(model_name="test/model", api_key="k"))
+    Singleton._instances.pop(GcopConfig, None)
+
+
+def _session(gcop_config, client, **kwargs):
+    from gcop.commit import CommitSession
+
+    return CommitSession(
+        "diff --git a/x b/x", client=client, gcop_config=gcop_config, **kwargs
+    )
+
+
+def test_session_retries_continue_the_conversation(gcop_config):
+    client = _FakeClient()
+    session = _session(gcop_config, client)
+
+    first = session.generate()
+    session.generate()
+    session.generate(feedback="mention the tests")
+
+    base, retry, feedback = client.requests
+    assert [message["role"] for message in base] == ["system", "user"]
+    assert "diff --git a/x b/x" in base[1]["content"]
+    # Every request starts with the previous one, so providers can cache it.
+    assert retry[:3] == [
+        *base,
+        {"role": "assistant", "content": first.model_dump_json()},
+    ]
+    assert retry[3]["role"] == "user"
+    assert feedback[:5] == retry + [feedback[4]]
+    assert "<user_feedback>mention the tests</user_feedback>" in feedback[-1]["content"]
+
+
+def test_session_caches_the_first_answer_only(gcop_config):
+    client = _FakeClient()
+    _session(gcop_config, client).generate()
+
+    session = _session(gcop_config, client)
+    assert session.generate().content == "feat: attempt 1"
+    assert len(client.requests) == 1
+
+    # A retry after a cache hit still continues from the cached answer.
+    assert session.generate().content == "feat: attempt 2"
+    assert (
+        client.requests[1][2]["content"]
+        == CommitMessage(thought="t", content="feat: attempt 1").model_dump_json()
+    )
+
+
+def test_session_cache_depends_on_the_history_examples(gcop_config, monkeypatch):
+    from gcop import examples
+
+    monkeypatch.setattr(
+        examples, "get_history_examples", lambda diff, config: ["fix(x): past"]
+    )
+    client = _FakeClient()
+    _session(gcop_config, client).generate()
+
+    gcop_config.include_git_history = True
+    assert _session(gcop_config, client).generate().content == "feat: attempt 2"
+    assert _session(gcop_config, client).generate().content == "feat: attempt 2"
+    session = _session(gcop_config, client, history_examples=["feat(y): other"])
+    assert session.generate().content == "feat: attempt 3"
+    assert len(client.requests) == 3
+
+
+def test_session_stream(gcop_config):
+    client = _FakeClient()
+    session = _session(gcop_config, client, use_cache=False)
+
+    commit_stream = session.stream()
+    list(commit_stream)
+    session.stream(feedback="shorter")
+
+    assert commit_stream.message.content == "feat: streamed"
+    assert client.requests[1][2]["content"] == commit_stream.message.model_dump_json()
+
+
+def test_system_prompt_does_not_depend_on_the_diff(gcop_config):
+    first = _session(gcop_config, _FakeClient()).base_messages
+    second = _session(gcop_config, _FakeClient(), instruction="be brief")
+    second.diff = "diff --git a/y b/y"
+
+    assert first[0] == second.base_messages[0]
+    assert '"thought"' in first[0]["content"]
+    assert first[1] != second.base_messages[1]
+
+
+def test_history_examples_are_in_the_user_prompt(gcop_config, monkeypatch):
+    from gcop import examples
+
+    monkeypatch.setattr(
+        examples, "get_history_examples", lambda diff, config: ["fix(x): past"]
+    )
+    assert "past" not in str(_session(gcop_config, _FakeClient()).base_messages)
+
+    gcop_config.include_git_history = True
+    system, user = _session(gcop_config, _FakeClient()).base_messages
+    assert "<commit_message>\nfix(x): past\n</commit_message>" in user["content"]
+    assert "past" not in system["content"]
+    # Eg: `gcop reword` does not use the messages it replaces.
+    session = _session(gcop_config, _FakeClient(), history_examples=[])
+    assert "commit_history" not in str(session.base_messages)
+
+
+def test_cache_markers():
+    from gcop.commit import _supports_cache_markers
+    from gcop.transport import _add_cache_markers
+
+    assert _supports_cache_markers("anthropic/claude-3-5-sonnet-20240620")
+    assert not _supports_cache_markers("openai/gpt-4o")
+
+    marked = _add_cache_markers(
+        [
+            {"role": "system", "content": "guidelines"},
+            {"role": "user", "content": "diff"},
+            {"role": "assistant", "content": "answer"},
+            {"role": "user", "content": "retry"},
+        ]
+    )
+    assert [isinstance(message["content"], list) for message in marked] == [
+        True,
+        False,
+        False,
+        True,
+    ]
+    assert marked[0]["content"][0] == {
+        "type": "text",
+        "text": "guidelines",
+        "cache_control": {"type": "ephemeral"},
+    }
+
+
+def test_token_usage_from_response():
+    from gcop.commit import TokenUsage
+
+    assert TokenUsage.from_response(None) is None
+    assert TokenUsage.from_response(
+        {
+            "prompt_tokens": 2000,
+            "completion_tokens": 50,
+            "prompt_tokens_details": {"cached_tokens": 1536},
+        }
+    ) == TokenUsage(prompt_tokens=2000, completion_tokens=50, cached_tokens=1536)
+    assert TokenUsage.from_response(
+        {
+            "prompt_tokens": 2000,
+            "completion_tokens": 50,
+            "cache_read_input_tokens": 1800,
+            "cache_creation_input_tokens": 200,
+        }
+    ) == TokenUsage(2000, 50, cached_tokens=1800, cache_write_tokens=200)
+
+
+class _CandidateClient(_FakeClient):
+    def generate(self, messages, temperature=None):
+        self.requests.append((messages, temperature))
+        if temperature == 1.0:
+            raise ValueError("model unavailable")
+        return CommitMessage(thought="t", content=f"feat: temperature {temperature}")
+
+
+def test_candidates(gcop_config):
+    from gcop.commit import CommitCandidates
+
+    client = _CandidateClient()
+    session = _session(gcop_config, client, use_cache=False)
+    candidates = CommitCandidates(session, count=3)
+
+    assert candidates.first().content == "feat: temperature None"
+    assert candidates.next().content == "feat: temperature 0.4"
+    assert candidates.next().content == "feat: temperature 0.7"
+    # The candidate at temperature 1.0 failed, the one at 0.4 is a repeat.
+    assert candidates.next() is None
+    assert [c.content for c in candidates.ready] == [
+        "feat: temperature None",
+        "feat: temperature 0.4",
+        "feat: temperature 0.7",
+    ]
+
+    # A retry by feedback continues from the chosen candidate.
+    candidates.choose(candidates.ready[1])
+    session.generate(feedback="shorter")
+    messages, _ = client.requests[-1]
+    assert messages[2]["content"] == candidates.ready[1].model_dump_json()
+    candidates.close()
+
+
+def test_closed_candidates_do_not_start(gcop_config):
+    import threading
+    import time
+
+    from gcop.commit import CommitCandidates
+
+    release = threading.Event()
+
+    class BlockingClient(_CandidateClient):
+        def generate(self, messages, temperature=None):
+            release.wait(5)
+            return super().generate(messages, temperature)
+
+    client = BlockingClient()
+    candidates = CommitCandidates(
+        _session(gcop_config, client, use_cache=False), count=2
+    )
+    # One slot, the second candidate waits for the first one.
+    candidates._submit()
+    candidates.close()
+    release.set()
+
+    assert candidates._futures[0].result(5).content == "feat: temperature 0.4"
+    assert candidates._futures[1].cancelled()
+    time.sleep(0.1)
+    assert [temperature for _, temperature in client.requests] == [0.4]
@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+from gcop import config
+from gcop.config import find_overlay, load_config
+
+_GLOBAL = """
+model:
+  model_name: openai/gpt-4o
+  api_key: sk-global
+commit_template: global template
+"""
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        config,
+        "get_default_storage_path",
+        lambda name="": str(tmp_path / "storage" / name),
+    )
+    monkeypatch.setattr(config, "_loaded", {})
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(_GLOBAL)
+    repo = tmp_path / "repo"
+    (repo / ".git").mkdir(parents=True)
+    (repo / "src").mkdir()
+    return str(config_path), repo
+
+
+def _touch(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_overlay_is_merged(paths):
+    config_path, repo = paths
+    assert load_config(str(repo), config_path).commit_template == "global template"
+
+    (repo / ".gcop.yaml").write_text(
+        "model:\n  model_name: openai/gpt-4o-mini\ncommit_template: repo template\n"
+    )
+    gcop_config = load_config(str(repo / "src"), config_path)
+    assert gcop_config.model_config.model_name == "openai/gpt-4o-mini"
+    assert gcop_config.model_config.api_key == "sk-global"
+    assert gcop_config.commit_template == "repo template"
+
+
+def test_snapshot_is_used_until_a_source_changes(paths, monkeypatch):
+    config_path, repo = paths
+    (repo / ".gcop.yaml").write_text("candidates: 2\n")
+    assert load_config(str(repo), config_path).candidates == 2
+
+    def read_yaml(path):
+        raise AssertionError(f"{path} parsed again")
+
+    with monkeypatch.context() as m:
+        # A new process, without the configs kept in memory.
+        m.setattr(config, "_loaded", {})
+        m.setattr(config, "read_yaml", read_yaml)
+        assert load_config(str(repo), config_path).candidates == 2
+
+    (repo / ".gcop.yaml").write_text("candidates: 3\n")
+    _touch(repo / ".gcop.yaml", 10**18)
+    assert load_config(str(repo), config_path).candidates == 3
+
+
+@pytest.mark.parametrize(
+    "overlay",
+    [
+        "model:\n  api_base: https://example.com/v1\n  api_key: sk-repo\n",
+        "transport:\n  mode: record\n  cassette: /tmp/overwritten.json\n",
+        "log:\n  max_age_days: 0\n",
+        "rate_limit:\n  enable: false\n",
+    ],
+)
+def test_overlay_can_only_change_safe_settings(paths, overlay):
+    config_path, repo = paths
+    (repo / ".gcop.yaml").write_text(overlay)
+    with pytest.raises(ValueError, match="can not set"):
+        load_config(str(repo), config_path)
+
+
+def test_each_load_makes_its_own_config(paths, tmp_path):
+    config_path, repo = paths
+    other = tmp_path / "other"
+    (other / ".git").mkdir(parents=True)
+    (other / ".gcop.yaml").write_text("candidates: 3\n")
+
+    first = load_config(str(repo), config_path)
+    second = load_config(str(other), config_path)
+    assert first is not second
+    assert (first.candidates, second.candidates) == (1, 3)
+    with pytest.raises(ValueError):
+        # Validation builds a config too, it does not return an existing one.
+        config.GcopConfig.from_dict({"model": {"model_name": "", "api_key": "k"}})
+
+
+def test_find_overlay_stops_at_the_repository_root(tmp_path):
+    (tmp_path / ".gcop.yaml").write_text("candidates: 2\n")
+    repo = tmp_path / "repo"
+    (repo / ".git").mkdir(parents=True)
+    assert find_overlay(str(repo)) is None
+    assert find_overlay(str(tmp_path)) == str(tmp_path / ".gcop.yaml")
@@ -0,0 +1,120 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from gcop import commit, config, daemon
+from gcop.commit import CommitMessage, TokenUsage
+
+_MESSAGE = {"thought": "a small fix", "content": "fix: handle empty diff"}
+
+
+class FakeModelClient:
+    requests = []
+
+    def __init__(
+        self, model_config, enable_prompt_cache=True, rate_limit=None, transport=None
+    ):
+        self.model_config = model_config
+        self.transport = SimpleNamespace(mode="live")
+        self.last_usage = None
+
+    def chat(self, messages):
+        self.requests.append(("chat", messages))
+        return "summary"
+
+    def generate(self, messages, temperature=None):
+        self.requests.append(("generate", messages))
+        if messages[-1]["content"] == "boom":
+            raise ValueError("model unavailable")
+        self.last_usage = TokenUsage(prompt_tokens=100, cached_tokens=80)
+        return CommitMessage(**_MESSAGE)
+
+    def stream(self, messages):
+        self.requests.append(("stream", messages))
+        text = json.dumps(_MESSAGE)
+        return [text[:20], text[20:]]
+
+
+@pytest.fixture
+def socket_path(tmp_path, monkeypatch):
+    """Run a daemon with a fake model client in a background thread."""
+    FakeModelClient.requests = []
+    monkeypatch.setattr(commit, "ModelClient", FakeModelClient)
+    monkeypatch.setattr(
+        config,
+        "load_config",
+        lambda cwd=None: SimpleNamespace(
+            model_config="model", enable_prompt_cache=True, rate_limit=None
+        ),
+    )
+    monkeypatch.setattr(daemon, "_ACCEPT_TIMEOUT", 0.02)
+
+    path = str(tmp_path / "gcop.sock")
+    thread = threading.Thread(
+        target=daemon.serve, kwargs={"socket_path": path, "warm_up": False}
+    )
+    thread.start()
+    for _ in range(100):
+        if daemon.ping(path):
+            break
+        threading.Event().wait(0.02)
+
+    yield path
+
+    daemon.stop(path)
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def _messages(content):
+    return [{"role": "user", "content": content}]
+
+
+def test_ping(socket_path):
+    pong = daemon.ping(socket_path)
+    assert pong["type"] == "pong"
+    assert pong["version"] == daemon._get_version()
+
+
+def test_connect_uses_daemon_only_when_running(socket_path, tmp_path):
+    assert isinstance(daemon.connect("model", socket_path), daemon.DaemonClient)
+    local = daemon.connect("model", str(tmp_path / "missing.sock"))
+    assert isinstance(local, FakeModelClient)
+
+
+def test_requests(socket_path):
+    client = daemon.connect("model", socket_path)
+
+    assert client.chat(_messages("summarize")) == "summary"
+    assert client.generate(_messages("diff")) == CommitMessage(**_MESSAGE)
+    assert client.last_usage == TokenUsage(prompt_tokens=100, cached_tokens=80)
+    assert "".join(client.stream(_messages("diff"))) == json.dumps(_MESSAGE)
+    assert [kind for kind, _ in FakeModelClient.requests] == [
+        "chat",
+        "generate",
+        "stream",
+    ]
+
+
+def test_errors_are_raised(socket_path):
+    client = daemon.connect("model", socket_path)
+    with pytest.raises(daemon.DaemonError, match="model unavailable"):
+        client.generate(_messages("boom"))
+
+
+def test_falls_back_when_daemon_goes_away(socket_path, tmp_path):
+    fallback = FakeModelClient("model")
+    client = daemon.DaemonClient(fallback, str(tmp_path / "missing.sock"))
+
+    assert client.generate(_messages("diff")) == CommitMessage(**_MESSAGE)
+    assert FakeModelClient.requests == [("generate", _messages("diff"))]
+
+
+def test_refuses_other_versions(socket_path):
+    payload = {"command": "complete", "version": "0.0.0", "kind": "text"}
+    event = next(daemon._request(payload, socket_path))
+
+    assert event["type"] == "error"
+    assert event["fallback"] is True
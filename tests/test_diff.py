@@ -0,0 +1,152 @@
+from gcop.config import DiffFilterConfig
+from gcop.diff import (
+    DiffParser,
+    count_tokens,
+    filter_diff,
+    read_git_diff,
+    render_diff,
+    split_diff,
+)
+
+
+def _file_diff(path: str, added: int, context: int = 0) -> str:
+    lines = [
+        f"diff --git a/{path} b/{path}",
+        "index 1111111..2222222 100644",
+        f"--- a/{path}",
+        f"+++ b/{path}",
+        f"@@ -1,{context} +1,{context + added} @@",
+    ]
+    lines += [f" context line {i}" for i in range(context)]
+    lines += [f"+added line {i} of {path}" for i in range(added)]
+    return "\n".join(lines) + "\n"
+
+
+_BINARY_DIFF = (
+    "diff --git a/logo.png b/logo.png\n"
+    "index 1111111..2222222 100644\n"
+    "Binary files a/logo.png and b/logo.png differ\n"
+)
+
+
+def test_split_diff():
+    diff = _file_diff("a.py", 2) + _BINARY_DIFF + _file_diff("dir/b.py", 3)
+    files = split_diff(diff)
+
+    assert [f.path for f in files] == ["a.py", "logo.png", "dir/b.py"]
+    assert [f.added for f in files] == [2, 0, 3]
+    assert [f.is_binary for f in files] == [False, True, False]
+
+
+def test_small_clean_diff_is_unchanged():
+    diff = _file_diff("a.py", 3)
+    result = filter_diff(diff)
+
+    assert result.text == diff
+    assert result.elided == []
+
+
+def test_noise_files_are_stubbed():
+    diff = (
+        _file_diff("a.py", 1)
+        + _file_diff("poetry.lock", 500)
+        + _file_diff("vendor/lib/x.go", 50)
+        + _file_diff("static/app.min.js", 50)
+        + _BINARY_DIFF
+    )
+    result = filter_diff(diff)
+
+    assert "+added line 0 of a.py" in result.text
+    assert "added line 0 of poetry.lock" not in result.text
+    assert "diff --git a/poetry.lock b/poetry.lock" in result.text
+    assert "[gcop: lockfile, +500 -0, content elided]" in result.text
+    assert result.elided == [
+        "poetry.lock: lockfile",
+        "vendor/lib/x.go: vendored file",
+        "static/app.min.js: minified file",
+        "logo.png: binary file",
+    ]
+
+
+def test_exclude_patterns():
+    diff = _file_diff("a.py", 1) + _file_diff("docs/api/ref.md", 10)
+    result = filter_diff(diff, DiffFilterConfig(exclude=["docs/api/*"]))
+
+    assert result.elided == ["docs/api/ref.md: excluded by config"]
+
+
+def test_disabled_filter_keeps_everything():
+    diff = _file_diff("poetry.lock", 10)
+    assert filter_diff(diff, DiffFilterConfig(enable=False)).text == diff
+
+
+def test_over_budget_diff_is_trimmed():
+    diff = _file_diff("small.py", 5, context=20) + _file_diff("big.py", 2000)
+    config = DiffFilterConfig(max_tokens=1000)
+    result = filter_diff(diff, config)
+
+    assert count_tokens(result.text) <= config.max_tokens * 1.1
+    assert "+added line 4 of small.py" in result.text
+    assert "+added line 0 of big.py" in result.text
+    assert any(note.startswith("big.py: trimmed") for note in result.elided)
+    assert "context line 10" not in result.text
+
+
+def test_parser_reads_chunks_of_bytes():
+    diff = (_file_diff("a.py", 2) + _file_diff("b.py", 1)).encode("utf-8")
+    diff += "diff --git a/c.txt b/c.txt\n@@ -1 +1 @@\n-caf\xe9\n+ok\n".encode("latin-1")
+    parser = DiffParser()
+    files = []
+    # Chunks end anywhere, eg: in the middle of a line.
+    for start in range(0, len(diff), 7):
+        files.extend(parser.feed(diff[start : start + 7]))
+    files.extend(parser.close())
+
+    assert [(f.path, f.added, f.removed) for f in files] == [
+        ("a.py", 2, 0),
+        ("b.py", 1, 0),
+        ("c.txt", 1, 1),
+    ]
+    assert files[2].hunks[0][1] == "-caf\ufffd"
+    hunk = files[0].hunks[0]
+    assert (hunk.old.start, hunk.old.count, hunk.new.start, hunk.new.count) == (
+        1,
+        0,
+        1,
+        2,
+    )
+
+
+def test_read_git_diff(git_repo):
+    git_repo.commit({"old.py": "a\n" * 20, "gone.py": "x\n", "b.py": "1\n"}, "init")
+    git_repo.git("mv", "old.py", "new.py")
+    git_repo.git("rm", "-q", "gone.py")
+    git_repo.write({"b.py": "2\n", "added.py": "y\n"})
+    git_repo.git("add", "b.py", "added.py")
+
+    files = read_git_diff("--staged", "-M")
+    assert [(f.status, f.path, f.old_path) for f in files] == [
+        ("A", "added.py", None),
+        ("M", "b.py", None),
+        ("D", "gone.py", None),
+        ("R", "new.py", "old.py"),
+    ]
+    assert render_diff(files) == git_repo.git("diff", "--staged", "-M")
+
+
+def test_paths_with_spaces_and_special_characters(git_repo):
+    names = ["foo bar.txt", "caf\u00e9 \u6587\u4ef6.py", 'tab\there "q".txt']
+    git_repo.commit({"old name.txt": "a\n" * 20}, "init")
+    git_repo.git("mv", "old name.txt", "new caf\u00e9.txt")
+    git_repo.write({name: "x\n" for name in names})
+    git_repo.git("add", *names)
+
+    files = read_git_diff("--staged", "-M")
+    assert sorted((f.status, f.path, f.old_path) for f in files) == sorted(
+        [("A", name, None) for name in names]
+        + [("R", "new caf\u00e9.txt", "old name.txt")]
+    )
+    # Without the `+++` lines, the path comes from the `diff --git` line.
+    assert [f.path for f in split_diff(render_diff(files).replace("+++", "###"))] == [
+        f.path for f in files
+    ]
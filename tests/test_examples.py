@@ -0,0 +1,106 @@
+import pytest
+
+from gcop.config import GcopConfig, ModelConfig
+from gcop.examples import (
+    CommitIndexCache,
+    IndexedCommit,
+    get_history_examples,
+    load_commit_index,
+    select_examples,
+)
+from gcop.git import SubprocessBackend
+
+
+class _CountingBackend(SubprocessBackend):
+    def __init__(self):
+        super().__init__()
+        self.ranges = []
+
+    def iter_log(self, rev_range="HEAD", max_count=None, with_paths=False):
+        self.ranges.append(rev_range)
+        return super().iter_log(rev_range, max_count, with_paths)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CommitIndexCache(str(tmp_path / "examples"))
+
+
+def test_index_is_updated_incrementally(git_repo, cache):
+    git_repo.commit({"a.py": "1\n"}, "feat: add a")
+    git_repo.git("checkout", "-q", "-b", "topic")
+    git_repo.commit({"b.py": "1\n"}, "feat: add b")
+    git_repo.git("checkout", "-q", "main")
+    git_repo.git("merge", "-q", "--no-ff", "-m", "Merge branch topic", "topic")
+
+    with _CountingBackend() as git:
+        index = load_commit_index(git, max_commits=10, cache=cache)
+        # The merge is left out.
+        assert {c.message: c.paths for c in index.commits} == {
+            "feat: add a": ["a.py"],
+            "feat: add b": ["b.py"],
+        }
+
+        merge = index.head
+        assert load_commit_index(git, max_commits=10, cache=cache) == index
+        head = git_repo.commit({"c/d.py": "1\n"}, "fix: add d\n\nwith a body\n")
+        index = load_commit_index(git, max_commits=2, cache=cache)
+        assert git.ranges == [merge, f"{merge}..{head}"]
+        assert len(index.commits) == 2
+        assert index.commits[0].message == "fix: add d\n\nwith a body"
+        assert index.head == head
+
+
+def test_index_is_rebuilt_when_the_indexed_commit_is_gone(git_repo, cache):
+    git_repo.commit({"a.py": "1\n"}, "feat: add a")
+    with _CountingBackend() as git:
+        index = load_commit_index(git, max_commits=10, cache=cache)
+        index.head = "0" * 40
+        cache.set(git.git_dir(), index)
+
+        index = load_commit_index(git, max_commits=10, cache=cache)
+        assert [c.message for c in index.commits] == ["feat: add a"]
+        assert git.ranges[-1] == index.head
+
+
+def test_empty_repository(git_repo, cache):
+    with SubprocessBackend() as git:
+        assert load_commit_index(git, max_commits=10, cache=cache) is None
+
+
+def test_select_examples():
+    commits = [
+        IndexedCommit("e", "style: reformat", [f"api/{i}.py" for i in range(50)]),
+        IndexedCommit("d", "docs: readme", ["README.md"]),
+        IndexedCommit("c", "fix(api): near", ["api/other.py"]),
+        IndexedCommit(
+            "b", "fix(api): same file\n\n" + "long body " * 100, ["api/x.py"]
+        ),
+        IndexedCommit("a", "feat(api): same file", ["api/x.py", "api/y.py"]),
+    ]
+    examples = select_examples(commits, ["api/x.py"], max_examples=3, max_tokens=100)
+    # The long message does not fit into the budget, the large commit ranks
+    # below the focused ones.
+    assert examples == ["feat(api): same file", "fix(api): near", "style: reformat"]
+    assert select_examples(commits, ["x"], max_examples=2, max_tokens=0) == []
+
+
+@pytest.fixture
+def gcop_config():
+    from zeeland import Singleton
+
+    Singleton._instances.pop(GcopConfig, None)
+    yield GcopConfig(model=ModelConfig(model_name="test/model", api_key="k"))
+    Singleton._instances.pop(GcopConfig, None)
+
+
+def test_get_history_examples(git_repo, cache, gcop_config):
+    git_repo.commit({"gcop/a.py": "1\n"}, "feat(core): add a")
+    git_repo.commit({"docs/b.md": "1\n"}, "docs: add b")
+
+    diff = "diff --git a/gcop/a.py b/gcop/a.py\n--- a/gcop/a.py\n+++ b/gcop/a.py\n"
+    examples = get_history_examples(diff, gcop_config, cache=cache)
+    assert examples == ["feat(core): add a", "docs: add b"]
+
+    gcop_config.git_history.max_examples = 1
+    assert get_history_examples(diff, gcop_config, cache=cache) == examples[:1]
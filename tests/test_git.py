@@ -0,0 +1,181 @@
+import importlib.util
+
+import pytest
+
+from gcop.git import GitError, SubprocessBackend, get_git_backend
+
+BACKENDS = [
+    "subprocess",
+    pytest.param(
+        "pygit2",
+        marks=pytest.mark.skipif(
+            importlib.util.find_spec("pygit2") is None, reason="pygit2 not installed"
+        ),
+    ),
+]
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, git_repo):
+    with get_git_backend(request.param) as backend:
+        yield backend
+
+
+def test_staged_diff(backend, git_repo):
+    git_repo.commit({"a.py": "a = 1\n", "old.py": "x\n" * 10}, "initial")
+    git_repo.write({"a.py": "a = 2\n", "b.py": "b = 1\n"})
+    git_repo.git("add", "a.py", "b.py")
+    git_repo.git("mv", "old.py", "new.py")
+
+    files = {f.path: f for f in backend.staged_diff()}
+    assert {path: f.status for path, f in files.items()} == {
+        "a.py": "M",
+        "b.py": "A",
+        "new.py": "R",
+    }
+    assert (files["a.py"].added, files["a.py"].removed) == (1, 1)
+    assert files["new.py"].old_path == "old.py"
+
+
+def test_staged_diff_before_the_first_commit(backend, git_repo):
+    git_repo.write({"a.py": "a = 1\n"})
+    git_repo.git("add", "a.py")
+    assert [(f.path, f.status) for f in backend.staged_diff()] == [("a.py", "A")]
+
+
+def test_iter_log(backend, git_repo):
+    first = git_repo.commit({"a.py": "1\n"}, "feat: add a")
+    second = git_repo.commit(
+        {"a.py": "2\n", "dir/b.py": "1\n"},
+        "fix: change a\n\nwith a body",
+        author="Other <other@example.com>",
+    )
+
+    entries = list(backend.iter_log(with_paths=True))
+    assert [entry.sha for entry in entries] == [second, first]
+    assert entries[0].parents == [first]
+    assert entries[0].subject == "fix: change a"
+    assert entries[0].message.strip() == "fix: change a\n\nwith a body"
+    assert (entries[0].author_name, entries[0].author_email) == (
+        "Other",
+        "other@example.com",
+    )
+    assert sorted(entries[0].paths) == ["a.py", "dir/b.py"]
+    assert entries[1].paths == ["a.py"]
+
+    assert [e.sha for e in backend.iter_log(f"{first}..HEAD")] == [second]
+    assert [e.paths for e in backend.iter_log(max_count=1)] == [[]]
+    assert [e.sha for e in backend.iter_log(topo_order=True)] == [second, first]
+
+
+def test_log_entry_dates_and_committer(backend, git_repo):
+    git_repo.git("config", "user.name", "Committer")
+    git_repo.commit({"a.py": "1\n"}, "feat: add a", author="A <a@b.c>")
+    git_repo.git(
+        "commit",
+        "-q",
+        "--amend",
+        "--no-edit",
+        "--date=1700000000 -0330",
+    )
+    sha = git_repo.git("rev-parse", "HEAD").strip()
+
+    for entry in (next(backend.iter_log()), backend.read_commit("HEAD")):
+        assert entry.sha == sha
+        assert entry.tree == git_repo.git("rev-parse", "HEAD^{tree}").strip()
+        assert entry.author_date == "1700000000 -0330"
+        assert (
+            entry.author_iso_date
+            == git_repo.git("log", "-1", "--date=iso", "--format=%ad").strip()
+        )
+        assert (entry.committer_name, entry.committer_date) == (
+            "Committer",
+            git_repo.git("log", "-1", "--date=raw", "--format=%cd").strip(),
+        )
+
+
+def test_write_tree_and_ancestors(backend, git_repo):
+    first = git_repo.commit({"a.py": "1\n"}, "first")
+    second = git_repo.commit({"a.py": "2\n"}, "second")
+    git_repo.write({"b.py": "1\n"})
+    git_repo.git("add", "b.py")
+
+    assert backend.write_tree() == git_repo.git("write-tree").strip()
+    assert backend.is_ancestor(first, second)
+    assert backend.is_ancestor(second, second)
+    assert not backend.is_ancestor(second, first)
+    assert not backend.is_ancestor("0" * 40, second)
+
+
+def test_commit_objects(backend, git_repo):
+    sha = git_repo.commit({"a.py": "1\n"}, "first")
+    data = backend.read_commit_object("HEAD")
+
+    assert data.startswith(b"tree ") and data.endswith(b"\n\nfirst\n")
+    assert backend.read_commit_object("0" * 40) is None
+    assert backend.write_commit_object(data) == sha
+    amended = backend.write_commit_object(data.replace(b"first", b"amended"))
+    assert git_repo.git("log", "-1", "--format=%s", amended).strip() == "amended"
+
+
+def test_run(backend, git_repo):
+    git_repo.write({"a.py": "1\n"})
+    assert backend.run("status", "--porcelain") == "?? a.py\n"
+    with pytest.raises(GitError, match="unknown"):
+        backend.run("describe", "--unknown-option")
+
+
+def test_iter_log_of_an_unknown_revision(backend, git_repo):
+    with pytest.raises(GitError):
+        list(backend.iter_log())
+
+
+def test_refs_and_commits(backend, git_repo):
+    sha = git_repo.commit({"a.py": "1\n"}, "feat: add a\n\nbody")
+    git_repo.git("branch", "other")
+
+    assert backend.head_branch() == "main"
+    assert backend.resolve("HEAD") == sha
+    assert backend.resolve("missing") is None
+    assert backend.list_refs("refs/heads/") == {
+        "refs/heads/main": sha,
+        "refs/heads/other": sha,
+    }
+    commit = backend.read_commit("main")
+    assert (commit.sha, commit.subject, commit.author_name) == (
+        sha,
+        "feat: add a",
+        "Tester",
+    )
+    assert backend.read_commit("missing") is None
+
+    git_repo.git("checkout", "-q", "--detach")
+    assert backend.head_branch() is None
+
+
+def test_config(backend, git_repo):
+    assert backend.get_config("gcop.test") is None
+    backend.set_config({"gcop.test": "a b", "alias.x": "!gcop info"}, scope="local")
+    assert backend.get_config("gcop.test") == "a b"
+    assert git_repo.git("config", "alias.x").strip() == "!gcop info"
+    assert backend.git_dir().rstrip("/").endswith(".git")
+
+
+def test_cat_file_is_reused(git_repo):
+    git_repo.commit({"a.py": "1\n"}, "initial")
+    with SubprocessBackend() as backend:
+        backend.resolve("HEAD")
+        process = backend._cat_file._process
+        backend.read_commit("HEAD")
+        assert backend._cat_file._process is process
+    assert process.poll() is not None
+
+
+def test_get_git_backend(monkeypatch, tmp_path):
+    monkeypatch.setenv("GCOP_GIT_BACKEND", "subprocess")
+    assert get_git_backend().name == "subprocess"
+    monkeypatch.delenv("GCOP_GIT_BACKEND")
+    assert get_git_backend(prefer=["subprocess", "pygit2"]).name == "subprocess"
+    with pytest.raises(ValueError, match="unknown git backend"):
+        get_git_backend("svn")
+    assert get_git_backend("subprocess", cwd=str(tmp_path)).git_dir() is None
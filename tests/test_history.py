@@ -0,0 +1,82 @@
+import pytest
+
+from gcop import history
+from gcop.git import GitError
+from gcop.history import HistoryStatsCache, load_history_stats, scan_history
+
+
+def test_scan_history(git_repo):
+    git_repo.commit({"a.py": "1"}, "first", author="Alice <alice@example.com>")
+    git_repo.git("checkout", "-q", "-b", "feature")
+    git_repo.commit({"a.py": "2", "b.py": "1"}, "feature", author="Bob <bob@b.com>")
+    git_repo.git("checkout", "-q", "main")
+    git_repo.commit({"a.py": "3", "c.py": "1"}, "second", author="Bob <bob@b.com>")
+    git_repo.git("merge", "-q", "--no-ff", "--no-edit", "-X", "ours", "feature")
+
+    stats = scan_history()
+
+    assert stats.commits == 4
+    assert dict(stats.emails) == {
+        "alice@example.com": 1,
+        "bob@b.com": 2,
+        "tester@example.com": 1,
+    }
+    # The merge commit is not counted towards the most active contributor.
+    assert dict(stats.authors) == {"Alice": 1, "Bob": 2}
+    assert stats.most_active_author == "Bob"
+    assert stats.most_changed_file == "a.py"
+    assert stats.file_changes["b.py"] == 1
+    assert (
+        stats.first_commit_date
+        == git_repo.git("log", "-1", "--date=iso", "--format=%ad", "main~1~1").strip()
+    )
+    assert (
+        stats.last_commit_date
+        == git_repo.git("log", "-1", "--date=iso", "--format=%ad").strip()
+    )
+
+
+def test_scan_history_of_empty_repository(git_repo):
+    with pytest.raises(GitError):
+        scan_history()
+
+
+@pytest.fixture
+def scans(monkeypatch):
+    """Record the revision ranges walked by `load_history_stats`."""
+    ranges = []
+
+    def recording_scan_history(rev_range="HEAD", **kwargs):
+        ranges.append(rev_range)
+        return scan_history(rev_range, **kwargs)
+
+    monkeypatch.setattr(history, "scan_history", recording_scan_history)
+    return ranges
+
+
+def test_load_history_stats_is_incremental(git_repo, tmp_path, scans):
+    cache = HistoryStatsCache(str(tmp_path / "cache"))
+    first = git_repo.commit({"a.py": "1"}, "first")
+    assert load_history_stats(cache=cache).commits == 1
+
+    second = git_repo.commit({"a.py": "2", "b.py": "1"}, "second")
+    stats = load_history_stats(cache=cache)
+    assert load_history_stats(cache=cache) == stats
+
+    assert scans == [first, f"{first}..{second}"]
+    assert stats == scan_history()
+
+
+def test_load_history_stats_rebuilds_rewritten_history(git_repo, tmp_path, scans):
+    cache = HistoryStatsCache(str(tmp_path / "cache"))
+    git_repo.commit({"a.py": "1"}, "first")
+    git_repo.commit({"a.py": "2"}, "second")
+    load_history_stats(cache=cache)
+
+    git_repo.git("reset", "-q", "--hard", "HEAD~1")
+    rewritten = git_repo.commit({"b.py": "1"}, "rewritten")
+    stats = load_history_stats(cache=cache)
+
+    assert scans[-1] == rewritten
+    assert stats.commits == 2
+    assert dict(stats.file_changes) == {"a.py": 1, "b.py": 1}
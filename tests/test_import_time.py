@@ -0,0 +1,55 @@
+import subprocess
+import sys
+from typing import Dict
+
+import pytest
+
+# Modules that are only needed by `gcop commit` and must never be imported
+# just to start the CLI.
+_LAZY_MODULES = [
+    "pne",
+    "promptulate",
+    "litellm",
+    "pydantic",
+    "questionary",
+    "requests",
+    "yaml",
+]
+
+# Cumulative import time budget for `gcop.__main__`, in microseconds. Keep it
+# generous enough for slow CI runners, it only exists to catch a heavy import
+# sneaking back into the startup path.
+_IMPORT_BUDGET_US = 1_500_000
+
+
+def _import_times(module: str) -> Dict[str, int]:
+    """Import `module` in a fresh interpreter and return the cumulative import
+    time of every loaded module, as reported by `python -X importtime`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    times: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.fixture(scope="module")
+def main_import_times() -> Dict[str, int]:
+    return _import_times("gcop.__main__")
+
+
+@pytest.mark.parametrize("module", _LAZY_MODULES)
+def test_cli_startup_does_not_import(main_import_times, module):
+    assert module not in main_import_times
+
+
+def test_cli_startup_import_budget(main_import_times):
+    assert main_import_times["gcop.__main__"] < _IMPORT_BUDGET_US
@@ -0,0 +1,97 @@
+import subprocess
+import time
+
+from gcop.info import InfoProbe, iter_repo_info
+
+
+def _sleep(seconds: float):
+    def probe(ctx) -> str:
+        time.sleep(seconds)
+        return f"slept {seconds}"
+
+    return probe
+
+
+def _fail(ctx) -> str:
+    raise subprocess.CalledProcessError(128, ["git"], stderr="fatal: boom\n")
+
+
+def _timeout(ctx) -> str:
+    raise subprocess.TimeoutExpired(["git"], ctx.timeout)
+
+
+def test_probes_run_concurrently_and_render_in_completion_order():
+    probes = [
+        InfoProbe("Slow", _sleep(0.3)),
+        InfoProbe("Fast", _sleep(0.0)),
+        InfoProbe("Medium", _sleep(0.1)),
+    ]
+
+    start = time.perf_counter()
+    results = list(iter_repo_info(probes))
+    elapsed = time.perf_counter() - start
+
+    assert [probe.label for probe, _, _ in results] == ["Fast", "Medium", "Slow"]
+    assert elapsed < 0.35
+
+
+def test_failing_probes_do_not_affect_others():
+    probes = [
+        InfoProbe("Broken", _fail),
+        InfoProbe("Stuck", _timeout, timeout=5),
+        InfoProbe("Fine", _sleep(0.0)),
+    ]
+    results = {probe.label: (value, ok) for probe, value, ok in iter_repo_info(probes)}
+
+    assert results["Broken"] == ("unavailable (fatal: boom)", False)
+    assert results["Stuck"] == ("timed out after 5s", False)
+    assert results["Fine"] == ("slept 0.0", True)
+
+
+def test_render():
+    assert InfoProbe("Branch", _fail).render("main") == "Branch: main"
+    assert InfoProbe("Files", _fail, multiline=True).render("a\nb") == "Files:\na\nb"
+
+
+def test_shared_computation_runs_once():
+    calls = []
+
+    def compute(timeout: float) -> str:
+        calls.append(timeout)
+        time.sleep(0.05)
+        return "shared"
+
+    probes = [
+        InfoProbe(f"Probe {i}", lambda ctx: ctx.once("key", compute)) for i in range(4)
+    ]
+    results = [value for _, value, _ in iter_repo_info(probes)]
+
+    assert results == ["shared"] * 4
+    assert len(calls) == 1
+
+
+def test_history_sections_share_one_walk(git_repo, tmp_path, monkeypatch):
+    from gcop import info, linecount
+    from gcop.history import HistoryStatsCache
+    from gcop.linecount import LineCountCache
+
+    git_repo.commit({"a.py": "1"}, "first")
+    walks = []
+    load_history_stats = info.load_history_stats
+
+    def counting_load_history_stats(**kwargs):
+        walks.append(kwargs)
+        return load_history_stats(cache=HistoryStatsCache(str(tmp_path)), **kwargs)
+
+    monkeypatch.setattr(info, "load_history_stats", counting_load_history_stats)
+    monkeypatch.setattr(
+        linecount, "LineCountCache", lambda: LineCountCache(str(tmp_path))
+    )
+
+    results = {probe.label: value for probe, value, _ in iter_repo_info()}
+
+    assert len(walks) == 1
+    assert results["Total Commits"] == "1"
+    assert results["Most Changed File"] == "a.py"
+    assert results["Most Active Contributor"] == "Tester"
+    assert results["Line Count by Language"] == "Python: 1 lines"
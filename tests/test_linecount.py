@@ -0,0 +1,102 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from gcop import linecount
+from gcop.linecount import (
+    LineCountCache,
+    count_file_types,
+    count_lines_by_language,
+    list_tracked_files,
+)
+
+_PYTHON = "# comment\n\nx = 1\ny = 2\n"
+_JS = "/* header\n */\nconst a = 1;\n// done\n"
+
+
+def _code_lines(stats):
+    return {language: s.code for language, s in stats.items()}
+
+
+def test_list_tracked_files(git_repo):
+    git_repo.commit({"a.py": _PYTHON, "b.js": _JS}, "first")
+    git_repo.write({"a.py": _PYTHON + "z = 3\n", "untracked.py": "x = 1\n"})
+
+    files = {file.path: file for file in list_tracked_files()}
+
+    assert sorted(files) == ["a.py", "b.js"]
+    assert files["a.py"].modified
+    assert not files["b.js"].modified
+    assert files["b.js"].sha == git_repo.git("rev-parse", "HEAD:b.js").strip()
+
+
+def test_count_lines_by_language(git_repo, tmp_path):
+    git_repo.commit(
+        {"a.py": _PYTHON, "pkg/b.py": _PYTHON, "b.js": _JS, "LICENSE": "MIT\n"},
+        "first",
+    )
+    git_repo.write({"logo.png": "\0PNG"})
+    git_repo.git("add", "logo.png")
+
+    files = list_tracked_files()
+    stats = count_lines_by_language(files, LineCountCache(str(tmp_path)))
+
+    assert _code_lines(stats) == {"Python": 4, "JavaScript": 1}
+    assert stats["Python"].files == 2
+    assert stats["Python"].comment == 2
+    assert stats["JavaScript"].comment == 3
+    assert count_file_types(files) == {"py": 2, "js": 1, "LICENSE": 1, "png": 1}
+
+
+def test_unchanged_blobs_are_not_read_again(git_repo, tmp_path, monkeypatch):
+    git_repo.commit({"a.py": _PYTHON, "b.py": "x = 1\n"}, "first")
+    cache = LineCountCache(str(tmp_path))
+    first = count_lines_by_language(list_tracked_files(), cache)
+
+    read = []
+    count_file = linecount._count_file
+
+    def recording_count_file(path, language):
+        read.append(path)
+        return count_file(path, language)
+
+    monkeypatch.setattr(linecount, "_count_file", recording_count_file)
+
+    assert count_lines_by_language(list_tracked_files(), cache) == first
+    assert read == []
+
+    git_repo.write({"b.py": "x = 1\ny = 2\n"})
+    stats = count_lines_by_language(list_tracked_files(), cache)
+    assert read == ["b.py"]
+    assert stats["Python"].code == 4
+
+
+def test_parallel_and_memory_mapped_counting(git_repo, tmp_path, monkeypatch):
+    monkeypatch.setattr(linecount, "_PARALLEL_THRESHOLD", 0)
+    monkeypatch.setattr(linecount, "_BATCH_SIZE", 2)
+    monkeypatch.setattr(linecount, "_MMAP_THRESHOLD", 16)
+    git_repo.commit({f"m{i}.py": _PYTHON * (i + 1) for i in range(5)}, "first")
+
+    stats = count_lines_by_language(
+        list_tracked_files(), LineCountCache(str(tmp_path)), max_workers=2
+    )
+
+    assert stats["Python"].files == 5
+    assert stats["Python"].code == 2 * (1 + 2 + 3 + 4 + 5)
+    # The workers are spawned and do not see the patched threshold.
+    assert linecount._count_batch([("m4.py", "Python")]) == [(5, 5, 10)]
+
+
+def test_stop_pool_terminates_running_batches():
+    pool = ProcessPoolExecutor(max_workers=1)
+    futures = [pool.submit(time.sleep, 60), pool.submit(time.sleep, 60)]
+    while not futures[0].running():
+        time.sleep(0.01)
+    processes = list(pool._processes.values())
+
+    start = time.monotonic()
+    linecount._stop_pool(pool, futures)
+    for process in processes:
+        process.join(10)
+        assert not process.is_alive()
+    assert futures[1].cancelled()
+    assert time.monotonic() - start < 10
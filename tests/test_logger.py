@@ -0,0 +1,60 @@
+import gzip
+import logging
+import os
+import queue
+
+from gcop.utils.logger import _DroppingQueueHandler, prune_logs
+
+
+def _record(message: str) -> logging.LogRecord:
+    return logging.LogRecord("gcop", logging.INFO, __file__, 1, message, None, None)
+
+
+def test_queue_handler_truncates_and_drops():
+    records = queue.Queue(2)
+    handler = _DroppingQueueHandler(records, max_message_size=100)
+    for _ in range(3):
+        handler.handle(_record("x" * 1000))
+
+    assert records.qsize() == 2
+    assert handler.dropped == 1
+    message = records.get().msg
+    assert message.startswith("x" * 50) and "900 characters truncated" in message
+
+
+def _write(path, size, mtime):
+    with open(path, "w") as f:
+        f.write("x" * size)
+    os.utime(path, (mtime, mtime))
+
+
+def test_prune_logs(tmp_path):
+    now = 100 * 86400.0
+    _write(tmp_path / "today.log", 10, now)
+    _write(tmp_path / "recent.log", 10, now - 60)
+    _write(tmp_path / "yesterday.log", 5000, now - 86400)
+    _write(tmp_path / "last_week.log", 5000, now - 7 * 86400)
+    _write(tmp_path / "last_year.log", 10, now - 365 * 86400)
+
+    prune_logs(str(tmp_path), max_size=0, max_age_days=30, keep="today.log", now=now)
+    # Idle files are compressed and keep their age, expired ones are removed.
+    assert sorted(os.listdir(tmp_path)) == [
+        "last_week.log.gz",
+        "recent.log",
+        "today.log",
+        "yesterday.log.gz",
+    ]
+    with gzip.open(tmp_path / "yesterday.log.gz", "rt") as f:
+        assert f.read() == "x" * 5000
+    assert os.path.getmtime(tmp_path / "yesterday.log.gz") == now - 86400
+
+    # The oldest files go first once the directory is too large.
+    size = os.path.getsize(tmp_path / "yesterday.log.gz")
+    prune_logs(
+        str(tmp_path), max_size=size + 10, max_age_days=0, keep="today.log", now=now
+    )
+    assert sorted(os.listdir(tmp_path)) == [
+        "recent.log",
+        "today.log",
+        "yesterday.log.gz",
+    ]
@@ -0,0 +1,159 @@
+import pytest
+
+from gcop import __main__, commit, daemon, git, telemetry, watch
+from gcop.__main__ import commit_command, init_command
+from gcop.commit import CommitMessage
+from gcop.config import GcopConfig, ModelConfig
+
+
+class _FakeClient:
+    def __init__(self):
+        self.requests = []
+        self.last_usage = None
+
+    def generate(self, messages, temperature=None):
+        self.requests.append(messages)
+        return CommitMessage(thought="t", content=f"feat: attempt {len(self.requests)}")
+
+    def chat(self, messages):
+        return ""
+
+
+class _Answers:
+    """Answers questionary prompts in order, None stands for Ctrl+C."""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.questions = []
+
+    def __call__(self, question, choices=None, **kwargs):
+        self.questions.append(question)
+        answer = self.answers.pop(0)
+        return type("Question", (), {"ask": lambda _: answer})()
+
+
+@pytest.fixture
+def client(git_repo, tmp_path, monkeypatch):
+    from zeeland import Singleton
+
+    from gcop import config
+    from gcop.cache import CommitMessageCache
+
+    git_repo.commit({"a.py": "1\n"}, "first")
+    git_repo.write({"a.py": "2\n"})
+    git_repo.git("add", "a.py")
+
+    Singleton._instances.pop(GcopConfig, None)
+    gcop_config = GcopConfig(model=ModelConfig(model_name="test/model", api_key="k"))
+    monkeypatch.setattr(config, "get_config", lambda: gcop_config)
+    monkeypatch.setattr(
+        commit, "CommitMessageCache", lambda: CommitMessageCache(str(tmp_path / "c"))
+    )
+    monkeypatch.setattr(
+        watch, "_get_store", lambda: CommitMessageCache(str(tmp_path / "store"))
+    )
+    fake = _FakeClient()
+    fake.gcop_config = gcop_config
+    monkeypatch.setattr(daemon, "connect", lambda *args, **kwargs: fake)
+    yield fake
+    Singleton._instances.pop(GcopConfig, None)
+
+
+def _run(monkeypatch, answers, **kwargs):
+    import questionary
+
+    answered = _Answers(answers)
+    monkeypatch.setattr(questionary, "select", answered)
+    options = dict(
+        instruction=None,
+        previous_commit_message=None,
+        no_cache=True,
+        stream=False,
+        candidates=None,
+    )
+    options.update(kwargs)
+    commit_command.__wrapped__(**options)
+    return answered
+
+
+def test_pregenerated_message_starts_no_candidates(client, monkeypatch):
+    watch._get_store().set(
+        watch._get_store_key(
+            client.gcop_config, watch.get_staged_tree(), watch._get_head()
+        ),
+        CommitMessage(thought="t", content="feat: ready").model_dump(),
+    )
+
+    def candidates(*args, **kwargs):
+        raise AssertionError("candidates generated for a pre-generated message")
+
+    monkeypatch.setattr(commit, "CommitCandidates", candidates)
+    _run(monkeypatch, ["exit"], no_cache=False, candidates=3)
+    assert client.requests == []
+
+
+def test_cancelled_candidate_choice_returns_to_the_menu(client, monkeypatch):
+    answered = _run(monkeypatch, ["choose candidate", None, "exit"], candidates=2)
+    assert answered.questions[-1] == answered.questions[0]
+    assert answered.answers == []
+
+
+def _record_commits(monkeypatch):
+    import subprocess
+
+    commits = []
+    run = subprocess.run
+
+    def record(args, **kwargs):
+        if args[:2] != ["git", "commit"]:
+            return run(args, **kwargs)
+        commits.append(args)
+
+    monkeypatch.setattr(subprocess, "run", record)
+    return commits
+
+
+def test_broken_stream_falls_back_to_generate(client, monkeypatch):
+    def stream(messages):
+        client.requests.append(messages)
+        return ['{"thought": "t", "content": "feat: par']
+
+    client.stream = stream
+    commits = _record_commits(monkeypatch)
+
+    _run(monkeypatch, ["yes"], stream=True)
+    # The broken answer is asked again, not improved on.
+    assert client.requests[1] == client.requests[0]
+    assert commits == [["git", "commit", "-m", "feat: attempt 2"]]
+
+
+def test_empty_message_is_not_committed(client, monkeypatch):
+    client.generate = lambda messages, temperature=None: CommitMessage(
+        thought="t", content=" "
+    )
+    commits = _record_commits(monkeypatch)
+
+    answered = _run(monkeypatch, ["yes", "exit"])
+    assert commits == []
+    assert answered.answers == []
+
+
+def test_init_records_a_single_init_run(tmp_path, monkeypatch):
+    conf_file = tmp_path / "config.yaml"
+    conf_file.write_text("model:\n  model_name: test/model\n")
+    monkeypatch.setattr(GcopConfig, "_config_path", str(conf_file))
+    monkeypatch.setattr(__main__, "migrate_config_if_needed", lambda: None)
+    monkeypatch.setattr(__main__, "check_version_update", lambda: None)
+    monkeypatch.setattr(
+        git,
+        "get_git_backend",
+        lambda: type("Backend", (), {"set_config": lambda *args, **kwargs: None})(),
+    )
+    runs = []
+    monkeypatch.setattr(telemetry, "_run", None)
+    monkeypatch.setattr(
+        telemetry, "finish_run", lambda status: runs.append(telemetry._run.command)
+    )
+
+    init_command()
+    assert runs == ["init"]
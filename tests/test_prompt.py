@@ -1,6 +1,10 @@
 import pytest
 
-from gcop.prompt import get_commit_instrcution
+from gcop.prompt import (
+    get_commit_instrcution,
+    get_commit_system_prompt,
+    get_commit_user_prompt,
+)
 
 
 def test_get_commit_instruction_basic():
@@ -64,3 +68,16 @@ def test_get_commit_instruction_all_params():
     assert "template" in result
     assert "previous message" in result
     assert "make it better" in result
+
+
+def test_commit_prompt_is_split_into_system_and_user_parts():
+    """Test the diff only goes into the user part of the prompt."""
+    system = get_commit_system_prompt(output_schema='{"type": "object"}')
+    user = get_commit_user_prompt("test diff", instruction="be brief")
+
+    assert "test diff" not in system
+    assert '{"type": "object"}' in system
+    assert "test diff" in user and "be brief" in user
+    assert get_commit_instrcution("test diff", instruction="be brief") == (
+        get_commit_system_prompt() + user
+    )
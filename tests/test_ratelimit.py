@@ -0,0 +1,182 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from gcop.config import RateLimitConfig
+from gcop.ratelimit import RateLimiter, is_rate_limit_error
+
+
+class FakeClock:
+    """Clock which only moves when slept on."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TooManyRequests(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        headers = {} if retry_after is None else {"Retry-After": str(retry_after)}
+        self.response = SimpleNamespace(headers=headers)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def make_limiter(tmp_path, clock):
+    def make(**config):
+        return RateLimiter(
+            RateLimitConfig(**config),
+            "model",
+            state_dir=str(tmp_path),
+            clock=clock,
+            sleep=clock.sleep,
+        )
+
+    return make
+
+
+def test_requests_per_minute(make_limiter, clock):
+    limiter = make_limiter(requests_per_minute=2)
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.slept == []
+
+    # The third request waits for one request to refill, 30 seconds at 2/min.
+    limiter.acquire()
+    assert sum(clock.slept) == pytest.approx(30)
+
+
+def test_tokens_per_minute(make_limiter, clock):
+    limiter = make_limiter(tokens_per_minute=600)
+    limiter.acquire(500)
+    limiter.acquire(200)
+    assert sum(clock.slept) == pytest.approx(10)
+
+    # A call over the whole budget waits for a full bucket instead of forever.
+    limiter.acquire(10_000)
+    assert sum(clock.slept) == pytest.approx(70)
+
+
+def test_budget_is_shared_between_processes(make_limiter, clock):
+    first = make_limiter(requests_per_minute=1)
+    second = make_limiter(requests_per_minute=1)
+    first.acquire()
+    second.acquire()
+    assert sum(clock.slept) == pytest.approx(60)
+
+
+def test_budget_is_shared_between_threads(make_limiter):
+    limiter = make_limiter(requests_per_minute=100)
+
+    # The clock does not move, so exactly the budget is taken, without errors.
+    def take():
+        return sum(limiter._take(0) <= 0 for _ in range(50))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        taken = list(pool.map(lambda _: take(), range(8)))
+    assert sum(taken) == 100
+
+
+def test_retry_after(make_limiter, clock):
+    limiter = make_limiter()
+    errors = [TooManyRequests(retry_after=7)]
+
+    def call():
+        if errors:
+            raise errors.pop()
+        return "ok"
+
+    assert limiter.call(call) == "ok"
+    assert sum(clock.slept) == pytest.approx(7)
+
+
+def test_backoff_is_shared_and_recovers(make_limiter, clock):
+    first = make_limiter(requests_per_minute=60)
+    second = make_limiter(requests_per_minute=60)
+    errors = [TooManyRequests()]
+
+    def call():
+        if errors:
+            raise errors.pop()
+        return "ok"
+
+    # Without Retry-After, the process which got the 429 and every other one
+    # wait for the backoff, and the refill rate is halved.
+    first._update(True, None)
+    with open(first.path) as f:
+        state = json.load(f)
+    assert state["rate_scale"] == 0.5
+    second.acquire()
+    assert sum(clock.slept) >= state["backoff"]
+
+    assert first.call(call) == "ok"
+    with open(first.path) as f:
+        state = json.load(f)
+    assert state["rate_scale"] == pytest.approx(0.35)
+
+    for _ in range(10):
+        first.call(lambda: None)
+    with open(first.path) as f:
+        state = json.load(f)
+    assert state["rate_scale"] == 1.0
+    assert state["backoff"] == 0
+
+
+def test_gives_up_after_max_retries(make_limiter, clock):
+    limiter = make_limiter(max_retries=2)
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise TooManyRequests(retry_after=1)
+
+    with pytest.raises(TooManyRequests):
+        limiter.call(call)
+    assert len(calls) == 3
+
+
+def test_other_errors_are_not_retried(make_limiter):
+    limiter = make_limiter()
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        limiter.call(call)
+    assert calls == [1]
+    assert not is_rate_limit_error(ValueError())
+
+
+def test_concurrency_shrinks_on_rate_limit(make_limiter):
+    limiter = make_limiter(max_concurrency=8)
+    limiter._slots.acquire()
+    limiter._slots.release(rate_limited=True)
+    assert limiter._slots.limit == 4
+
+    for _ in range(4):
+        limiter._slots.acquire()
+        limiter._slots.release()
+    assert 4 < limiter._slots.limit < 5
+
+    for _ in range(100):
+        limiter._slots.acquire()
+        limiter._slots.release()
+    assert limiter._slots.limit == 8
@@ -0,0 +1,164 @@
+from types import SimpleNamespace
+
+import pytest
+
+from gcop import reword
+from gcop.config import GcopConfig, ModelConfig
+from gcop.reword import (
+    RewordError,
+    RewordState,
+    apply_messages,
+    generate_messages,
+    list_commits,
+)
+
+
+@pytest.fixture
+def gcop_config():
+    from zeeland import Singleton
+
+    Singleton._instances.pop(GcopConfig, None)
+    yield GcopConfig(model=ModelConfig(model_name="test/model", api_key="k"))
+    Singleton._instances.pop(GcopConfig, None)
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    """Replace the model call with a message naming the changed file."""
+    shas = []
+
+    def fake_generate_message(commit, gcop_config):
+        shas.append(commit.sha)
+        if commit.subject == "broken":
+            raise ValueError("model unavailable")
+        return f"feat: reword {commit.subject}\n\n- details"
+
+    monkeypatch.setattr(reword, "_generate_message", fake_generate_message)
+    return shas
+
+
+@pytest.fixture
+def branch(git_repo):
+    git_repo.commit({"a.py": "1"}, "base")
+    git_repo.git("checkout", "-q", "-b", "feature")
+    for name in ("one", "two", "three"):
+        git_repo.commit({f"{name}.py": name}, name, author="Alice <a@example.com>")
+    return git_repo
+
+
+def test_reword_range(branch, gcop_config, generated, tmp_path_factory):
+    commits = list_commits("main..HEAD")
+    assert [commit.subject for commit in commits] == ["one", "two", "three"]
+
+    state = RewordState(commits, state_dir=str(tmp_path_factory.mktemp("state")))
+    messages = generate_messages(commits, gcop_config, state, jobs=2)
+    new_head = apply_messages(commits, messages)
+
+    assert new_head == branch.git("rev-parse", "HEAD").strip()
+    log = branch.git("log", "--format=%s|%an|%T", "main..HEAD").splitlines()
+    assert [line.split("|")[:2] for line in log] == [
+        ["feat: reword three", "Alice"],
+        ["feat: reword two", "Alice"],
+        ["feat: reword one", "Alice"],
+    ]
+    # The trees, and so the working tree, are unchanged.
+    assert [line.split("|")[2] for line in log] == [c.tree for c in commits[::-1]]
+    assert branch.git("status", "--porcelain") == ""
+
+
+def test_reword_resumes_and_keeps_failed_messages(
+    branch, gcop_config, generated, tmp_path
+):
+    branch.commit({"four.py": "4"}, "broken")
+    commits = list_commits("main..HEAD")
+    state_dir = str(tmp_path / "state")
+
+    RewordState(commits, state_dir=state_dir).set(commits[0].sha, "fix: done")
+    messages = generate_messages(
+        commits, gcop_config, RewordState(commits, state_dir=state_dir)
+    )
+
+    assert commits[0].sha not in generated
+    assert messages[commits[0].sha] == "fix: done"
+    assert commits[-1].sha not in messages
+
+    apply_messages(commits, messages)
+    assert branch.git("log", "-1", "--format=%s").strip() == "broken"
+
+
+def test_range_must_end_at_head(branch):
+    with pytest.raises(RewordError):
+        list_commits("main..feature~1")
+    with pytest.raises(RewordError):
+        list_commits("HEAD..HEAD")
+
+
+def test_non_utf8_diff(git_repo, gcop_config, monkeypatch):
+    from gcop import commit
+
+    git_repo.commit({"a.py": "1"}, "base")
+    with open(git_repo.path + "/latin1.txt", "wb") as f:
+        f.write(b"caf\xe9\n")
+    git_repo.git("add", "latin1.txt")
+    git_repo.git("commit", "-q", "-m", "add latin1")
+
+    diffs = []
+
+    class Session:
+        def __init__(self, diff, **kwargs):
+            diffs.append(diff)
+
+        def generate(self):
+            return SimpleNamespace(content="feat: add latin1")
+
+    monkeypatch.setattr(commit, "CommitSession", Session)
+    reword._generate_message(list_commits("HEAD~1..HEAD")[0], gcop_config)
+    assert "+caf\ufffd" in diffs[0]
+
+
+def test_kept_commits_are_copied_byte_for_byte(branch, monkeypatch):
+    import subprocess
+
+    def git_bytes(*args, input=None):
+        return subprocess.run(
+            ["git", *args],
+            cwd=branch.path,
+            input=input,
+            check=True,
+            capture_output=True,
+        ).stdout
+
+    # A signed commit whose message is Latin-1, on top of the branch.
+    head = branch.git("rev-parse", "HEAD").strip()
+    tree = branch.git("rev-parse", "HEAD^{tree}").strip()
+    identity = b"Alice <a@example.com> 1700000000 +0100"
+    signed = b"\n".join(
+        [
+            b"tree " + tree.encode(),
+            b"parent " + head.encode(),
+            b"author " + identity,
+            b"committer " + identity,
+            b"encoding ISO-8859-1",
+            b"gpgsig -----BEGIN PGP SIGNATURE-----",
+            b" sig",
+            b" -----END PGP SIGNATURE-----",
+            b"",
+            b"caf\xe9\n",
+        ]
+    )
+    sha = git_bytes("hash-object", "-t", "commit", "-w", "--stdin", input=signed)
+    branch.git("update-ref", "HEAD", sha.decode().strip())
+
+    commits = list_commits("main..HEAD")
+    assert [commit.signed for commit in commits] == [False] * 3 + [True]
+    messages = {commits[0].sha: "feat: reword one"}
+    assert reword.signed_commits(commits, messages) == commits[-1:]
+    assert reword.signed_commits(commits, {}) == []
+
+    apply_messages(commits, messages)
+    rewritten = git_bytes("cat-file", "commit", "HEAD")
+    assert b"gpgsig" not in rewritten
+    assert rewritten.endswith(b"\nencoding ISO-8859-1\n\ncaf\xe9\n")
+    assert branch.git("log", "--format=%s", "main..HEAD").splitlines()[-1] == (
+        "feat: reword one"
+    )
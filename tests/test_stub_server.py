@@ -0,0 +1,94 @@
+import json
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from gcop.stub_server import StubServer, StubServerConfig
+
+_MESSAGES = [
+    {"role": "system", "content": "write a commit message"},
+    {
+        "role": "user",
+        "content": "diff --git a/a.py b/a.py\n+x\ndiff --git a/b.py b/b.py",
+    },
+]
+
+
+def _post(server, body):
+    request = urllib.request.Request(
+        f"{server.api_base}/chat/completions",
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    return urllib.request.urlopen(request, timeout=10)
+
+
+@pytest.fixture
+def start_server():
+    servers = []
+
+    def start(**config):
+        server = StubServer(StubServerConfig(**config)).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def test_completion(start_server):
+    server = start_server()
+    with _post(server, {"model": "stub", "messages": _MESSAGES}) as response:
+        body = json.load(response)
+
+    answer = json.loads(body["choices"][0]["message"]["content"])
+    assert answer["content"] == "chore: update 2 files\n\n- Update a.py\n- Update b.py"
+    assert body["usage"]["completion_tokens"] > 0
+
+
+def test_stream(start_server):
+    server = start_server()
+    body = {
+        "model": "stub",
+        "messages": _MESSAGES,
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    }
+    with _post(server, body) as response:
+        events = [
+            line[len(b"data: ") :].decode("utf-8")
+            for line in response.read().splitlines()
+            if line.startswith(b"data: ")
+        ]
+
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    text = "".join(
+        chunk["choices"][0]["delta"].get("content", "")
+        for chunk in chunks
+        if chunk["choices"]
+    )
+    assert json.loads(text)["thought"] == "The diff changes 2 files."
+    assert chunks[-1]["usage"]["prompt_tokens"] > 0
+
+
+def test_latency_and_token_rate(start_server):
+    server = start_server(latency=0.2, token_rate=200)
+    start = time.monotonic()
+    with _post(server, {"messages": _MESSAGES}) as response:
+        tokens = json.load(response)["usage"]["completion_tokens"]
+    assert time.monotonic() - start >= 0.2 + tokens / 200
+
+
+def test_error_injection(start_server):
+    server = start_server(error_rate=1.0, retry_after=3)
+    with pytest.raises(urllib.error.HTTPError) as error:
+        _post(server, {"messages": _MESSAGES})
+
+    assert error.value.code == 429
+    assert error.value.headers["Retry-After"] == "3"
+    assert json.load(error.value)["error"]["type"] == "rate_limit_error"
+    assert server.get_stats() == {"requests": 1, "errors": 1}
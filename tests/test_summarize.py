@@ -0,0 +1,67 @@
+import threading
+import time
+
+from gcop.diff import count_tokens
+from gcop.summarize import chunk_diff, summarize_diff
+
+
+def _file_diff(path: str, added: int) -> str:
+    lines = [
+        f"diff --git a/{path} b/{path}",
+        f"--- a/{path}",
+        f"+++ b/{path}",
+        f"@@ -0,0 +1,{added} @@",
+    ]
+    lines += [f"+line {i} of {path}" for i in range(added)]
+    return "\n".join(lines) + "\n"
+
+
+def test_chunk_diff_groups_files_by_path():
+    diff = (
+        _file_diff("b/x.py", 50) + _file_diff("a/y.py", 50) + _file_diff("a/z.py", 50)
+    )
+    chunks = chunk_diff(diff, chunk_tokens=2000)
+
+    assert [paths for paths, _ in chunks] == [["a/y.py", "a/z.py", "b/x.py"]]
+
+
+def test_chunk_diff_respects_budget():
+    diff = "".join(_file_diff(f"f{i}.py", 100) for i in range(10))
+    chunks = chunk_diff(diff, chunk_tokens=1000)
+
+    assert len(chunks) > 1
+    assert sum(len(paths) for paths, _ in chunks) == 10
+    assert all(count_tokens(text) <= 1000 * 1.1 for _, text in chunks)
+
+
+def test_chunk_diff_shrinks_huge_file():
+    chunks = chunk_diff(_file_diff("huge.py", 5000), chunk_tokens=500)
+
+    assert len(chunks) == 1
+    assert count_tokens(chunks[0][1]) <= 600
+    assert "more lines elided" in chunks[0][1]
+
+
+def test_summarize_diff_runs_parts_concurrently():
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def chat(text: str) -> str:
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+        return f"summary of {text.count('diff --git')} files"
+
+    diff = "".join(_file_diff(f"concurrent{i}.py", 100) for i in range(8))
+    result = summarize_diff(
+        diff, chat, model="test", chunk_tokens=800, max_concurrency=3
+    )
+
+    assert peak == 3
+    assert result.count("<diff_part") == len(chunk_diff(diff, 800))
+    assert 'files="concurrent0.py' in result
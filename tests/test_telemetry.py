@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from gcop import telemetry
+from gcop.commit import _timed_stream
+
+
+@pytest.fixture
+def runs_path(tmp_path, monkeypatch):
+    monkeypatch.delenv("GCOP_DISABLE_TELEMETRY", raising=False)
+    return str(tmp_path / "telemetry" / "runs.jsonl")
+
+
+def test_finish_run_appends_record(runs_path):
+    telemetry.start_run("commit")
+    telemetry.set_model("openai/gpt-4o")
+    with telemetry.span("git_diff"):
+        pass
+    telemetry.record("model", 0.5)
+    telemetry.record("model", 0.25)
+    telemetry.add_usage(100, 20)
+    entry = telemetry.finish_run(path=runs_path)
+
+    assert entry["command"] == "commit"
+    assert entry["model"] == "openai/gpt-4o"
+    assert entry["phases"]["model"] == 750.0
+    assert {"startup", "git_diff"} <= set(entry["phases"])
+    assert entry["tokens"] == {"prompt": 100, "completion": 20}
+    assert telemetry.load_records(runs_path) == [entry]
+    # Nothing is recorded outside of a run.
+    telemetry.record("model", 1.0)
+    assert telemetry.finish_run(path=runs_path) is None
+
+
+def test_disabled(runs_path, monkeypatch):
+    import gcop
+
+    monkeypatch.setenv("GCOP_DISABLE_TELEMETRY", "1")
+    # The package metadata is not read for a record which is not written.
+    monkeypatch.delattr(gcop, "version", raising=False)
+    telemetry.start_run("commit")
+    assert telemetry.finish_run(path=runs_path) is not None
+    assert telemetry.load_records(runs_path) == []
+    assert "version" not in vars(gcop)
+
+
+@pytest.mark.parametrize(
+    "value, expected", [("1", True), ("on", True), ("0", False), ("", False)]
+)
+def test_is_profiling(monkeypatch, value, expected):
+    monkeypatch.setenv("GCOP_PROFILE", value)
+    assert telemetry.is_profiling() is expected
+
+
+def test_rotation_and_bad_lines(runs_path, monkeypatch):
+    monkeypatch.setattr(telemetry, "_MAX_BYTES", 200)
+    for index in range(10):
+        telemetry.start_run(f"run{index}")
+        telemetry.finish_run(path=runs_path)
+    with open(runs_path, "a", encoding="utf-8") as f:
+        f.write('{"command": "cut sho')
+
+    commands = [entry["command"] for entry in telemetry.load_records(runs_path)]
+    # The oldest runs were rotated out, the rest are read oldest first.
+    assert "run0" not in commands
+    assert commands == sorted(commands) and commands[-1] == "run9"
+
+
+def test_summarize():
+    records = [
+        {
+            "command": "commit",
+            "model": "m",
+            "phases": {"model": float(ms)},
+            "tokens": {"prompt": 10, "completion": 2},
+        }
+        for ms in range(1, 101)
+    ]
+    records.append({"command": "info", "model": None, "phases": {"startup": 5.0}})
+
+    summary = telemetry.summarize(records)
+    assert summary[("m", "model")] == {"count": 100, "p50": 50, "p95": 95, "p99": 99}
+    assert summary[("m", "prompt_tokens")]["p50"] == 10
+    assert summary[("-", "startup")]["count"] == 1
+    assert ("-", "startup") not in telemetry.summarize(records, command="commit")
+    json.dumps(list(summary.values()))
+
+
+def test_timed_stream(runs_path):
+    telemetry.start_run("commit")
+    assert list(_timed_stream(0.0, iter(["a", "b"]))) == ["a", "b"]
+    phases = telemetry.finish_run(path=runs_path)["phases"]
+    assert phases["model"] >= phases["first_token"] > 0
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from gcop.commit import ModelClient
+from gcop.config import ModelConfig, RateLimitConfig, TransportConfig
+from gcop.transport import (
+    Cassette,
+    CassetteError,
+    Completion,
+    RecordingTransport,
+    ReplayTransport,
+    Transport,
+    get_transport,
+)
+
+_ANSWER = json.dumps({"thought": "t", "content": "feat: add a"})
+_MESSAGES = [
+    {"role": "system", "content": "write a commit message"},
+    {"role": "user", "content": "diff --git a/a.py b/a.py"},
+]
+
+
+class FakeTransport(Transport):
+    mode = "live"
+
+    def __init__(self):
+        self.requests = []
+
+    def complete(self, request):
+        self.requests.append(request)
+        return Completion(_ANSWER, usage={"prompt_tokens": 10, "completion_tokens": 5})
+
+    def stream(self, request):
+        self.requests.append(request)
+        return iter([Completion(_ANSWER[:10]), Completion(_ANSWER[10:])])
+
+
+@pytest.fixture
+def cassette_path(tmp_path):
+    return str(tmp_path / "cassette.json")
+
+
+def _client(transport):
+    return ModelClient(
+        ModelConfig(model_name="test/model", api_key="k"),
+        rate_limit=RateLimitConfig(enable=False),
+        transport=transport,
+    )
+
+
+def test_record_and_replay(cassette_path):
+    live = FakeTransport()
+    recording = _client(RecordingTransport(live, Cassette(cassette_path)))
+    recorded = recording.generate(_MESSAGES)
+    assert "".join(recording.stream(_MESSAGES)) == _ANSWER
+
+    # A fresh cassette, as in another process, needs no live transport.
+    replaying = _client(ReplayTransport(Cassette(cassette_path)))
+    assert replaying.generate(_MESSAGES) == recorded
+    assert replaying.last_usage.prompt_tokens == 10
+    assert "".join(replaying.stream(_MESSAGES)) == _ANSWER
+    assert len(live.requests) == 2
+
+
+def test_replay_cycles_through_recorded_answers(cassette_path):
+    cassette = Cassette(cassette_path)
+    request = _client(None)._request(_MESSAGES)
+    cassette.record(request, False, [Completion("first")])
+    cassette.record(request, False, [Completion("second")])
+
+    replay = ReplayTransport(Cassette(cassette_path))
+    answers = [replay.complete(request).text for _ in range(3)]
+    assert answers == ["first", "second", "first"]
+
+
+def test_replay_unknown_request(cassette_path):
+    client = _client(ReplayTransport(Cassette(cassette_path)))
+    with pytest.raises(CassetteError, match="record"):
+        client.generate(_MESSAGES)
+    # The temperature is part of the request.
+    RecordingTransport(FakeTransport(), client.transport.cassette).complete(
+        client._request(_MESSAGES)
+    )
+    with pytest.raises(CassetteError):
+        client.generate(_MESSAGES, temperature=0.7)
+
+
+def test_get_transport(monkeypatch, cassette_path):
+    assert get_transport().mode == "live"
+    assert get_transport(TransportConfig("record", cassette_path)).mode == "record"
+
+    monkeypatch.setenv("GCOP_TRANSPORT", "replay")
+    monkeypatch.setenv("GCOP_CASSETTE", cassette_path)
+    transport = get_transport(TransportConfig("live"))
+    assert transport.mode == "replay"
+    assert transport.cassette.path == cassette_path
+
+    monkeypatch.setenv("GCOP_TRANSPORT", "tape")
+    with pytest.raises(ValueError, match="tape"):
+        get_transport()
@@ -0,0 +1,123 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import gcop.utils as utils
+from gcop.utils import VersionMetadata, check_version_update
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "get_default_storage_path", lambda *_: str(tmp_path))
+    monkeypatch.delenv("GCOP_DISABLE_VERSION_CHECK", raising=False)
+    monkeypatch.setattr(utils, "is_version_check_disabled", lambda: False)
+    return tmp_path
+
+
+@pytest.fixture
+def spawned(monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, "_spawn_version_refresh", lambda: calls.append(1))
+    return calls
+
+
+def test_version_metadata_round_trip():
+    now = datetime.now()
+    metadata = VersionMetadata(
+        last_check=now, latest_version="1.2.3", last_attempt=now, last_notified=None
+    )
+    assert VersionMetadata.from_dict(metadata.to_dict()) == metadata
+
+
+def test_version_metadata_ignores_malformed_dates():
+    metadata = VersionMetadata.from_dict({"last_check": "not a date"})
+    assert metadata.last_check is None
+
+
+def test_stale_metadata_spawns_background_refresh(storage, spawned):
+    check_version_update()
+
+    assert spawned == [1]
+    data = json.loads((storage / "metadata.json").read_text())
+    assert data["last_attempt"] is not None
+
+
+def test_recent_attempt_does_not_spawn_again(storage, spawned):
+    check_version_update()
+    check_version_update()
+
+    assert spawned == [1]
+
+
+def test_fresh_metadata_does_not_spawn(storage, spawned):
+    from gcop import version
+
+    metadata = VersionMetadata(last_check=datetime.now(), latest_version=version)
+    (storage / "metadata.json").write_text(json.dumps(metadata.to_dict()))
+
+    check_version_update()
+
+    assert spawned == []
+
+
+def test_disabled_by_env(tmp_path, monkeypatch, spawned):
+    monkeypatch.setattr(utils, "get_default_storage_path", lambda *_: str(tmp_path))
+    monkeypatch.setenv("GCOP_DISABLE_VERSION_CHECK", "1")
+
+    check_version_update()
+
+    assert spawned == []
+    assert not (tmp_path / "metadata.json").exists()
+
+
+@pytest.fixture
+def config_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "get_default_storage_path", lambda *_: str(tmp_path))
+    monkeypatch.delenv("GCOP_DISABLE_VERSION_CHECK", raising=False)
+    return tmp_path
+
+
+def test_disabled_by_config(config_storage, spawned):
+    # Only the field is read, the rest of the config is not validated.
+    (config_storage / "config.yaml").write_text("disable_version_check: true\n")
+    assert utils.is_version_check_disabled()
+
+    check_version_update()
+    assert spawned == []
+
+    (config_storage / "config.yaml").write_text("model: [unclosed\n")
+    assert not utils.is_version_check_disabled()
+    (config_storage / "config.yaml").unlink()
+    assert not utils.is_version_check_disabled()
+
+
+def test_fresh_metadata_does_not_read_the_config(config_storage, monkeypatch):
+    from gcop import version
+
+    metadata = VersionMetadata(last_check=datetime.now(), latest_version=version)
+    (config_storage / "metadata.json").write_text(json.dumps(metadata.to_dict()))
+
+    def read_yaml(path):
+        raise AssertionError("config read on the startup path")
+
+    monkeypatch.setattr(utils, "read_yaml", read_yaml)
+    check_version_update()
+
+
+def test_write_json_atomic(tmp_path):
+    target = tmp_path / "nested" / "data.json"
+    utils.write_json_atomic(str(target), {"a": 1})
+
+    assert json.loads(target.read_text()) == {"a": 1}
+    assert [p.name for p in target.parent.iterdir()] == ["data.json"]
+
+
+def test_stale_check_is_older_than_a_day(storage, spawned):
+    old = datetime.now() - timedelta(days=2)
+    metadata = VersionMetadata(last_check=old, last_attempt=old)
+    (storage / "metadata.json").write_text(json.dumps(metadata.to_dict()))
+
+    check_version_update()
+
+    assert spawned == [1]
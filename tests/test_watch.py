@@ -0,0 +1,125 @@
+import threading
+
+import pytest
+
+from gcop import watch
+from gcop.commit import CommitMessage
+from gcop.config import GcopConfig, ModelConfig
+
+
+@pytest.fixture
+def gcop_config(tmp_path, monkeypatch):
+    from zeeland import Singleton
+
+    from gcop.cache import CommitMessageCache
+
+    monkeypatch.setattr(
+        watch, "_get_store", lambda: CommitMessageCache(str(tmp_path / "store"))
+    )
+    Singleton._instances.pop(GcopConfig, None)
+    yield GcopConfig(model=ModelConfig(model_name="test/model", api_key="k"))
+    Singleton._instances.pop(GcopConfig, None)
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    """Replace the model call of the commit session."""
+    from gcop import commit
+
+    diffs = []
+
+    def fake_generate(self, feedback=None):
+        diffs.append(self.diff)
+        return CommitMessage(thought="t", content=f"feat: change {len(diffs)}")
+
+    monkeypatch.setattr(commit.CommitSession, "generate", fake_generate)
+    return diffs
+
+
+def test_pregenerate_stores_message_by_staged_tree(git_repo, gcop_config, generated):
+    git_repo.commit({"a.py": "1"}, "first")
+    git_repo.write({"a.py": "2"})
+    git_repo.git("add", "a.py")
+
+    tree = watch.pregenerate(gcop_config)
+
+    assert tree == watch.get_staged_tree()
+    assert watch.load_pregenerated(gcop_config).content == "feat: change 1"
+    # A message is generated only once per tree.
+    assert watch.pregenerate(gcop_config) is None
+    assert len(generated) == 1
+
+    git_repo.write({"a.py": "3"})
+    git_repo.git("add", "a.py")
+    assert watch.load_pregenerated(gcop_config) is None
+
+
+def test_pregenerated_message_is_keyed_by_head(git_repo, gcop_config, generated):
+    git_repo.commit({"a.py": "1"}, "first")
+    git_repo.commit({"a.py": "2"}, "second")
+    git_repo.write({"a.py": "3"})
+    git_repo.git("add", "a.py")
+    watch.pregenerate(gcop_config)
+    assert watch.load_pregenerated(gcop_config) is not None
+
+    # The same index, but the staged diff is now "1" -> "3".
+    git_repo.git("reset", "-q", "--soft", "HEAD~1")
+    assert watch.load_pregenerated(gcop_config) is None
+
+
+def test_pregenerated_message_is_keyed_by_prompt_settings(
+    git_repo, gcop_config, generated
+):
+    git_repo.commit({"a.py": "1"}, "first")
+    git_repo.write({"a.py": "2"})
+    git_repo.git("add", "a.py")
+    watch.pregenerate(gcop_config)
+
+    gcop_config.diff_filter.context_lines += 1
+    assert watch.load_pregenerated(gcop_config) is None
+    gcop_config.diff_filter.context_lines -= 1
+    gcop_config.include_git_history = True
+    assert watch.load_pregenerated(gcop_config) is None
+    gcop_config.include_git_history = False
+    assert watch.load_pregenerated(gcop_config) is not None
+
+
+def test_no_lookup_without_pregenerated_messages(git_repo, gcop_config, monkeypatch):
+    def get_staged_tree(git=None):
+        raise AssertionError("git run without any pre-generated message")
+
+    monkeypatch.setattr(watch, "get_staged_tree", get_staged_tree)
+    assert watch.load_pregenerated(gcop_config) is None
+
+
+def test_pregenerate_skips_empty_index(git_repo, gcop_config, generated):
+    git_repo.commit({"a.py": "1"}, "first")
+
+    assert watch.pregenerate(gcop_config) is None
+    assert generated == []
+
+
+def test_watch_debounces_index_changes(git_repo, gcop_config):
+    git_repo.commit({"a.py": "1"}, "first")
+    stop = threading.Event()
+    settled = threading.Event()
+
+    def on_settled(config):
+        settled.set()
+        stop.set()
+
+    thread = threading.Thread(
+        target=watch.watch,
+        args=(gcop_config,),
+        kwargs={
+            "interval": 0.01,
+            "debounce": 0.05,
+            "stop": stop,
+            "on_settled": on_settled,
+        },
+    )
+    thread.start()
+    thread.join(5)
+
+    assert settled.is_set()
+    assert not thread.is_alive()